@@ -29,7 +29,11 @@ export const ScatterViewer = memo(({ series }: { series: string }) => {
     projectId,
     runId,
     conditions: { series },
-    transformWS: (x) => ({ id: x.id, x: x.payload.x, y: x.payload.y }),
+    expandWS: (x) =>
+      Array.isArray(x.payload.x)
+        ? // columnar points from add_scalars, ids are consecutive
+          x.payload.x.map((px, i) => ({ id: x.id + i, x: px, y: x.payload.y[i] }))
+        : [{ id: x.id, x: x.payload.x, y: x.payload.y }],
     transformHTTP: (x) => ({ id: x.id, x: x.metadata.x, y: x.metadata.y }),
   });
   const [hadZoom, setHadZoom] = useState<string | null>(null);
@@ -19,6 +19,7 @@ export function useProjectData<T = any>(options: {
   filterWS?: (msg) => boolean;
   transformHTTP?: (data) => unknown;
   transformWS?: (msg) => unknown;
+  expandWS?: (msg) => unknown[];
   reducer?: (data: T[], queue: T[]) => T[];
 }) {
   const { type, projectId, runId, limit, url: customUrl } = options;
@@ -86,17 +87,23 @@ export function useProjectData<T = any>(options: {
         (!options.conditions?.series || options.conditions.series === msg.series) &&
         (!options.filterWS || options.filterWS(msg))
       ) {
-        const transformed = transformWS(msg);
-        queue.push(transformed);
+        if (options.expandWS) {
+          queue.push(...(options.expandWS(msg) as T[]));
+        } else {
+          queue.push(transformWS(msg) as T);
+        }
         if (data && !renderTimer.running) renderTimer.schedule(200);
       }
     };
 
     const wsClient = getProject(projectId).wsClient;
     wsClient.wsListeners.add(handleWs);
+    // the server only sends messages of topics subscribed
+    const unsubscribe = wsClient.subscribe({ eventType: type, runId, series: options.conditions?.series });
 
     return () => {
       wsClient.wsListeners.delete(handleWs);
+      unsubscribe();
       renderTimer.cancel();
     };
     // eslint-disable-next-line react-hooks/exhaustive-deps
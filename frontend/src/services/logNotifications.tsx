@@ -2,7 +2,7 @@ import { addNotice } from "../utils/notification";
 import { Project } from "./projects";
 import { LogData } from "./types";
 
-const NotificationSeries = ["mention", "error"];
+export const NotificationSeries = ["mention", "error"];
 
 let lastNotification: Notification | null = null;
 
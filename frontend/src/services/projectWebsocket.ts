@@ -1,6 +1,7 @@
 import { BetterAtom } from "../utils/betterAtom";
 import { addNotice } from "../utils/notification";
 import { WEBSOCKET_URL } from "./api";
+import { NotificationSeries } from "./logNotifications";
 import { Project } from "./projects";
 import { ImageMetadata } from "./types";
 
@@ -16,12 +17,20 @@ export interface WsMsgBase<Type extends string = string, Payload = undefined> {
   series?: string;
 }
 
+/** messages of a topic are sent to the frontend once subscribed, any run id or series if not given */
+export interface WsTopic {
+  eventType: string;
+  runId?: string;
+  series?: string;
+}
+
 export type WsMsg =
   | WsMsgBase
+  | WsMsgBase<"subscribe" | "unsubscribe", WsTopic[]>
   | (WsMsgBase<"handshake"> & { identityType: "web" | "cli" })
   | WsMsgBase<"action", { name: string; args: Record<string, string> }>
   | (WsMsgBase<"image"> & ImageMetadata)
-  | WsMsgBase<"scalar", { series: string; x: number; y: number }>
+  | WsMsgBase<"scalar", { series: string; x: number | number[]; y: number | number[] }>
   | WsMsgBase<
       "log",
       {
@@ -36,10 +45,14 @@ export class WsClient {
   nextId = ~~(Math.random() * 100000000) * 1000;
   callbacks = new Map<number, (msg: WsMsg) => void>();
   wsListeners = new Set<(msg: WsMsg) => void>();
+  subscriptions = new Map<string, { topic: WsTopic; count: number }>();
   isReady = new BetterAtom(false);
   activeClose = false;
 
   constructor(readonly project: Project) {
+    for (const series of NotificationSeries) {
+      this.subscribe({ eventType: "log", series });
+    }
     this.connect();
   }
 
@@ -55,6 +68,10 @@ export class WsClient {
         (msg) => {
           console.info("ws joined", msg);
           this.isReady.value = true;
+          this.send({
+            eventType: "subscribe",
+            payload: [...this.subscriptions.values()].map((x) => x.topic),
+          });
           if (reconnect) {
             addNotice({
               id: "ws-connection-state",
@@ -111,6 +128,22 @@ export class WsClient {
     if (onReply) this.callbacks.set(eventId, onReply);
   }
 
+  /** receive messages of topic until the returned function is called */
+  subscribe(topic: WsTopic) {
+    const key = JSON.stringify([topic.eventType, topic.runId ?? null, topic.series ?? null]);
+    const subscription = this.subscriptions.get(key) ?? { topic, count: 0 };
+    this.subscriptions.set(key, subscription);
+    if (subscription.count++ == 0 && this.isReady.value) {
+      this.send({ eventType: "subscribe", payload: [topic] });
+    }
+    return () => {
+      if (--subscription.count == 0) {
+        this.subscriptions.delete(key);
+        if (this.isReady.value) this.send({ eventType: "unsubscribe", payload: [topic] });
+      }
+    };
+  }
+
   close() {
     this.activeClose = true;
     this.ws.close();
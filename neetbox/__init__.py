@@ -10,7 +10,10 @@ from .client import (
     add_hyperparams,
     set_run_name,
     add_image,
+    add_image_async,
     add_scalar,
+    add_scalar_async,
+    add_scalars,
     listen,
     watch,
     progress,
@@ -20,8 +23,11 @@ from ._protocol import VERSION as __version__
 
 __all__ = [
     "add_image",
+    "add_image_async",
     "add_figure",
     "add_scalar",
+    "add_scalar_async",
+    "add_scalars",
     "add_hyperparams",
     "set_run_name",
     "action",
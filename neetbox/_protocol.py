@@ -5,11 +5,12 @@
 # Date:   20231201
 
 import json
+import struct
 from dataclasses import dataclass
 from datetime import datetime as dt
 from enum import Enum
 from importlib.metadata import version
-from typing import Any, Union
+from typing import Any, List, Union
 
 VERSION = version("neetbox")
 
@@ -33,6 +34,8 @@ METADATA_KEY = "metadata"
 MESSAGE_KEY = "message"
 TIMESTAMP_KEY = "timestamp"
 HISTORY_LEN_KEY = "historyLen"
+# tag of messages forwarded from child processes, see neetbox.client._aggregator
+WORKER_ID_KEY = "worker"
 DATETIME_FORMAT = "%Y-%m-%dT%H:%M:%S.%f"  # YYYY-MM-DDTHH:MM:SS.SSS
 
 
@@ -89,6 +92,34 @@ class EventMsg:
     def dumps(self):
         return json.dumps(self.json, default=str)
 
+    @classmethod
+    def dumps_batch(cls, messages: List["EventMsg"]):
+        """pack messages into a single batch envelope. the envelope itself is an EventMsg whose event type is EVENT_TYPE_NAME_BATCH and whose payload is the list of packed messages.
+
+        Args:
+            messages (List[EventMsg]): messages to pack
+
+        Returns:
+            str: dumped batch envelope
+        """
+        return json.dumps(
+            {
+                EVENT_TYPE_KEY: EVENT_TYPE_NAME_BATCH,
+                PAYLOAD_KEY: [message.json for message in messages],
+            },
+            default=str,
+        )
+
+    @property
+    def is_batch(self):
+        return self.event_type == EVENT_TYPE_NAME_BATCH
+
+    def unpack_batch(self) -> List["EventMsg"]:
+        """unpack messages from a batch envelope. a regular message unpacks into itself."""
+        if not self.is_batch:
+            return [self]
+        return [EventMsg.loads(src) for src in self.payload or []]
+
     @classmethod
     def loads(cls, src):
         if isinstance(src, str):
@@ -130,6 +161,172 @@ EVENT_TYPE_NAME_HPARAMS = "hyperparameters"
 EVENT_TYPE_NAME_STATUS = "status"
 EVENT_TYPE_NAME_HARDWARE = "hardware"
 EVENT_TYPE_NAME_PROGRESS = "progress"
+EVENT_TYPE_NAME_BATCH = "batch"  # envelope of multiple messages, never saved or forwarded as is
+EVENT_TYPE_NAME_SUBSCRIBE = "subscribe"  # from frontend, payload is a list of topics it wants
+EVENT_TYPE_NAME_UNSUBSCRIBE = "unsubscribe"  # from frontend, payload is a list of topics
+
+# ===================== WIRE things =====================
+
+WIRE_FORMATS_KEY = "wireFormats"  # offered by client in handshake
+WIRE_FORMAT_KEY = "wireFormat"  # chosen by server in handshake reply
+WIRE_FORMAT_JSON = "json"
+WIRE_FORMAT_BINARY = "binary"
+SUPPORTED_WIRE_FORMATS = [WIRE_FORMAT_BINARY, WIRE_FORMAT_JSON]  # in order of preference
+
+# numeric event types on the binary wire, index is the code. code 0 means the name follows as a string
+_WIRE_EVENT_TYPES = [
+    None,
+    EVENT_TYPE_NAME_HANDSHAKE,
+    EVENT_TYPE_NAME_WAVEHANDS,
+    EVENT_TYPE_NAME_LOG,
+    EVENT_TYPE_NAME_ACTION,
+    EVENT_TYPE_NAME_SCALAR,
+    EVENT_TYPE_NAME_HIST,
+    EVENT_TYPE_NAME_IMAGE,
+    EVENT_TYPE_NAME_VIDEO,
+    EVENT_TYPE_NAME_HPARAMS,
+    EVENT_TYPE_NAME_STATUS,
+    EVENT_TYPE_NAME_HARDWARE,
+    EVENT_TYPE_NAME_PROGRESS,
+]
+_WIRE_EVENT_TYPE_CODES = {name: code for code, name in enumerate(_WIRE_EVENT_TYPES) if name}
+_WIRE_IDENTITY_TYPES = [None, *IdentityType]
+_WIRE_IDENTITY_TYPE_CODES = {name.value: code for code, name in enumerate(IdentityType, start=1)}
+
+
+def negotiate_wire_format(offered):
+    """pick the first wire format the other side offered that is also supported here, falls back to json"""
+    for wire_format in offered or []:
+        if wire_format in SUPPORTED_WIRE_FORMATS:
+            return wire_format
+    return WIRE_FORMAT_JSON
+
+
+class BinaryWire:
+    """Compact binary encoding of EventMsg. A frame is a version byte followed by length-prefixed records:
+
+    - string record: defines the next string in the string table. project ids, run ids, series and custom event type names are sent once per connection and referred by their index afterwards.
+    - event record: numeric event type/identity type, string table indices, event id, history length and timestamp.
+    - payload record: the last record of a frame, payloads of all the events in the frame as one compact json array.
+
+    The string table makes the codec stateful, so use one BinaryWire per direction per connection and create a new one on reconnect. Database ids are not carried.
+    """
+
+    VERSION = 1
+    _NONE = 0xFFFFFFFF  # string index of None
+    _RECORD_STRING = 0
+    _RECORD_EVENT = 1
+    _RECORD_PAYLOADS = 2
+    _LENGTH = struct.Struct("<I")
+    # kind, event type, identity, project, run, series, custom event type, event id, history len, timestamp len
+    _EVENT = struct.Struct("<BBBIIIIqiB")
+
+    def __init__(self) -> None:
+        self._str2index = {}
+        self._strings = []
+
+    def _intern(self, string, records, new_strings: dict):
+        """index of string, defined before the record using it if first seen. strings first seen are kept in new_strings until the frame is built."""
+        if string is None:
+            return self._NONE
+        string = str(string)
+        index = self._str2index.get(string, new_strings.get(string))
+        if index is None:  # first seen, define it before the record using it
+            index = len(self._strings) + len(new_strings)
+            new_strings[string] = index
+            encoded = bytes((self._RECORD_STRING,)) + string.encode()
+            records.append(self._LENGTH.pack(len(encoded)) + encoded)
+        return index
+
+    @staticmethod
+    def _int_of(value, default=-1):
+        return default if value is None else int(value)
+
+    def _string_of(self, index):
+        return None if index == self._NONE else self._strings[index]
+
+    def dumps(self, messages: List[EventMsg]) -> bytes:
+        """encode messages into a frame. the string table is left as it was if any of them cannot be encoded, since the frame is never sent."""
+        records = [bytes((self.VERSION,))]
+        new_strings = {}
+        for message in messages:
+            event_type_code = _WIRE_EVENT_TYPE_CODES.get(message.event_type, 0)
+            timestamp = (message.timestamp or "").encode()
+            record = self._EVENT.pack(
+                self._RECORD_EVENT,
+                event_type_code,
+                _WIRE_IDENTITY_TYPE_CODES.get(message.identity_type, 0),
+                self._intern(message.project_id, records, new_strings),
+                self._intern(message.run_id, records, new_strings),
+                self._intern(message.series, records, new_strings),
+                (
+                    self._intern(message.event_type, records, new_strings)
+                    if event_type_code == 0
+                    else self._NONE
+                ),
+                self._int_of(message.event_id),
+                self._int_of(message.history_len),
+                len(timestamp),
+            )
+            records.append(self._LENGTH.pack(len(record) + len(timestamp)) + record + timestamp)
+        payloads = (
+            bytes((self._RECORD_PAYLOADS,))
+            + json.dumps(
+                [message.payload for message in messages], separators=(",", ":"), default=str
+            ).encode()
+        )
+        records.append(self._LENGTH.pack(len(payloads)) + payloads)
+        # the frame is built, commit strings defined in it
+        for string, index in new_strings.items():
+            self._str2index[string] = index
+            self._strings.append(string)
+        return b"".join(records)
+
+    def loads(self, data: bytes) -> List[EventMsg]:
+        if data[0] != self.VERSION:
+            raise ValueError(f"unsupported binary wire version {data[0]}")
+        messages = []
+        view = memoryview(data)
+        offset, end = 1, len(data)
+        while offset < end:
+            (length,) = self._LENGTH.unpack_from(view, offset)
+            offset += self._LENGTH.size
+            record = view[offset : offset + length]
+            offset += length
+            kind = record[0]
+            if kind == self._RECORD_STRING:
+                self._strings.append(bytes(record[1:]).decode())
+            elif kind == self._RECORD_EVENT:
+                (
+                    _,
+                    event_type_code,
+                    identity_type_code,
+                    project_index,
+                    run_index,
+                    series_index,
+                    event_type_index,
+                    event_id,
+                    history_len,
+                    _,
+                ) = self._EVENT.unpack_from(record)
+                messages.append(
+                    EventMsg(
+                        project_id=self._string_of(project_index),
+                        run_id=self._string_of(run_index),
+                        event_type=_WIRE_EVENT_TYPES[event_type_code]
+                        or self._string_of(event_type_index),
+                        identity_type=_WIRE_IDENTITY_TYPES[identity_type_code],
+                        series=self._string_of(series_index),
+                        event_id=event_id,
+                        timestamp=bytes(record[self._EVENT.size :]).decode() or None,
+                        history_len=history_len,
+                    )
+                )
+            elif kind == self._RECORD_PAYLOADS:
+                for message, payload in zip(messages, json.loads(bytes(record[1:]))):
+                    message.payload = payload
+        return messages
+
 
 # ===================== HTTP things =====================
 
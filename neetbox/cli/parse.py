@@ -73,13 +73,22 @@ def version_command():
     "--port", "-p", help="specify which port to launch", metavar="port", required=False, default=0
 )
 @click.option("--detach", "-d", is_flag=True, help="Run in detached mode", default=False)
-def serve(port, detach):
+@click.option(
+    "--workers",
+    "-w",
+    help="number of worker processes, projects are sharded to them",
+    metavar="workers",
+    required=False,
+    default=1,
+)
+def serve(port, detach, workers):
     """serve neetbox server in attached mode"""
     _try_load_workspace_if_applicable()
     _daemon_config = get_client_config()
     try:
         if port:
             _daemon_config["port"] = port
+        _daemon_config["workers"] = workers
         logger.log(f"Launching server using config: {_daemon_config}")
         import neetbox.server._daemon_server_launch_script as server_launcher
 
@@ -115,6 +124,68 @@ def shutdown_server(port):
         )
 
 
+@main.command(name="bench-server")
+@click.option("--clients", "-n", help="number of synthetic cli clients", default=4)
+@click.option("--frontends", "-m", help="number of synthetic frontends", default=1)
+@click.option(
+    "--projects", help="number of projects, one project per client if 0", metavar="n", default=0
+)
+@click.option("--rate", "-r", help="events sent by each client per second", default=200.0)
+@click.option(
+    "--mix",
+    help="weights of event types among scalar, log, progress, hardware and image",
+    default="scalar=70,log=20,progress=5,hardware=4,image=1",
+)
+@click.option("--duration", "-t", help="seconds of sending", default=10.0)
+@click.option(
+    "--wire",
+    help="wire format offered by clients",
+    type=click.Choice(["binary", "json"]),
+    default="binary",
+)
+@click.option("--workers", "-w", help="worker processes of the server launched", default=1)
+@click.option("--image-size", help="kilobytes of each image uploaded", default=64.0)
+@click.option("--load-processes", help="processes generating the load", default=1)
+@click.option(
+    "--server", help="url of a running server to bench instead of launching one", default=None
+)
+@click.option("--server-pid", help="pid of the running server to sample", type=int, default=None)
+@click.option("--output", "-o", help="path of the json report", default=None)
+@click.option(
+    "--keep-history",
+    is_flag=True,
+    help="keep the temporary vault of the server launched, with history of the synthetic projects",
+    default=False,
+)
+def bench_server(**kwargs):
+    """launch a server and measure it under synthetic load of clients and frontends"""
+    from neetbox.server._bench import run_bench
+
+    try:
+        report = run_bench(**kwargs)
+    except Exception as e:
+        logger.err(f"Failed to bench the neetbox server: {e}")
+        return
+    table = Table(title=f"neetbox server under {kwargs['clients']} clients")
+    table.add_column("metric", style="green", no_wrap=True)
+    table.add_column("value")
+    table.add_row("sent per second", f"{report['sent']['perSecond']:.1f}")
+    table.add_row("committed per second", f"{report['ingest']['perSecond']:.1f}")
+    table.add_row("forwarded per second", f"{report['forward']['perSecond']:.1f}")
+    if report["forward"]["delivered"] is not None:
+        table.add_row("delivered to frontends", f"{report['forward']['delivered']:.1%}")
+    for name, value in report["forward"]["latency"].items():
+        table.add_row(f"forward latency {name}", f"{value:.1f} ms")
+    table.add_row("history size", f"{report['history']['bytes'] / 1e6:.1f} MB")
+    if report["server"]:
+        table.add_row("server cpu", f"{report['server']['cpuPercent']:.1f} %")
+        table.add_row("server rss", f"{report['server']['rssMB']:.1f} MB")
+    for error in report["errors"]:
+        table.add_row("error", error)
+    console.print(table)
+    logger.ok(f"report saved to {report['output']}")
+
+
 def console_banner(text, font: Optional[str] = None):
     from pyfiglet import Figlet, FigletFont
 
@@ -4,21 +4,27 @@
 # Github: github.com/visualDust
 # Date:   20231206
 
+from ._async_client import async_connection
 from ._client import connection
 from ._signal_and_slot import listen, watch
 from .apis._action import actionManager
-from .apis._image import add_figure, add_image
-from .apis._progress import Progress as progress
-from .apis._scalar import add_scalar
+from .apis._image import add_figure, add_image, add_image_async, image_upload_pool
 from .apis._metadata import add_hyperparams, set_run_name
+from .apis._progress import Progress as progress
+from .apis._scalar import add_scalar, add_scalar_async, add_scalars, scalar_reducer
 
 ws_subscribe = connection.ws_subscribe
 action = actionManager.register
 
 __all__ = [
     "add_image",
+    "add_image_async",
     "add_scalar",
+    "add_scalar_async",
+    "add_scalars",
+    "scalar_reducer",
     "add_figure",
+    "image_upload_pool",
     "add_hyperparams",
     "set_run_name",
     "ws_subscribe",
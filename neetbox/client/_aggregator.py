@@ -0,0 +1,241 @@
+# -*- coding: utf-8 -*-
+#
+# Author: GavinGong aka VisualDust
+# Github: github.com/visualDust
+# Date:   20261018
+
+import atexit
+import multiprocessing.util
+import os
+import sys
+from multiprocessing.connection import Client, Listener
+from multiprocessing.reduction import ForkingPickler
+from threading import Event, Lock, Thread
+from typing import Callable, List, Optional, Tuple
+
+from neetbox._protocol import *
+from neetbox.utils.connection import SendQueue, encode_frames
+
+# set by an aggregating process exporting itself to spawned children, see MessageAggregator.start
+AGGREGATOR_ADDRESS_ENV = "NEETBOX_AGGREGATOR_ADDRESS"
+AGGREGATOR_AUTHKEY_ENV = "NEETBOX_AGGREGATOR_AUTHKEY"
+AGGREGATOR_PID_ENV = "NEETBOX_AGGREGATOR_PID"
+AGGREGATOR_PROJECT_ID_ENV = "NEETBOX_AGGREGATOR_PROJECT_ID"
+WORKER_ID_ENV = "NEETBOX_WORKER_ID"  # optional, names a child process in tags
+
+_inherited_aggregator: Optional[Tuple[str, bytes]] = None  # of the process this one forked from
+
+
+def aggregator_of_parent(project_id: str) -> Optional[Tuple[str, bytes]]:
+    """address and authkey of the aggregator this process should send through, None if it should connect on its own.
+
+    Forked children send through the aggregator of the process they were forked from, see inherit_aggregator_after_fork. Other child processes only if the aggregator exported itself to environment variables and they load the same project.
+
+    Args:
+        project_id (str): project id of this process
+    """
+    if _inherited_aggregator is not None:
+        return _inherited_aggregator
+    if os.environ.get(AGGREGATOR_PID_ENV, str(os.getpid())) == str(os.getpid()):
+        return None  # exported by this process itself, or not at all
+    if os.environ.get(AGGREGATOR_PROJECT_ID_ENV) != project_id:
+        return None  # a process of another project which inherited the environment
+    return os.environ[AGGREGATOR_ADDRESS_ENV], bytes.fromhex(os.environ[AGGREGATOR_AUTHKEY_ENV])
+
+
+def inherit_aggregator_after_fork(aggregator: Optional["MessageAggregator"]) -> bool:
+    """called in a forked child with the aggregator of its parent, if any, so that the child sends through it. children of such a child send through the same one.
+
+    Returns:
+        bool: whether this process sends through an aggregator of a parent
+    """
+    global _inherited_aggregator
+    if aggregator is not None and aggregator.listener is not None:
+        _inherited_aggregator = (aggregator.address, aggregator.authkey)
+    return _inherited_aggregator is not None
+
+
+def get_worker_id() -> str:
+    """name of this child process in tags: NEETBOX_WORKER_ID if set, rank of distributed training, id of pytorch dataloader worker or pid, whichever found first"""
+    if WORKER_ID_ENV in os.environ:
+        return os.environ[WORKER_ID_ENV]
+    if "RANK" in os.environ:
+        return f"rank{os.environ['RANK']}"
+    torch_data = sys.modules.get("torch.utils.data")
+    worker_info = torch_data.get_worker_info() if torch_data else None
+    if worker_info is not None:
+        return f"worker{worker_info.id}"
+    return f"pid{os.getpid()}"
+
+
+class MessageAggregator:
+    """receive messages from child processes over a local socket (a named pipe on windows), so that they are sent by the single websocket connection of this process. messages are tagged with the worker id of their sender."""
+
+    def __init__(self, on_message: Callable[[EventMsg], None]):
+        self.on_message = on_message
+        self.listener: Listener = None
+        self.address: str = None
+        self.authkey: bytes = None
+        self.num_children = 0
+        self.num_received = 0
+
+    def start(self, export_project_id: str = None):
+        """listen for child processes. forked ones find it through inherit_aggregator_after_fork.
+
+        Args:
+            export_project_id (str, optional): also expose the address to child processes created afterwards through environment variables, for the ones loading this project only. Defaults to None.
+        """
+        self.authkey = os.urandom(16)
+        self.listener = Listener(authkey=self.authkey)
+        self.address = self.listener.address
+        if export_project_id is not None:
+            os.environ[AGGREGATOR_ADDRESS_ENV] = self.address
+            os.environ[AGGREGATOR_AUTHKEY_ENV] = self.authkey.hex()
+            os.environ[AGGREGATOR_PID_ENV] = str(os.getpid())
+            os.environ[AGGREGATOR_PROJECT_ID_ENV] = export_project_id
+        Thread(target=self._accept_loop, name="neetbox aggregator", daemon=True).start()
+
+    def _accept_loop(self):
+        while True:
+            try:
+                connection = self.listener.accept()
+            except OSError:  # closed
+                return
+            except Exception:  # failed authentication
+                continue
+            self.num_children += 1
+            Thread(target=self._receive_loop, args=(connection,), daemon=True).start()
+
+    def _receive_loop(self, connection):
+        try:
+            worker_id = connection.recv()  # the first message is the worker id
+            while True:
+                for message in connection.recv():
+                    self.num_received += 1
+                    self.on_message(self._tag(message, worker_id))
+        except (EOFError, OSError):  # child exited
+            pass
+        finally:
+            connection.close()
+
+    @staticmethod
+    def _tag(message: EventMsg, worker_id: str) -> EventMsg:
+        if isinstance(message.payload, dict):
+            message.payload[WORKER_ID_KEY] = worker_id
+            if message.event_type == EVENT_TYPE_NAME_LOG and CALLER_ID_KEY in message.payload:
+                message.payload[CALLER_ID_KEY] = f"{worker_id} > {message.payload[CALLER_ID_KEY]}"
+        return message
+
+    def close(self):
+        if self.listener is not None:
+            self.listener.close()
+
+
+class MessageForwarder:
+    """takes the place of WebsocketClient in a child process of an aggregator, sending messages to the parent process in batches."""
+
+    def __init__(
+        self,
+        address: str,
+        authkey: bytes,
+        worker_id: str = None,
+        batch_size: int = 64,
+        batch_interval: float = 0.05,
+        send_queue_size: int = 10000,
+        on_state_change: Callable[[bool], None] = None,
+    ):
+        """
+        Args:
+            address (str): address of the aggregator
+            authkey (bytes): key to authenticate with the aggregator
+            worker_id (str, optional): tag of messages from this process. Defaults to get_worker_id().
+            batch_size (int, optional): max messages sent together. Defaults to 64.
+            batch_interval (float, optional): max seconds a message waits in the queue. Defaults to 0.05.
+            send_queue_size (int, optional): capacity of the queue, the oldest message is dropped when full. Defaults to 10000.
+            on_state_change (Callable[[bool], None], optional): called with whether connected to the aggregator. Defaults to None.
+        """
+        self.address = address
+        self.authkey = authkey
+        self.worker_id = worker_id
+        self.batch_size = max(batch_size, 1)
+        self.batch_interval = batch_interval
+        self.on_state_change = on_state_change
+        self.message_query = SendQueue(maxsize=send_queue_size)
+        self.spool = None  # the parent spools if it should
+        self.ready = False
+        self.closed = False
+        self._connection = None
+        self._flush_lock = Lock()
+        self._wake_up_sender = Event()
+        self._connect_done = Event()  # set once connected or failed to
+        Thread(target=self._sender_loop, name="neetbox forwarder", daemon=True).start()
+        atexit.register(self.close)
+        # processes of multiprocessing exit without running atexit hooks, but finalizers
+        multiprocessing.util.Finalize(self, self.close, exitpriority=10)
+
+    def _connect(self):
+        try:
+            self._connection = Client(self.address, authkey=self.authkey)
+            self._connection.send(self.worker_id or get_worker_id())
+            self.ready = True
+        finally:
+            self._connect_done.set()
+        if self.on_state_change:
+            self.on_state_change(True)
+
+    @property
+    def num_dropped(self) -> int:
+        return self.message_query.num_dropped
+
+    def send(self, message: EventMsg):
+        if self.message_query.append(message) >= self.batch_size:
+            self._wake_up_sender.set()
+
+    def _sender_loop(self):
+        try:
+            self._connect()
+        except Exception:  # the parent is gone, messages stay in queue
+            return
+        while not self.closed:
+            self._wake_up_sender.wait(timeout=self.batch_interval)
+            self._wake_up_sender.clear()
+            try:
+                self.flush()
+            except (EOFError, OSError):  # the parent is gone
+                self.ready = False
+                if self.on_state_change:
+                    self.on_state_change(False)
+                return
+
+    def _send_batch(self, batch: List[EventMsg]):
+        """send batch pickled as a whole, or message by message if some of them cannot be pickled, which are dropped. unsent messages are put back if the parent is gone."""
+        for frame, index in encode_frames(
+            batch, ForkingPickler.dumps, self.message_query.drop_unencodable
+        ):
+            try:
+                self._connection.send_bytes(frame)
+            except (EOFError, OSError):
+                self.message_query.put_back(batch[index:])
+                raise
+
+    def flush(self):
+        with self._flush_lock:
+            if not self.ready:
+                return
+            while len(self.message_query):
+                self._send_batch(self.message_query.pop_batch(self.batch_size))
+
+    def close(self):
+        """send what is left and close for good"""
+        if self.closed:
+            return
+        self._connect_done.wait(timeout=5)  # short lived processes may exit before connected
+        try:
+            self.flush()
+        except (EOFError, OSError):
+            pass
+        finally:
+            self.closed = True
+            self.ready = False
+            if self._connection is not None:
+                self._connection.close()
@@ -0,0 +1,334 @@
+# -*- coding: utf-8 -*-
+#
+# Author: GavinGong aka VisualDust
+# Github: github.com/visualDust
+# Date:   20261018
+
+import asyncio
+import inspect
+from collections import defaultdict
+from threading import Lock
+from typing import Callable, List
+
+import httpx
+from vdtoys.mvc import Singleton
+from websockets.asyncio.client import connect
+
+from neetbox._protocol import *
+from neetbox.config import get_module_level_config, get_project_id, get_run_id
+from neetbox.utils.connection import SendQueue, encode_frames, httpxClient
+
+from ._client import (
+    CONNECTION_STATE_CONNECTING,
+    CONNECTION_STATE_HANDSHAKING,
+    CONNECTION_STATE_OFFLINE,
+    CONNECTION_STATE_ONLINE,
+    addr_of_api,
+    connection,
+    logger,
+    make_config_status_msg,
+    make_handshake_msg,
+)
+
+
+class AsyncNeetboxClient(metaclass=Singleton):  # singleton
+    """asyncio counterpart of NeetboxClient, for code running inside an event loop. selected by setting client.backend to "asyncio" in workspace config, then every ws_send of the thread based client is routed here as well.
+
+    The client starts on the event loop of its first call made inside a running loop. Messages sent before that, or while offline, are queued. Connection state is shared with the thread based client, so connection.state and connection.wait_should_online still work.
+    """
+
+    def __init__(self) -> None:
+        self.loop: asyncio.AbstractEventLoop = None
+        self.httpx: httpx.AsyncClient = None
+        self.closed: bool = False
+        self.subscribers = defaultdict(list)  # default to no subscribers
+        self.message_query: SendQueue = None  # created on first use, see _configure
+        self.send_failing = False  # whether the last send failed, logged once until recovered
+        self._websocket = None  # connected websocket, None until handshake succeed
+        self._binary_wire: BinaryWire = None
+        self._wake_up_sender: asyncio.Event = None
+        self._online_event: asyncio.Event = None
+        self._tasks = set()  # keep references of running tasks
+        self._thread_safe_lock = Lock()
+
+    def _configure(self):
+        """read config on first use instead of on import"""
+        with self._thread_safe_lock:
+            if self.message_query is not None:
+                return
+            config = get_module_level_config()
+            self.batch_size = max(config["batch"]["size"], 1)
+            self.batch_interval = config["batch"]["interval"]
+            self.offline_message_buffer_size = config["offlineBufferSize"]
+            self.message_query = SendQueue(maxsize=config["batch"]["queueSize"])
+
+    @property
+    def num_dropped(self) -> int:
+        """messages dropped because the queue is full or offline"""
+        return self.message_query.num_dropped if self.message_query is not None else 0
+
+    @property
+    def state(self) -> str:
+        return connection.state
+
+    def _set_state(self, state: str):
+        connection._set_state(state)
+        if state == CONNECTION_STATE_ONLINE:
+            self._online_event.set()
+        else:
+            self._online_event.clear()
+
+    def _create_task(self, coroutine):
+        task = self.loop.create_task(coroutine)
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+        return task
+
+    @property
+    def is_native(self) -> bool:
+        """whether messages go through the asyncio websocket, False if the thread based client is in charge (client.backend is "thread")"""
+        return connection.websocket is None
+
+    def start(self) -> bool:
+        """start connecting on the running event loop if not started yet. never waits for the connection.
+
+        Returns:
+            bool: False if client is in offline mode
+        """
+        if not connection.start_connection():
+            return False
+        if self.loop is None and self.is_native:
+            self._configure()
+            self.loop = asyncio.get_running_loop()
+            self.httpx = httpx.AsyncClient(proxy={"http://": None, "https://": None})
+            self._wake_up_sender = asyncio.Event()
+            self._online_event = asyncio.Event()
+            self._create_task(self._connection_loop(get_module_level_config()))
+            self._create_task(self._sender_loop())
+        return True
+
+    async def wait_should_online(self, timeout: float = None):
+        """start connecting if not started yet and wait until online, for http apis which cannot be queued.
+
+        Args:
+            timeout (float, optional): max seconds to wait. Defaults to client.connectTimeout in config.
+
+        Returns:
+            bool: whether online
+        """
+        if not self.start():
+            return False
+        if not self.is_native:  # wait in a worker thread to keep the loop running
+            return await asyncio.to_thread(connection.wait_should_online, timeout)
+        if timeout is None:
+            timeout = get_module_level_config()["connectTimeout"]
+        try:
+            await asyncio.wait_for(self._online_event.wait(), timeout)
+        except asyncio.TimeoutError:
+            return False
+        return True
+
+    async def request_check_online(self, method: str, api: str, root: str = None, **kwargs):
+        """send a http request once online, see NeetboxClient.post_check_online and the like"""
+        if not await self.wait_should_online():
+            return None
+        url = addr_of_api(api, http_root=root)
+        if not self.is_native:  # the sync http client blocks, leave it to a worker thread
+            return await asyncio.to_thread(httpxClient.request, method, url, **kwargs)
+        return await self.httpx.request(method, url, **kwargs)
+
+    async def post_check_online(self, api: str, root: str = None, **kwargs):
+        return await self.request_check_online("POST", api, root, **kwargs)
+
+    async def get_check_online(self, api: str, root: str = None, **kwargs):
+        return await self.request_check_online("GET", api, root, **kwargs)
+
+    async def put_check_online(self, api: str, root: str = None, **kwargs):
+        return await self.request_check_online("PUT", api, root, **kwargs)
+
+    async def delete_check_online(self, api: str, root: str = None, **kwargs):
+        return await self.request_check_online("DELETE", api, root, **kwargs)
+
+    def subscribe(self, event_type_name: str, callback):
+        """subscribe ws messages of an event type. callback could be a coroutine function. only used by the asyncio backend, where subscribers here take over the ones of the thread based client for the same event type."""
+        self.subscribers[event_type_name].append(callback)
+
+    def unsubscribe(self, event_type_name: str, callback):
+        if callback in self.subscribers[event_type_name]:
+            self.subscribers[event_type_name].remove(callback)
+
+    def ws_subscribe(self, event_type_name: str):
+        def _ws_subscribe(function: Callable):
+            self.subscribe(event_type_name, function)
+            return function
+
+        return _ws_subscribe
+
+    async def _connection_loop(self, config):
+        """connecting -> handshaking -> online -> offline, and over again until closed."""
+        retry_interval = 1
+        while not self.closed:
+            self._set_state(CONNECTION_STATE_CONNECTING)
+            # checking and creating daemon blocks, leave it to a worker thread
+            if await asyncio.to_thread(connection._ensure_daemon, config):
+                retry_interval = 1
+                logger.info(f"asyncio websocket connecting to {connection.ws_server_url}")
+                try:
+                    async with connect(connection.ws_server_url, max_size=None) as websocket:
+                        await self._handshake(websocket)
+                        async for frame in websocket:
+                            await self._on_message(EventMsg.loads(frame))
+                except Exception as e:
+                    logger.err(f"asyncio client websocket encountered {e}")
+                self._websocket = None
+            self._set_state(CONNECTION_STATE_OFFLINE)
+            if self.closed:
+                break
+            await asyncio.sleep(retry_interval)
+            retry_interval = min(retry_interval * 2, 30)
+
+    async def _handshake(self, websocket):
+        logger.ok(
+            f"asyncio client websocket connected. sending handshake as '{get_project_id()}'..."
+        )
+        self._set_state(CONNECTION_STATE_HANDSHAKING)
+        await websocket.send(make_handshake_msg().dumps())
+        message = EventMsg.loads(await websocket.recv())
+        assert message.payload["result"] == 200
+        wire_format = message.payload.get(WIRE_FORMAT_KEY, WIRE_FORMAT_JSON)
+        self._binary_wire = BinaryWire() if wire_format == WIRE_FORMAT_BINARY else None
+        logger.ok(f"neetbox handshake succeed, using {wire_format} wire format.")
+        await websocket.send(make_config_status_msg(message.event_id).dumps())
+        self._websocket = websocket
+        self._set_state(CONNECTION_STATE_ONLINE)
+        self._wake_up_sender.set()  # messages held while offline
+        await self._on_message(message)
+
+    async def _on_message(self, message: EventMsg):
+        subscribers = self.subscribers.get(message.event_type) or connection.subscribers.get(
+            message.event_type, []
+        )
+        for subscriber in subscribers:
+            try:
+                result = subscriber(message)  # pass payload message into subscriber
+                if inspect.isawaitable(result):
+                    await result
+            except Exception as e:
+                logger.err(
+                    f"Subscriber {subscriber.__name__} crashed on message event {message.event_type}, ignoring."
+                )
+
+    def send_nowait(self, message: EventMsg):
+        """queue a message, thread safe. starts the client if called inside a running event loop."""
+        if self.message_query is None:
+            self._configure()
+        num_queued = self.message_query.append(message)
+        if self.loop is None:  # not started yet
+            try:
+                asyncio.get_running_loop()
+            except RuntimeError:
+                return  # queued until started inside an event loop
+            self.start()
+        elif num_queued >= self.batch_size:
+            self.loop.call_soon_threadsafe(self._wake_up_sender.set)
+
+    async def ws_send(
+        self,
+        event_type: str,
+        payload: dict,
+        series=None,
+        timestamp: str = None,
+        event_id=-1,
+        identity_type=IdentityType.CLI,
+        _history_len=-1,
+    ):
+        if not self.start():
+            return  # offline mode
+        message = EventMsg(
+            project_id=get_project_id(),
+            run_id=get_run_id(),
+            event_type=event_type,
+            event_id=event_id,
+            identity_type=identity_type,
+            series=series,
+            payload=payload,
+            timestamp=timestamp or get_timestamp(),
+            history_len=_history_len,
+        )
+        if self.is_native:
+            self.send_nowait(message)
+        else:
+            connection.websocket.send(message)  # queued by the thread based client, never blocks
+
+    def _encode_frame(self, messages: List[EventMsg]):
+        if self._binary_wire:
+            return self._binary_wire.dumps(messages)
+        elif len(messages) == 1:
+            return messages[0].dumps()
+        else:
+            return EventMsg.dumps_batch(messages)
+
+    async def _send_batch(self, batch: List[EventMsg]) -> List[EventMsg]:
+        """send batch in as few frames as possible, dropping messages which cannot be encoded
+
+        Returns:
+            List[EventMsg]: messages left unsent because sending failed
+        """
+        for frame, index in encode_frames(
+            batch, self._encode_frame, self.message_query.drop_unencodable
+        ):
+            try:
+                await self._websocket.send(frame)
+            except Exception as e:
+                self._on_send_result(e)
+                return batch[index:]
+        self._on_send_result()
+        return []
+
+    def _on_send_result(self, error: Exception = None):
+        """log a send failure, or recovery from it, once per change"""
+        if error is not None and not self.send_failing:
+            self.send_failing = True
+            logger.warn(
+                f"asyncio client failed to send messages cause {error!r}, retrying on next flush"
+            )
+        elif error is None and self.send_failing:
+            self.send_failing = False
+            logger.ok(f"asyncio client sending messages again")
+
+    async def _sender_loop(self):
+        while not self.closed:
+            try:
+                await asyncio.wait_for(self._wake_up_sender.wait(), timeout=self.batch_interval)
+            except asyncio.TimeoutError:
+                pass
+            self._wake_up_sender.clear()
+            await self.flush()
+
+    async def flush(self):
+        """send queued messages. while offline, drop the oldest ones beyond client.offlineBufferSize."""
+        if self._websocket is None:
+            self.message_query.drop_beyond(self.offline_message_buffer_size)
+            return
+        while len(self.message_query):
+            unsent = await self._send_batch(self.message_query.pop_batch(self.batch_size))
+            if unsent:  # retry them on next flush
+                self.message_query.put_back(unsent)
+                return
+
+    async def close(self):
+        """send what is left and close for good"""
+        if self.loop is None:
+            return
+        await self.flush()
+        self.closed = True
+        if self._websocket is not None:
+            await self._websocket.close()
+        for task in list(self._tasks):
+            task.cancel()
+        await self.httpx.aclose()
+        self._set_state(CONNECTION_STATE_OFFLINE)
+
+
+# singleton
+async_connection = AsyncNeetboxClient()
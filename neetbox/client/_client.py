@@ -4,20 +4,36 @@
 # Github: github.com/visualDust
 # Date:   20231022
 
+import atexit
 import logging
+import os
 import time
 from collections import defaultdict
-from threading import Lock
+from threading import Event, Lock, Thread
 from typing import Callable
 
 from vdtoys.mvc import Singleton
 from vdtoys.registry import Registry
 
 from neetbox._protocol import *
-from neetbox.config import get_module_level_config, get_project_id, get_run_id
+from neetbox.config import (
+    get_module_level_config,
+    get_project_id,
+    get_run_id,
+    is_workspace_loaded,
+)
+from neetbox.config.user import get as get_global_config
 from neetbox.logging import Logger, RawLog
 from neetbox.utils.connection import WebsocketClient, httpxClient
 from neetbox.utils.massive import is_loopback
+from neetbox.utils.spool import MessageSpool
+
+from ._aggregator import (
+    MessageAggregator,
+    MessageForwarder,
+    aggregator_of_parent,
+    inherit_aggregator_after_fork,
+)
 
 logging.getLogger("httpx").setLevel(logging.ERROR)
 logger = Logger(name_alias="CLIENT", skip_writers_names=["ws"])
@@ -34,23 +50,87 @@ def addr_of_api(api, http_root=None):
     return result
 
 
+def make_handshake_msg() -> EventMsg:
+    """handshake request of a cli client, offering preferred wire format with json as fallback"""
+    wire_format = get_module_level_config()["wireFormat"]
+    return EventMsg(
+        project_id=get_project_id(),
+        run_id=get_run_id(),
+        event_type=EVENT_TYPE_NAME_HANDSHAKE,
+        identity_type=IdentityType.CLI,
+        event_id=0,
+        payload={WIRE_FORMATS_KEY: list(dict.fromkeys([wire_format, WIRE_FORMAT_JSON]))},
+    )
+
+
+def make_config_status_msg(event_id: int) -> EventMsg:
+    """status message carrying workspace config, sent right after handshake"""
+    return EventMsg(
+        project_id=get_project_id(),
+        event_id=event_id,
+        event_type=EVENT_TYPE_NAME_STATUS,
+        series="config",
+        run_id=get_run_id(),
+        payload=get_module_level_config("@"),
+    )
+
+
+CLIENT_BACKEND_THREAD = "thread"
+CLIENT_BACKEND_ASYNCIO = "asyncio"
+
+CONNECTION_STATE_OFFLINE = "offline"
+CONNECTION_STATE_CONNECTING = "connecting"
+CONNECTION_STATE_HANDSHAKING = "handshaking"
+CONNECTION_STATE_ONLINE = "online"
+
+
 class NeetboxClient(metaclass=Singleton):  # singleton
     def __init__(self) -> None:
-        self.websocket: WebsocketClient = None
-        self.online_mode: bool = None
-        self._is_initialized: bool = False
-        self._is_ws_connected: bool = False
+        self.websocket: WebsocketClient = None  # or a MessageForwarder in child processes
+        self.aggregator: MessageAggregator = None  # receiving messages from child processes
+        self.online_mode: bool = None  # None until decided on first use
+        self.state: str = CONNECTION_STATE_OFFLINE
+        self._online_event = Event()
         self._thread_safe_lock = Lock()
         self.subscribers = defaultdict(list)  # default to no subscribers
 
-    def wait_should_online(self):
-        with self._thread_safe_lock:
-            while not self._is_ws_connected:
-                self.initialize_connection()
+    @property
+    def is_online(self) -> bool:
+        return self.state == CONNECTION_STATE_ONLINE
 
-        return (
-            self._is_initialized and self.online_mode and self._is_ws_connected
-        )
+    def _set_state(self, state: str):
+        self.state = state
+        if state == CONNECTION_STATE_ONLINE:
+            self._online_event.set()
+        else:
+            self._online_event.clear()
+
+    def start_connection(self) -> bool:
+        """start connecting in background if not started yet. never waits for the connection.
+
+        Returns:
+            bool: False if client is in offline mode
+        """
+        if self.online_mode is None:
+            with self._thread_safe_lock:
+                if self.online_mode is None:
+                    self.initialize_connection()
+        return self.online_mode
+
+    def wait_should_online(self, timeout: float = None):
+        """start connecting if not started yet and wait until online, for http apis which cannot be queued.
+
+        Args:
+            timeout (float, optional): max seconds to wait. Defaults to client.connectTimeout in config.
+
+        Returns:
+            bool: whether online
+        """
+        if not self.start_connection():
+            return False
+        if timeout is None:
+            timeout = get_module_level_config()["connectTimeout"]
+        return self._online_event.wait(timeout)
 
     def post_check_online(self, api: str, root: str = None, *args, **kwargs):
         return (
@@ -140,7 +220,6 @@ class NeetboxClient(metaclass=Singleton):  # singleton
                 response = self.get(
                     api=f"{API_ROOT}/{SERVER_KEY}/hello", root=root
                 )
-                print(f"{API_ROOT}{SERIES_KEY}/hello")
                 assert response.json()["hello"] == "hello"
             except:
                 raise IOError(
@@ -156,13 +235,13 @@ class NeetboxClient(metaclass=Singleton):  # singleton
             return False
 
     def initialize_connection(self, config=None):
-        if self._is_initialized:
+        """decide online mode and start the connection thread. messages are queued by the websocket client until online."""
+        if self.online_mode is not None:
             return  # if already initialized, do nothing
 
         config = config or get_module_level_config()
         if not config["enable"]:  # check if enable
             self.online_mode = False
-            self._is_initialized = True
             return
 
         if not config["allowIpython"]:  # check if allow ipython
@@ -176,109 +255,175 @@ class NeetboxClient(metaclass=Singleton):  # singleton
                     "ipython, try to set 'allowIpython' to True."
                 )
                 self.online_mode = False
-                self._is_initialized = True
                 return  # ignore if debugging in ipython
 
         server_host = config["host"]
         server_port = config["port"]
-        if not self.check_server_connectivity():  # if daemon not online
-            if not (
-                is_loopback(server_host) or server_host in ["127.0.0.1"]
-            ):  # daemon not running on localhost
-                logger.err(
-                    RuntimeError(
-                        f"No daemon running at {server_host}:{server_port}, daemon will not be attached, stopping..."
-                    ),
-                    reraise=True,
-                )
-            # connecting localhost but no server alive, create one
-            logger.log(
-                f"No daemon running on {server_host}:{server_port}, trying to create daemon..."
+        self.ws_server_url = f"ws://{server_host}:{server_port}{WS_ROOT}/project/"  # ws server url
+        batch_config = config["batch"]
+        parent_aggregator = aggregator_of_parent(get_project_id())
+        if parent_aggregator is not None:  # a child process, messages go through the parent
+            address, authkey = parent_aggregator
+            self.websocket = MessageForwarder(
+                address,
+                authkey=authkey,
+                batch_size=batch_config["size"],
+                batch_interval=batch_config["interval"],
+                send_queue_size=batch_config["queueSize"],
+                on_state_change=lambda connected: self._set_state(
+                    CONNECTION_STATE_ONLINE if connected else CONNECTION_STATE_OFFLINE
+                ),
             )
-            import neetbox.server._daemon_server_launch_script as server_launcher
-
-            popen = server_launcher.start(config)
-            _retry_timeout = 10
-            _time_begin = time.perf_counter()
-            logger.debug(
-                "Created daemon process, trying to connect to daemon..."
+            self.online_mode = True
+            return
+        self.start_aggregator(config)
+        if config["backend"] == CLIENT_BACKEND_ASYNCIO:
+            self.online_mode = True  # messages go to the asyncio client, see ws_send
+            return
+        spool_config = config["spool"]
+        spool = (
+            MessageSpool(  # same spool across reconnections of this run
+                folder=os.path.join(
+                    get_global_config("vault"), "client", "spool", get_project_id(), get_run_id()
+                ),
+                max_size=int(spool_config["maxSizeMB"] * 1024 * 1024),
+                segment_size=int(spool_config["segmentSizeMB"] * 1024 * 1024),
+                policy=spool_config["policy"],
             )
-            online_flag = False
-            while time.perf_counter() - _time_begin < 10:  # try connect daemon
-                if not self.check_server_connectivity():
-                    exit_code = popen.poll()
-                    if exit_code is not None:
-                        logger.err(
-                            f"Daemon process exited unexpectedly with exit code {exit_code}."
-                        )
-                        return False
-                    time.sleep(0.5)
-                else:
-                    online_flag = True
-                    break
-            if not online_flag:
-                logger.err(
-                    RuntimeError(
-                        f"Failed to connect to daemon after {_retry_timeout}s, stopping..."
-                    ),
-                    reraise=True,
-                )
-
-        self.online_mode = True  # enable online mode
-        self.ws_server_url = f"ws://{server_host}:{server_port}{WS_ROOT}/project/"  # ws server url
-        logger.info(f"websocket connecting to {self.ws_server_url}")
+            if spool_config["enable"]
+            else None
+        )
         self.websocket = WebsocketClient(
             url=self.ws_server_url,
             on_open=self.on_ws_open,
             on_message=self.on_ws_message,
             on_error=self.on_ws_err,
             on_close=self.on_ws_close,
-            offline_message_buffer_size=100,
+            offline_message_buffer_size=config["offlineBufferSize"],
+            batch_size=batch_config["size"] if batch_config["enable"] else 0,
+            batch_interval=batch_config["interval"],
+            send_queue_size=batch_config["queueSize"],
+            spool=spool,
         )
-        self.websocket.connect()
-        self._is_initialized = True
+        self.online_mode = True  # enable online mode
+        Thread(target=self._connection_loop, args=(config,), daemon=True).start()
 
-    def on_ws_open(self, ws: WebsocketClient):
-        project_id = get_project_id()
-        logger.ok(
-            f"client websocket connected. sending handshake as '{project_id}'..."
+    def start_aggregator(self, config=None):
+        """let child processes created afterwards, like pytorch dataloader workers or ranks of distributed training, send messages through the connection of this process. they would otherwise connect on their own, and be rejected if sharing the run id."""
+        config = config or get_module_level_config()
+        if self.aggregator is not None or aggregator_of_parent(get_project_id()) is not None:
+            return  # started, or a child process itself
+        if not (config["enable"] and config["aggregate"]["enable"]):
+            return
+        self.aggregator = MessageAggregator(on_message=self._send_forwarded)
+        self.aggregator.start(
+            export_project_id=get_project_id() if config["aggregate"]["spawned"] else None
         )
-        handshake_msg = EventMsg(  # handshake request message
-            project_id=project_id,
-            run_id=get_run_id(),
-            event_type=EVENT_TYPE_NAME_HANDSHAKE,
-            identity_type=IdentityType.CLI,
-            event_id=0,
-        ).dumps()
-        ws.send(handshake_msg)
+
+    def _send_forwarded(self, message: EventMsg):
+        """send a message from a child process as a message of this run, unless it belongs to another project"""
+        if not self.start_connection():
+            return  # offline mode
+        if message.project_id in (None, get_project_id()):
+            message.project_id = get_project_id()
+            message.run_id = get_run_id()
+        self._send_message(message)
+
+    def _reset_after_fork(self):
+        """forget the connection of the parent process in a forked child, it is not running here"""
+        WebsocketClient.instances.clear()  # closing them on exit closes the connection of the parent
+        self.websocket = None
+        self.aggregator = None
+        self.online_mode = None
+        self.state = CONNECTION_STATE_OFFLINE
+        self._online_event = Event()
+        self._thread_safe_lock = Lock()
+
+    def _ensure_daemon(self, config) -> bool:
+        """check if daemon is alive, create one if it should run on localhost.
+
+        Returns:
+            bool: whether daemon is alive
+        """
+        server_host = config["host"]
+        server_port = config["port"]
+        if self.check_server_connectivity(config):
+            return True
+        if not (
+            is_loopback(server_host) or server_host in ["127.0.0.1"]
+        ):  # daemon not running on localhost
+            logger.err(
+                f"No daemon running at {server_host}:{server_port}, retrying in background..."
+            )
+            return False
+        # connecting localhost but no server alive, create one
+        logger.log(f"No daemon running on {server_host}:{server_port}, trying to create daemon...")
+        import neetbox.server._daemon_server_launch_script as server_launcher
+
+        popen = server_launcher.start(config)
+        _retry_timeout = config["connectTimeout"]
+        _time_begin = time.perf_counter()
+        logger.debug("Created daemon process, trying to connect to daemon...")
+        while time.perf_counter() - _time_begin < _retry_timeout:  # try connect daemon
+            if self.check_server_connectivity(config):
+                return True
+            exit_code = popen.poll()
+            if exit_code is not None:
+                logger.err(f"Daemon process exited unexpectedly with exit code {exit_code}.")
+                return False
+            time.sleep(0.5)
+        logger.err(
+            f"Failed to connect to daemon after {_retry_timeout}s, retrying in background..."
+        )
+        return False
+
+    def _connection_loop(self, config):
+        """connecting -> handshaking -> online -> offline, and over again until the websocket client is closed."""
+        retry_interval = 1
+        while not self.websocket.closed:
+            self._set_state(CONNECTION_STATE_CONNECTING)
+            if self._ensure_daemon(config):
+                retry_interval = 1
+                logger.info(f"websocket connecting to {self.ws_server_url}")
+                self.websocket.run_forever()  # returns once disconnected
+            self._set_state(CONNECTION_STATE_OFFLINE)
+            if self.websocket.closed:
+                break
+            time.sleep(retry_interval)
+            retry_interval = min(retry_interval * 2, 30)
+
+    def on_ws_open(self, ws: WebsocketClient):
+        logger.ok(f"client websocket connected. sending handshake as '{get_project_id()}'...")
+        self._set_state(CONNECTION_STATE_HANDSHAKING)
+        self.websocket.ready = False  # hold messages until handshake succeed
+        self.websocket.set_wire_format(WIRE_FORMAT_JSON)  # until negotiated
+        ws.send(make_handshake_msg().dumps())
 
     def on_ws_err(self, ws: WebsocketClient, msg):
         logger.err(f"client websocket encountered {msg}")
-        self._is_ws_connected = False
+        self.websocket.ready = False
+        self._set_state(CONNECTION_STATE_OFFLINE)
 
     def on_ws_close(self, ws: WebsocketClient, close_status_code, close_msg):
         logger.warn(
             f"client websocket closed, status code: {close_status_code}, message: {close_msg}"
         )
-        self._is_initialized = False
-        self._is_ws_connected = False
+        self.websocket.ready = False
+        self._set_state(CONNECTION_STATE_OFFLINE)  # connection loop will reconnect
 
     def on_ws_message(self, ws: WebsocketClient, message):
         message = EventMsg.loads(message)  # message should be json
         if message.event_type == EVENT_TYPE_NAME_HANDSHAKE:
             assert message.payload["result"] == 200
-            logger.ok(f"neetbox handshake succeed.")
-            ws.send(  # send immediately without querying
-                EventMsg(
-                    project_id=get_project_id(),
-                    event_id=message.event_id,
-                    event_type=EVENT_TYPE_NAME_STATUS,
-                    series="config",
-                    run_id=get_run_id(),
-                    payload=get_module_level_config("@"),
-                ).dumps()
-            )
-            self._is_ws_connected = True
+            wire_format = message.payload.get(WIRE_FORMAT_KEY, WIRE_FORMAT_JSON)
+            self.websocket.set_wire_format(wire_format)
+            logger.ok(f"neetbox handshake succeed, using {wire_format} wire format.")
+            ws.send(
+                make_config_status_msg(message.event_id).dumps()
+            )  # send immediately without querying
+            self.websocket.ready = True
+            self.websocket.flush()  # messages held while offline
+            self._set_state(CONNECTION_STATE_ONLINE)
             # return # DO NOT return!
         if message.event_type not in self.subscribers:
             logger.warn(
@@ -303,26 +448,70 @@ class NeetboxClient(metaclass=Singleton):  # singleton
         identity_type=IdentityType.CLI,
         _history_len=-1,
     ):
-        if self.wait_should_online():
-            message = EventMsg(
-                project_id=get_project_id(),
-                run_id=get_run_id(),
-                event_type=event_type,
-                event_id=event_id,
-                identity_type=identity_type,
-                series=series,
-                payload=payload,
-                timestamp=timestamp or get_timestamp(),
-                history_len=_history_len,
-            )
+        if not self.start_connection():
+            return  # offline mode
+        message = EventMsg(
+            project_id=get_project_id(),
+            run_id=get_run_id(),
+            event_type=event_type,
+            event_id=event_id,
+            identity_type=identity_type,
+            series=series,
+            payload=payload,
+            timestamp=timestamp or get_timestamp(),
+            history_len=_history_len,
+        )
+        self._send_message(message)
 
-            self.websocket.send(message)
+    def _send_message(self, message: EventMsg):
+        if self.websocket is None:  # asyncio backend
+            from ._async_client import async_connection
+
+            async_connection.send_nowait(message)
+            return
+        self.websocket.send(message)  # queued until online, never blocks
 
 
 # singleton
 connection = NeetboxClient()
 
 
+def _deliver_queued_messages_on_exit():
+    """short scripts may exit before online, wait for connection a while so that queued messages are not lost"""
+    websocket = connection.websocket
+    if websocket is None or not (
+        len(websocket.message_query) or (websocket.spool and len(websocket.spool))
+    ):
+        return
+    if connection.wait_should_online():  # at most client.connectTimeout
+        websocket.flush()
+
+
+# before websocket is closed, which is registered earlier
+atexit.register(_deliver_queued_messages_on_exit)
+
+
+def _start_aggregator_before_fork():
+    """forked children inherit the run id, let them send through this process instead of connecting on their own"""
+    if connection.online_mode is False or not is_workspace_loaded():
+        return  # children load the workspace with a new run id on their own
+    try:
+        connection.start_aggregator()
+    except Exception as e:
+        logger.err(f"failed to start message aggregator for child processes: {e}")
+
+
+def _reset_connection_after_fork():
+    if inherit_aggregator_after_fork(connection.aggregator):
+        connection._reset_after_fork()
+
+
+if hasattr(os, "register_at_fork"):  # not on windows, where child processes are spawned
+    os.register_at_fork(
+        before=_start_aggregator_before_fork, after_in_child=_reset_connection_after_fork
+    )
+
+
 # assign this connection to websocket log writer
 LogWriters = Registry("LOG_WRITERS")
 
@@ -4,6 +4,7 @@
 # Github: github.com/visualDust
 # Date:   20231122
 
+import asyncio
 import functools
 import inspect
 from ast import literal_eval
@@ -16,6 +17,7 @@ from vdtoys.registry import Registry
 from neetbox._protocol import *
 from neetbox.logging import logger
 
+from .._async_client import async_connection
 from .._client import connection
 
 
@@ -98,6 +100,37 @@ class ActionManager(metaclass=Singleton):
             run_and_callback()
             return
 
+    async def eval_call_async(self, name: str, params: dict, callback: Optional[Callable] = None):
+        """same as eval_call, but for event loops. coroutine function actions run on the loop, other actions run in worker threads. callback could be a coroutine function."""
+        if name not in self.ACTION_POOL:
+            logger.err(f"Could not find action with name {name}, action stopped.")
+            return False
+        target_action: Action = self.ACTION_POOL[name]
+        logger.log(
+            f"Agent runs function '{target_action.name}', blocking = {target_action.blocking}"
+        )
+
+        async def run_and_callback():
+            try:
+                if inspect.iscoroutinefunction(target_action.function):
+                    returned_data = await target_action.eval_call(params)
+                else:
+                    returned_data = await asyncio.to_thread(target_action.eval_call, params)
+            except Exception as e:
+                returned_data = e
+                logger.warn(f"action {target_action} failed with exception {e}")
+            if callback:
+                result = callback(returned_data)
+                if inspect.isawaitable(result):
+                    await result
+
+        if not target_action.blocking:  # non-blocking run in task
+            async_connection._create_task(run_and_callback())
+            return
+        else:  # blocking run, following actions wait
+            await run_and_callback()
+            return
+
     def _initialize(self):
         if not self._is_initialized:
 
@@ -116,6 +149,24 @@ class ActionManager(metaclass=Singleton):
                     ),
                 )
 
+            @async_connection.ws_subscribe(event_type_name=EVENT_TYPE_NAME_ACTION)
+            async def _listen_to_actions_async(message: EventMsg):
+                async def callback(x):
+                    await async_connection.ws_send(
+                        event_type=EVENT_TYPE_NAME_ACTION,
+                        payload={
+                            NAME_KEY: message.payload[NAME_KEY],
+                            (ERROR_KEY if isinstance(x, Exception) else RESULT_KEY): x,
+                        },
+                        event_id=message.event_id,
+                    )
+
+                await actionManager.eval_call_async(
+                    name=message.payload[NAME_KEY],
+                    params=message.payload[ARGS_KEY],
+                    callback=callback,
+                )
+
             self._is_initialized = True
 
     def register(self, name: Optional[str] = None, description: str = None, blocking: bool = False):
@@ -4,16 +4,23 @@
 # Github: github.com/visualDust
 # Date:   20231211
 
+import asyncio
+import atexit
 import io
+import os
+import time
+from threading import Lock, Thread
 from typing import Optional
 
 import numpy as np
 
 from neetbox._protocol import *
-from neetbox.config import get_project_id, get_run_id
+from neetbox.config import get_module_level_config, get_project_id, get_run_id
 from neetbox.logging import logger
+from neetbox.utils.bounded_queue import BoundedQueue
 from neetbox.utils.x2numpy import *
 
+from .._async_client import async_connection
 from .._client import connection
 
 # ===================== IMAGE things ===================== #
@@ -118,15 +125,8 @@ def convert_to_HWC(tensor, input_format):  # tensor: numpy array
         return tensor_CHW.transpose(1, 2, 0)
 
 
-def add_image(name: str, image, dataformats: str = None):
-    """send an image to frontend display
-
-    Args:
-        image (Union[np.array, Image.Image, Tensor]): image from cv2 and PIL.Image as well as tensors are supported
-        name (str): name of the image, used in frontend display
-        dataformats (str): if you are passing a tensor as image, please indicate how to understand the tensor. For example, dataformats="NCWH" means the first axis of the tensor is Number of batches, the second axis is Channel, and the third axis is Width, and the fourth axis is Height.
-
-    """
+def _encode_image(image, dataformats: str = None) -> bytes:
+    """encode image into png bytes, see add_image for args"""
     from PIL import Image
 
     if isinstance(image, Image.Image):  # is PIL Image
@@ -146,27 +146,210 @@ def add_image(name: str, image, dataformats: str = None):
 
             _, im_buf_arr = cv2.imencode(".png", image)
             image_bytes = im_buf_arr.tobytes()
+    return image_bytes
+
 
-    # send bytes
-    project_id = get_project_id()
-    run_id = get_run_id()
+def _image_metadata(name: str) -> str:
+    """metadata sent along with image bytes"""
+    return EventMsg(
+        project_id=get_project_id(),
+        run_id=get_run_id(),
+        identity_type=IdentityType.CLI,
+        series=name,
+        event_type=EVENT_TYPE_NAME_IMAGE,
+        timestamp=get_timestamp(),
+    ).dumps()
+
+
+def _check_upload_result(result):
+    response_dict = result.json()
+    assert (
+        RESULT_KEY in response_dict and response_dict[RESULT_KEY] == "ok"
+    ), "server response not ok"
+
+
+def _upload_images(images: list):
+    """upload a list of (metadata, image_bytes). more than one image go in a single request to the batch endpoint."""
     try:
-        message = EventMsg(
-            project_id=project_id,
-            run_id=run_id,
-            identity_type=IdentityType.CLI,
-            series=name,
-            event_type=EVENT_TYPE_NAME_IMAGE,
-        )
-        result = connection.post_check_online(
-            api=f"{API_ROOT}/project/{project_id}/image",
-            data={METADATA_KEY: message.dumps()},
+        if len(images) == 1:
+            [(metadata, image_bytes)] = images
+            result = connection.post_check_online(
+                api=f"{API_ROOT}/project/{get_project_id()}/image",
+                data={METADATA_KEY: metadata},
+                files={"image": image_bytes},
+            )
+        else:
+            result = connection.post_check_online(
+                api=f"{API_ROOT}/project/{get_project_id()}/images",
+                data={METADATA_KEY: [metadata for metadata, _ in images]},
+                files=[
+                    ("images", (f"{i}.png", image_bytes))
+                    for i, (_, image_bytes) in enumerate(images)
+                ],
+            )
+        _check_upload_result(result)
+        return True
+    except Exception as e:
+        logger.warn(f"unable to upload {len(images)} image(s): {e}")
+        return False
+
+
+def _snapshot_image(image):
+    """copy the image so that the caller could reuse its buffer while the copy waits in queue"""
+    from PIL import Image
+
+    if isinstance(image, (np.ndarray, Image.Image)):
+        return image.copy()
+    if hasattr(image, "detach") and hasattr(image, "clone"):  # torch tensors
+        return image.detach().clone()
+    return image  # converted into numpy later
+
+
+class _LatencyStats:
+    def __init__(self) -> None:
+        self.count = 0
+        self.total = 0.0
+        self.max = 0.0
+        self.last = 0.0
+
+    def add(self, seconds: float):
+        self.count += 1
+        self.total += seconds
+        self.max = max(self.max, seconds)
+        self.last = seconds
+
+    @property
+    def json(self):
+        return {
+            "last": self.last,
+            "avg": self.total / self.count if self.count else 0.0,
+            "max": self.max,
+        }
+
+
+class ImageUploadPool:
+    """Bounded pool of worker threads converting, encoding and uploading images off the caller's thread. What happens when the queue is full is decided by client.image.policy, see BoundedQueue. Images piled up in queue are uploaded in one request, at most client.image.batchSize queued calls at a time."""
+
+    def __init__(self) -> None:
+        self.queue: BoundedQueue = None  # created on first use
+        self.num_uploaded = 0
+        self.num_failed = 0
+        self.num_requests = 0
+        self.encode_latency = _LatencyStats()
+        self.upload_latency = _LatencyStats()
+        self._thread_safe_lock = Lock()
+        self._exit_timeout = None  # set once join is registered on exit
+
+    def _start(self):
+        with self._thread_safe_lock:
+            if self.queue is not None:
+                return
+            config = get_module_level_config()["image"]
+            self.queue = BoundedQueue(maxsize=config["queueSize"], policy=config["policy"])
+            self.batch_size = config["batchSize"]
+            for _ in range(config["workers"]):
+                Thread(target=self._worker_loop, daemon=True).start()
+            if self._exit_timeout is None:
+                self._exit_timeout = config["exitTimeout"]
+                atexit.register(lambda: self.join(timeout=self._exit_timeout))
+
+    def _reset_after_fork(self):
+        """worker threads are not forked, and images queued before fork are uploaded by the parent. the pool of the child starts again on first use"""
+        self.queue = None
+        self._thread_safe_lock = Lock()
+
+    def put(self, name: str, image, dataformats: str = None) -> bool:
+        """queue an image for upload
+
+        Returns:
+            bool: False if dropped because the queue is full
+        """
+        return self.put_many(name, [image], dataformats)
+
+    def put_many(self, name: str, images: list, dataformats: str = None) -> bool:
+        """queue images of the same series as a whole, they are uploaded in one request
+
+        Returns:
+            bool: False if dropped because the queue is full
+        """
+        if self.queue is None:
+            self._start()
+        metadata = _image_metadata(name)  # timestamp of now instead of upload time
+        return self.queue.put([(metadata, _snapshot_image(image), dataformats) for image in images])
+
+    def _worker_loop(self):
+        while True:
+            jobs = self.queue.get_many(self.batch_size)  # upload what has piled up in one request
+            try:
+                encoded = []
+                for metadata, image, dataformats in (image for job in jobs for image in job):
+                    try:
+                        time_begin = time.perf_counter()
+                        encoded.append((metadata, _encode_image(image, dataformats)))
+                        self.encode_latency.add(time.perf_counter() - time_begin)
+                    except Exception as e:
+                        self.num_failed += 1
+                        logger.warn(f"unable to encode image: {e}")
+                if not encoded:
+                    continue
+                time_begin = time.perf_counter()
+                if _upload_images(encoded):
+                    self.upload_latency.add(time.perf_counter() - time_begin)
+                    self.num_uploaded += len(encoded)
+                    self.num_requests += 1
+                else:
+                    self.num_failed += len(encoded)
+            finally:
+                self.queue.task_done(len(jobs))
+
+    def join(self, timeout: float = None) -> bool:
+        """wait until queued images are uploaded
+
+        Returns:
+            bool: False on timeout
+        """
+        return self.queue.join(timeout) if self.queue is not None else True
+
+    @property
+    def stats(self):
+        return {
+            "queueDepth": len(self.queue) if self.queue is not None else 0,
+            "numUploaded": self.num_uploaded,
+            "numFailed": self.num_failed,
+            "numRequests": self.num_requests,
+            "numDropped": self.queue.num_dropped if self.queue is not None else 0,
+            "encodeLatency": self.encode_latency.json,
+            "uploadLatency": self.upload_latency.json,
+        }
+
+
+image_upload_pool = ImageUploadPool()
+if hasattr(os, "register_at_fork"):
+    os.register_at_fork(after_in_child=image_upload_pool._reset_after_fork)
+
+
+def add_image(name: str, image, dataformats: str = None):
+    """send an image to frontend display. conversion, encoding and upload happen in background workers, see image_upload_pool.
+
+    Args:
+        image (Union[np.array, Image.Image, Tensor]): image from cv2 and PIL.Image as well as tensors are supported
+        name (str): name of the image, used in frontend display
+        dataformats (str): if you are passing a tensor as image, please indicate how to understand the tensor. For example, dataformats="NCWH" means the first axis of the tensor is Number of batches, the second axis is Channel, and the third axis is Width, and the fourth axis is Height.
+
+    """
+    image_upload_pool.put(name, image, dataformats)
+
+
+async def add_image_async(name: str, image, dataformats: str = None):
+    """same as add_image, but for event loops. the image is encoded in a worker thread and uploaded with the asyncio client."""
+    image_bytes = await asyncio.to_thread(_encode_image, image, dataformats)
+    try:
+        result = await async_connection.post_check_online(
+            api=f"{API_ROOT}/project/{get_project_id()}/image",
+            data={METADATA_KEY: _image_metadata(name)},
             files={"image": image_bytes},
         )
-        response_dict = result.json()
-        assert (
-            RESULT_KEY in response_dict and response_dict[RESULT_KEY] == "ok"
-        ), "server response not ok"
+        _check_upload_result(result)
     except Exception as e:
         logger.warn(f"unable to upload image: {e}")
 
@@ -180,12 +363,14 @@ def add_figure(name: str, figure, close: Optional[bool] = True):
 
     Args:
         tag: Data identifier
-        figure (matplotlib.pyplot.figure) or list of figures: Figure or a list of figures
+        figure (matplotlib.pyplot.figure) or list of figures: Figure or a list of figures, each figure in the list becomes an image of the series
         global_step: Global step value to record
         close: Flag to automatically close the figure
         walltime: Override default walltime (time.time()) of event
     """
-    if isinstance(figure, list):
-        add_image(name=name, image=figure_to_image(figure, close), dataformats="NCHW")
+    if isinstance(figure, list):  # one image per figure, uploaded in one request
+        image_upload_pool.put_many(
+            name=name, images=list(figure_to_image(figure, close)), dataformats="CHW"
+        )
     else:
         add_image(name=name, image=figure_to_image(figure, close), dataformats="CHW")
@@ -10,6 +10,7 @@ from uuid import uuid4
 from vdtoys.framing import get_caller_info_traceback
 
 from neetbox._protocol import *
+from neetbox.config import get_module_level_config
 from neetbox.utils.massive import describe_object
 
 from .._client import connection
@@ -21,6 +22,10 @@ class Progress:
     iterator: enumerate
     timestamp: str
 
+    # class level static, updates of the same name are coalesced
+    _min_update_interval: float = None  # from client.progress.maxFrequency
+    _name2last_update_time = {}
+
     def __init__(self, input: Union[int, enumerate, any], *, name=None):
         """Decorate an iterable object, returning an iterator. Neetbox will send progress to frontend while you are iterating through it.
 
@@ -38,10 +43,13 @@ class Progress:
             self.total = len(input)
             self.iterator = iter(input)
         self.caller_identity = get_caller_info_traceback(stack_offset=2)
+        self._series = self.caller_identity.strid + (self.name or "")
 
         self.done = 0
         self.start_time = time()  # Track the start time
         self.timestamp = get_timestamp()
+        self._last_item = None  # of a coalesced update, sent as final state on close
+        self._has_pending_update = False
 
     def __enter__(self):
         # print(f"entering {self.caller_identity}")
@@ -49,11 +57,30 @@ class Progress:
 
     def __exit__(self, type, value, traceback):
         # print(f"leaving {self.caller_identity}")
-        return
+        self.close()
+
+    def close(self):
+        """send the coalesced update left, if any, as the final state. called once exhausted or when leaving the with block, call it after leaving the loop early otherwise."""
+        if self._has_pending_update:
+            self._send_current(self._last_item)
+            self._has_pending_update = False
+        self._last_item = None
 
     def __iter__(self):
         return self
 
+    @classmethod
+    def _should_update(cls, name: str, force: bool = False) -> bool:
+        """whether an update of name should be sent now, at most client.progress.maxFrequency updates per second"""
+        if cls._min_update_interval is None:
+            max_frequency = get_module_level_config()["progress"]["maxFrequency"]
+            cls._min_update_interval = 1 / max_frequency if max_frequency > 0 else 0
+        now = time()
+        if not force and now - cls._name2last_update_time.get(name, 0) < cls._min_update_interval:
+            return False
+        cls._name2last_update_time[name] = now
+        return True
+
     @classmethod
     def _update(
         cls,
@@ -64,6 +91,28 @@ class Progress:
         total: int,
         rate: float,
         timestamp=None,
+        force: bool = False,
+    ) -> bool:
+        """send progress of name, coalesced to client.progress.maxFrequency unless forced. updates reaching total are always sent.
+
+        Returns:
+            bool: whether sent
+        """
+        if not cls._should_update(name, force=force or (total is not None and done >= total)):
+            return False
+        cls._send(
+            name=name,
+            what_is_current=what_is_current,
+            done=done,
+            total=total,
+            rate=rate,
+            timestamp=timestamp,
+        )
+        return True
+
+    @classmethod
+    def _send(
+        cls, *, name: str, what_is_current: any, done: int, total: int, rate: float, timestamp=None
     ):
         connection.ws_send(
             event_type=EVENT_TYPE_NAME_PROGRESS,
@@ -79,22 +128,35 @@ class Progress:
             _history_len=1,
         )
 
-    def __next__(self):
-        if self.total and self.done > self.total:
-            raise StopIteration
-        self.done += 1
+    def _send_current(self, item):
         elapsed_time = time() - self.start_time
         rate = self.done / elapsed_time if elapsed_time > 0 else 0  # Calculate the iteration rate
-        iter_next = next(self.iterator)
-
-        self.__class__._update(
-            name=self.caller_identity.strid + (self.name or ""),
+        self.__class__._send(
+            name=self._series,
             done=self.done,
-            what_is_current=describe_object(iter_next, length_limit=16),
+            what_is_current=describe_object(item, length_limit=16),
             total=self.total,
             rate=rate if self.done > 1 else -1.0,
             timestamp=self.timestamp,
         )
+
+    def __next__(self):
+        if self.total and self.done > self.total:
+            raise StopIteration
+        try:
+            iter_next = next(self.iterator)
+        except StopIteration:
+            self.close()  # always send the final state
+            raise
+        self.done += 1
+        is_final = self.total is not None and self.done >= self.total
+        if self.__class__._should_update(self._series, force=is_final):
+            self._send_current(iter_next)
+            self._has_pending_update = False
+            self._last_item = None
+        else:  # coalesced, describe and send it later only if it turns out to be the last one
+            self._has_pending_update = True
+            self._last_item = iter_next
         return iter_next
 
     def __len__(self):
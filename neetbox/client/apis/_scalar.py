@@ -4,11 +4,293 @@
 # Github: github.com/visualDust
 # Date:   20231211
 
+import atexit
+import os
+import time
+from threading import Event, RLock, Thread
+from typing import Callable, Dict
+
 from neetbox._protocol import *
+from neetbox.config import get_module_level_config
+from neetbox.logging import logger
 from neetbox.utils.x2numpy import *
 
 from .._client import connection
 
+# ===================== REDUCING things ===================== #
+
+SCALAR_POLICY_NONE = "none"  # send every point
+# at most maxPointsPerSecond points per second, extremes kept count against it
+SCALAR_POLICY_RATE = "rate"
+SCALAR_POLICY_EVERY = "every"  # buckets of every points, keeping the last point of each
+# buckets of bucketSeconds seconds, keeping min, max and last of each
+SCALAR_POLICY_BUCKET = "bucket"
+SCALAR_POLICIES = [
+    SCALAR_POLICY_NONE,
+    SCALAR_POLICY_RATE,
+    SCALAR_POLICY_EVERY,
+    SCALAR_POLICY_BUCKET,
+]
+SCALAR_FLUSH_INTERVAL = 0.1  # seconds between checks of time based buckets expired
+
+
+class _ScalarBucket:
+    __slots__ = ("begin", "count", "min", "max", "last")
+
+    def __init__(self, begin: float, point: tuple) -> None:
+        self.begin = begin
+        self.count = 1
+        self.min = self.max = self.last = point  # (index in bucket, x, y)
+
+    def add(self, x, y):
+        point = (self.count, x, y)
+        self.count += 1
+        if y < self.min[2]:
+            self.min = point
+        if y > self.max[2]:
+            self.max = point
+        self.last = point
+
+    def points(self, keep_extremes: bool):
+        kept = [self.min, self.max, self.last] if keep_extremes else [self.last]
+        return [(x, y) for _, x, y in sorted(set(kept))]  # in the order they came
+
+
+class ScalarReducer:
+    """Client side per series decimation of scalars. Points of a series are grouped into buckets, and only a few points of each bucket are sent once the bucket is closed. Bucket extremes are kept by default, so spikes are never hidden. Time based buckets are closed by a background thread once expired, even if no more points come, and pending buckets are flushed on exit.
+
+    Policies are read from client.scalar in workspace config, where client.scalar.series overrides them for specific series. set_policy overrides both.
+    """
+
+    def __init__(
+        self,
+        send: Callable[[str, list], None] = None,
+        flush_interval: float = SCALAR_FLUSH_INTERVAL,
+    ) -> None:
+        """
+        Args:
+            send (Callable[[str, list], None], optional): called with series name and points of time based buckets closed by the flusher thread. no flusher thread if None. Defaults to None.
+            flush_interval (float, optional): seconds between checks of expired buckets. Defaults to SCALAR_FLUSH_INTERVAL.
+        """
+        self._policies = {}  # series name -> resolved policy dict
+        self._overrides = {}  # series name -> policy dict given by set_policy
+        self._buckets = {}  # series name -> _ScalarBucket
+        self._stats = {}  # series name -> [points in, points out]
+        self._lock = RLock()
+        self._send = send
+        self._flush_interval = flush_interval
+        self._flusher_thread: Thread = None  # started once a time based bucket opens
+        self._stop_flusher = Event()
+
+    def set_policy(
+        self,
+        series: str,
+        policy: str,
+        max_points_per_second: float = None,
+        every: int = None,
+        bucket_seconds: float = None,
+        keep_extremes: bool = None,
+    ):
+        """set reducing policy of a series, None values fall back to config. the pending bucket of the series is closed by the old policy first, and sent if send is given.
+
+        Args:
+            series (str): name of the series
+            policy (str): one of "none", "rate", "every" and "bucket"
+            max_points_per_second (float, optional): points per second of "rate" policy, min and max of buckets included. Defaults to None.
+            every (int, optional): bucket size of "every" policy. Defaults to None.
+            bucket_seconds (float, optional): bucket span of "bucket" policy. Defaults to None.
+            keep_extremes (bool, optional): whether to send min and max of buckets as well, always True for "bucket" policy. Defaults to None.
+
+        Returns:
+            list: points of the pending bucket closed
+        """
+        if policy not in SCALAR_POLICIES:
+            raise ValueError(f"unknown scalar policy {policy}, should be one of {SCALAR_POLICIES}")
+        override = {
+            "policy": policy,
+            "maxPointsPerSecond": max_points_per_second,
+            "every": every,
+            "bucketSeconds": bucket_seconds,
+            "keepExtremes": keep_extremes,
+        }
+        with self._lock:
+            points = self._flush_series(series) if series in self._buckets else []
+            if points and self._send is not None:
+                self._send(series, points)
+            self._overrides[series] = {k: v for k, v in override.items() if v is not None}
+            self._policies.pop(series, None)
+            return points
+
+    def _policy_of(self, series: str):
+        policy = self._policies.get(series)
+        if policy is None:
+            config = get_module_level_config()["scalar"]
+            policy = {k: v for k, v in config.items() if k != "series"}
+            policy.update(config["series"].get(series, {}))
+            policy.update(self._overrides.get(series, {}))
+            if policy["policy"] not in SCALAR_POLICIES:
+                raise ValueError(f"unknown scalar policy {policy['policy']} of series {series}")
+            policy["keepExtremes"] = (
+                policy["keepExtremes"] or policy["policy"] == SCALAR_POLICY_BUCKET
+            )
+            points_per_bucket = 3 if policy["keepExtremes"] else 1  # at most
+            policy["span"] = {  # when to close a bucket
+                SCALAR_POLICY_RATE: points_per_bucket / policy["maxPointsPerSecond"],
+                SCALAR_POLICY_EVERY: policy["every"],
+                SCALAR_POLICY_BUCKET: policy["bucketSeconds"],
+            }.get(policy["policy"])
+            self._policies[series] = policy
+        return policy
+
+    def add(self, series: str, x, y):
+        """add a point of a series
+
+        Returns:
+            list: points to send now, could be empty
+        """
+        with self._lock:
+            policy = self._policy_of(series)
+            stats = self._stats.setdefault(series, [0, 0])
+            stats[0] += 1
+            if policy["policy"] == SCALAR_POLICY_NONE:
+                stats[1] += 1
+                return [(x, y)]
+            bucket = self._buckets.get(series)
+            now = time.monotonic()
+            points = []
+            if (  # time based buckets close when a point comes after their span
+                bucket is not None
+                and policy["policy"] != SCALAR_POLICY_EVERY
+                and now - bucket.begin >= policy["span"]
+            ):
+                points = self._flush_series(series)
+                bucket = None
+            if bucket is None:
+                self._buckets[series] = bucket = _ScalarBucket(now, (0, x, y))
+                if policy["policy"] != SCALAR_POLICY_EVERY:
+                    self._start_flusher()
+            else:
+                bucket.add(x, y)
+            if policy["policy"] == SCALAR_POLICY_EVERY and bucket.count >= policy["span"]:
+                points += self._flush_series(series)
+            return points
+
+    def add_many(self, series: str, xs: list, ys: list):
+        """add points of a series, see add"""
+        with self._lock:
+            if self._policy_of(series)["policy"] == SCALAR_POLICY_NONE:  # fast path
+                stats = self._stats.setdefault(series, [0, 0])
+                stats[0] += len(xs)
+                stats[1] += len(xs)
+                return list(zip(xs, ys))
+            points = []
+            for x, y in zip(xs, ys):
+                points += self.add(series, x, y)
+            return points
+
+    def _flush_series(self, series: str):
+        bucket = self._buckets.pop(series, None)
+        if bucket is None:
+            return []
+        points = bucket.points(keep_extremes=self._policy_of(series)["keepExtremes"])
+        self._stats[series][1] += len(points)
+        return points
+
+    def _start_flusher(self):
+        if self._send is None or self._flusher_thread is not None:
+            return
+        self._flusher_thread = Thread(target=self._flusher_loop, daemon=True)
+        self._flusher_thread.start()
+
+    def _reset_after_fork(self):
+        """the flusher thread is not forked, and pending buckets are sent by the parent. the flusher of the child starts again once a time based bucket opens"""
+        self._buckets = {}
+        self._lock = RLock()
+        self._flusher_thread = None
+
+    def _flusher_loop(self):
+        while not self._stop_flusher.wait(self._flush_interval):
+            try:
+                with self._lock:  # sent under lock, so that points of a series keep their order
+                    for series, points in self.flush_expired().items():
+                        try:
+                            self._send(series, points)
+                        except Exception as e:
+                            logger.warn(
+                                f"failed to send reduced points of scalar series '{series}': {e}"
+                            )
+            except Exception as e:  # keep flushing the other series
+                logger.warn(f"failed to close expired scalar buckets: {e}")
+
+    def flush_expired(self):
+        """close time based buckets which have been open longer than their span
+
+        Returns:
+            dict: series name -> points to send
+        """
+        with self._lock:
+            now = time.monotonic()
+            expired = []
+            for series, bucket in self._buckets.items():
+                policy = self._policy_of(series)
+                if policy["policy"] == SCALAR_POLICY_EVERY or policy["span"] is None:
+                    continue  # not time based
+                if now - bucket.begin >= policy["span"]:
+                    expired.append(series)
+            return {series: self._flush_series(series) for series in expired}
+
+    def flush(self):
+        """close pending buckets
+
+        Returns:
+            dict: series name -> points to send
+        """
+        with self._lock:
+            return {series: self._flush_series(series) for series in list(self._buckets)}
+
+    @property
+    def stats(self):
+        """points in, points out and reduction ratio (points out / points in) of every series"""
+        with self._lock:
+            return {
+                series: {
+                    "numIn": num_in,
+                    "numOut": num_out,
+                    "ratio": num_out / num_in if num_in else 1.0,
+                }
+                for series, (num_in, num_out) in self._stats.items()
+            }
+
+
+def _send_points(name: str, points: list):
+    if len(points) == 1:
+        [(x, y)] = points
+        connection.ws_send(event_type=EVENT_TYPE_NAME_SCALAR, series=name, payload={"x": x, "y": y})
+    elif points:  # columnar
+        xs, ys = zip(*points)
+        connection.ws_send(
+            event_type=EVENT_TYPE_NAME_SCALAR, series=name, payload={"x": list(xs), "y": list(ys)}
+        )
+
+
+scalar_reducer = ScalarReducer(send=_send_points)
+if hasattr(os, "register_at_fork"):
+    os.register_at_fork(after_in_child=scalar_reducer._reset_after_fork)
+
+
+def _flush_scalar_reducer_on_exit():
+    for series, points in scalar_reducer.flush().items():
+        _send_points(series, points)
+    for series, stats in scalar_reducer.stats.items():
+        if stats["numOut"] < stats["numIn"]:
+            logger.debug(
+                f"scalar series '{series}' reduced from {stats['numIn']} to {stats['numOut']} points, ratio {stats['ratio']:.4f}"
+            )
+
+
+# before websocket is closed, which is registered earlier
+atexit.register(_flush_scalar_reducer_on_exit)
+
 # ===================== PLOTTING things ===================== #
 
 
@@ -20,5 +302,27 @@ def add_scalar(name: str, x: Union[int, float], y: Union[int, float]):
         x (Union[int, float]): x
         y (Union[int, float]): y
     """
-    # send
-    connection.ws_send(event_type=EVENT_TYPE_NAME_SCALAR, series=name, payload={"x": x, "y": y})
+    # send what is left after reducing, see scalar_reducer
+    _send_points(name, scalar_reducer.add(name, x, y))
+
+
+def add_scalars(name: Union[str, Dict[str, Any]], xs, ys=None):
+    """send a batch of scalars to frontend display as one columnar message per series
+
+    Args:
+        name (Union[str, Dict[str, Any]]): name of the series. or a dict of series name to ys, all the series share the same xs
+        xs (Union[list, np.ndarray, Tensor]): x of the points
+        ys (Union[list, np.ndarray, Tensor], optional): y of the points, ignored if name is a dict. Defaults to None.
+    """
+    series2ys = name if isinstance(name, dict) else {name: ys}
+    xs = make_np(xs).reshape(-1).tolist()
+    for series, ys in series2ys.items():
+        ys = make_np(ys).reshape(-1).tolist()
+        if len(xs) != len(ys):
+            raise ValueError(f"got {len(xs)} xs but {len(ys)} ys for series {series}")
+        _send_points(series, scalar_reducer.add_many(series, xs, ys))
+
+
+async def add_scalar_async(name: str, x: Union[int, float], y: Union[int, float]):
+    """same as add_scalar, but for event loops. never waits, messages are queued to the connection of the running loop if client.backend is "asyncio"."""
+    _send_points(name, scalar_reducer.add(name, x, y))
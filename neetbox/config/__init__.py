@@ -39,4 +39,11 @@ def get_run_id():
     return get_module_level_config("@")[RUN_ID_KEY]
 
 
+def is_workspace_loaded() -> bool:
+    """whether workspace config is loaded, without loading it"""
+    from . import project
+
+    return project._IS_WORKSPACE_LOADED
+
+
 __all__ = ["get_module_level_config", "export_default_config", "get_project_id", "get_run_id"]
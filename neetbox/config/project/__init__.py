@@ -41,6 +41,31 @@ _DEFAULT_WORKSPACE_CONFIG = {
         "mode": "detached",
         "uploadInterval": 1,
         "shell": {"enable": True, "daemon": True},
+        "backend": "thread",
+        "connectTimeout": 10,
+        "offlineBufferSize": 10000,
+        "wireFormat": "binary",
+        "batch": {"enable": True, "size": 64, "interval": 0.05, "queueSize": 10000},
+        "spool": {"enable": False, "maxSizeMB": 256, "segmentSizeMB": 4, "policy": "drop-oldest"},
+        "scalar": {
+            "policy": "none",
+            "maxPointsPerSecond": 20,
+            "every": 10,
+            "bucketSeconds": 1.0,
+            "keepExtremes": True,
+            "series": {},
+        },
+        "progress": {"maxFrequency": 10},
+        "image": {
+            "workers": 2,
+            "queueSize": 64,
+            "batchSize": 16,
+            "policy": "block",
+            "exitTimeout": 30,
+        },
+        # forked child processes send through the connection of their parent, spawned ones of
+        # the same project as well if spawned is True
+        "aggregate": {"enable": True, "spawned": False},
     },
 }
 
@@ -20,6 +20,7 @@ _GLOBAL_CONFIG = {
     MACHINE_ID_KEY: str(uuid4()),
     "vault": get_create_initial_neetbox_data_directory(),
     "bypass-db-version-check": True,
+    "hardware-monitor-interval": 1.0,  # seconds between hardware updates sent to server monitors
 }
 
 _GLOBAL_CONFIG_FILE_NAME = f"neetbox.global.toml"
@@ -47,8 +48,10 @@ def update_dict_recursively_on_missing_keys(A, B):
 def overwrite_create_local(config: dict):
     neetbox_config_dir = get_create_neetbox_config_directory()
     config_file_path = os.path.join(neetbox_config_dir, _GLOBAL_CONFIG_FILE_NAME)
-    with open(config_file_path, "w+") as config_file:
+    temp_file_path = f"{config_file_path}.{os.getpid()}.tmp"
+    with open(temp_file_path, "w+") as config_file:
         toml.dump(config, config_file)
+    os.replace(temp_file_path, config_file_path)  # processes reading never see it half written
 
 
 def read_create_local():
@@ -60,9 +63,10 @@ def read_create_local():
     # read local file
     user_cfg = check_read_toml(config_file_path)
     assert user_cfg
-    update_dict_recursively_on_missing_keys(_GLOBAL_CONFIG, user_cfg)
+    missed_keys = update_dict_recursively_on_missing_keys(_GLOBAL_CONFIG, user_cfg)
     _GLOBAL_CONFIG.update(user_cfg)
-    overwrite_create_local(_GLOBAL_CONFIG)
+    if missed_keys:  # complete the file with defaults
+        overwrite_create_local(_GLOBAL_CONFIG)
 
 
 def set(key, value):
@@ -157,16 +157,16 @@ class NeetboxTrainerCallback(TrainerCallback):
                 last_update_epoch_time = self._status["last_update_epoch_time"]
                 elapsed_time = time() - last_update_epoch_time
                 rate = (state.epoch - last_update_epoch) / elapsed_time
-                progress._update(
+                if progress._update(
                     name="epoch",
                     what_is_current=f"of current step {int(state.global_step)}",
                     done=int(state.epoch),
                     total=int(args.num_train_epochs),
                     rate=rate,
                     timestamp=self._launched_time_stamp,
-                )
-                self._status["last_update_epoch"] = state.epoch
-                self._status["last_update_epoch_time"] = time()
+                ):  # coalesced updates keep measuring rate from the last one sent
+                    self._status["last_update_epoch"] = state.epoch
+                    self._status["last_update_epoch_time"] = time()
 
         # Update progress bar for step
         if not self._status["last_update_step"]:
@@ -178,16 +178,16 @@ class NeetboxTrainerCallback(TrainerCallback):
                 last_update_step_time = self._status["last_update_step_time"]
                 elapsed_time = time() - last_update_step_time
                 rate = (state.global_step - last_update_step) / elapsed_time
-                progress._update(
+                if progress._update(
                     name="step",
                     what_is_current=f"of epoch {int(state.epoch)}",
                     done=int(state.global_step),
                     total=int(state.max_steps),
                     rate=rate,
                     timestamp=self._launched_time_stamp,
-                )
-                self._status["last_update_step"] = state.global_step
-                self._status["last_update_step_time"] = time()
+                ):  # coalesced updates keep measuring rate from the last one sent
+                    self._status["last_update_step"] = state.global_step
+                    self._status["last_update_step_time"] = time()
 
     def on_log(
         self,
@@ -1,5 +1,6 @@
 from ._formatting import LogStyle, RawLog
 from ._logger import DEFAULT_LOGGER as logger
 from ._logger import Logger, LogLevel
+from ._reader import read_logs
 
-__all__ = ["logger", "Logger", "LogLevel", "LogStyle", "RawLog"]
+__all__ = ["logger", "Logger", "LogLevel", "LogStyle", "RawLog", "read_logs"]
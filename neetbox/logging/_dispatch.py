@@ -0,0 +1,129 @@
+# -*- coding: utf-8 -*-
+#
+# Author: GavinGong aka VisualDust
+# Github: github.com/visualDust
+# Date:   20261018
+
+import atexit
+import threading
+import warnings
+from queue import Empty
+
+from vdtoys.framing import TracebackInfo
+
+from neetbox.utils.bounded_queue import QUEUE_POLICY_DROP_NEWEST, BoundedQueue
+
+from ._formatting import RawLog
+
+
+def call_writers(writers: list, log: RawLog):
+    for writer_name, writer_func in writers:
+        try:
+            writer_func(log)
+        except Exception as e:
+            warnings.warn(f"log writer {writer_name} fialed: {e}")
+
+
+class LogDispatcher:
+    """fan logs out to their writers on a single background thread, so slow terminals, files or networks do not slow down the logging thread. logs keep their order.
+
+    When the queue is full the policy applies, see BoundedQueue. The number of dropped logs is reported as a warning through the writers of the next dispatched log.
+    """
+
+    def __init__(
+        self, queue_size: int = 10000, policy: str = QUEUE_POLICY_DROP_NEWEST, batch_size: int = 64
+    ):
+        self.queue = BoundedQueue(queue_size, policy)
+        self.batch_size = batch_size
+        self.exit_timeout = 5  # seconds to wait for the queue on exit
+        self.num_dispatched = 0
+        self._num_dropped_reported = 0
+        self._thread: threading.Thread = None
+        self._lock = threading.Lock()
+
+    @property
+    def num_dropped(self) -> int:
+        return self.queue.num_dropped
+
+    @property
+    def stats(self) -> dict:
+        return {
+            "queueDepth": len(self.queue),
+            "numDispatched": self.num_dispatched,
+            "numDropped": self.num_dropped,
+        }
+
+    @property
+    def in_dispatcher_thread(self) -> bool:
+        return self._thread is threading.current_thread()
+
+    def start(self):
+        with self._lock:
+            if self._thread is not None:
+                return
+            self._thread = threading.Thread(
+                target=self._run, name="neetbox log dispatcher", daemon=True
+            )
+            self._thread.start()
+            # registered after the exit hooks of websocket client and of buffered writers, which
+            # register theirs on import, so queued logs are written before those are flushed
+            atexit.register(self.flush, self.exit_timeout)
+
+    def _reset_after_fork(self):
+        """the dispatcher thread of the parent process is not running in a forked child. logs queued in the parent are not written twice."""
+        self.queue = BoundedQueue(self.queue.maxsize, self.queue.policy)
+        self._num_dropped_reported = 0
+        self._thread = None
+        self._lock = threading.Lock()
+
+    def put(self, writers: list, log: RawLog) -> bool:
+        """queue a log for its writers
+
+        Returns:
+            bool: False if the log is dropped
+        """
+        if self._thread is None:
+            self.start()
+        if (
+            self.in_dispatcher_thread
+        ):  # logged by a writer, waiting for the queue here may never end
+            call_writers(writers, log)
+            return True
+        return self.queue.put((writers, log))
+
+    def flush(self, timeout: float = None) -> bool:
+        """wait until queued logs are written
+
+        Returns:
+            bool: False on timeout
+        """
+        if self._thread is None or self.in_dispatcher_thread:
+            return True
+        return self.queue.join(timeout)
+
+    def _report_dropped(self, writers: list):
+        num_dropped = self.queue.num_dropped
+        if num_dropped == self._num_dropped_reported:
+            return
+        call_writers(
+            writers,
+            RawLog(
+                message=f"{num_dropped - self._num_dropped_reported} logs dropped, log dispatch queue is full.",
+                caller_info=TracebackInfo(),
+                caller_name_alias="LOG DISPATCHER",
+                series="warning",
+            ),
+        )
+        self._num_dropped_reported = num_dropped
+
+    def _run(self):
+        while True:
+            try:
+                batch = self.queue.get_many(self.batch_size)
+            except Empty:
+                continue
+            for writers, log in batch:
+                self._report_dropped(writers)
+                call_writers(writers, log)
+            self.num_dispatched += len(batch)
+            self.queue.task_done(len(batch))
@@ -1,62 +1,130 @@
-# -*- coding: utf-8 -*-
-#
-# Author: GavinGong aka VisualDust
-# Github: github.com/visualDust
-# Date:   20230318
-
-from dataclasses import dataclass, field
-from datetime import datetime
-from typing import Optional
-
-from vdtoys.framing import TracebackInfo
-
-from neetbox._protocol import *
-
-
-@dataclass
-class LogStyle:
-    datetime_format: Optional[str] = r"%Y-%m-%dT%H:%M:%S.%f"
-    caller_info_format: Optional[str] = r"%m/%c/%f"
-
-
-@dataclass
-class RawLog:
-    message: str
-    caller_info: TracebackInfo
-    caller_name_alias: Optional[str] = None
-    timestamp: datetime = datetime.now()
-    series: Optional[str] = None
-    style: LogStyle = field(default_factory=LogStyle)  # fix python 3.11 dataclass issue
-
-    @property
-    def timestamp_formatted(self):
-        return (
-            self.timestamp.strftime(self.style.datetime_format)
-            if self.style.datetime_format
-            else ""
-        )
-
-    @property
-    def caller_info_formatted(self):
-        if self.caller_name_alias:
-            return str(self.caller_name_alias)
-        return (
-            self.caller_info.format(self.style.caller_info_format)
-            if self.style.caller_info_format
-            else ""
-        )
-
-    @property
-    def json(self) -> dict:
-        return {
-            SERIES_KEY: self.series,
-            MESSAGE_KEY: self.message,
-            TIMESTAMP_KEY: self.timestamp_formatted,
-            CALLER_ID_KEY: self.caller_info_formatted,
-        }
-
-    def __repr__(self) -> str:
-        result = ""
-        for k, v in self.json.items():
-            result += f"{k}: {v}\n"
-        return result
+# -*- coding: utf-8 -*-
+#
+# Author: GavinGong aka VisualDust
+# Github: github.com/visualDust
+# Date:   20230318
+
+import copy
+import os
+import sys
+from dataclasses import dataclass, field
+from datetime import datetime
+from typing import Optional
+
+from vdtoys.framing import TracebackInfo
+
+from neetbox._protocol import *
+
+
+@dataclass
+class LogStyle:
+    datetime_format: Optional[str] = r"%Y-%m-%dT%H:%M:%S.%f"
+    caller_info_format: Optional[str] = r"%m/%c/%f"
+
+
+@dataclass
+class RawLog:
+    message: str
+    caller_info: TracebackInfo
+    caller_name_alias: Optional[str] = None
+    timestamp: datetime = field(default_factory=datetime.now)
+    series: Optional[str] = None
+    style: LogStyle = field(default_factory=LogStyle)  # fix python 3.11 dataclass issue
+
+    @property
+    def timestamp_formatted(self):
+        return (
+            self.timestamp.strftime(self.style.datetime_format)
+            if self.style.datetime_format
+            else ""
+        )
+
+    @property
+    def caller_info_formatted(self):
+        if self.caller_name_alias:
+            return str(self.caller_name_alias)
+        return (
+            self.caller_info.format(self.style.caller_info_format)
+            if self.style.caller_info_format
+            else ""
+        )
+
+    @property
+    def json(self) -> dict:
+        return {
+            SERIES_KEY: self.series,
+            MESSAGE_KEY: self.message,
+            TIMESTAMP_KEY: self.timestamp_formatted,
+            CALLER_ID_KEY: self.caller_info_formatted,
+        }
+
+    def __repr__(self) -> str:
+        result = ""
+        for k, v in self.json.items():
+            result += f"{k}: {v}\n"
+        return result
+
+
+class LazyRawLog(RawLog):
+    """RawLog whose message is joined and caller info is parsed on first access. writers which do not read them, e.g. the ones of a logger with a name alias, do not pay for them.
+
+    File, line, function, class and module of the caller are read from its frame on creation, and the frame is not kept, since it keeps running and holds its locals alive, possibly while the log waits in the queue of the async dispatcher.
+    """
+
+    def __init__(
+        self,
+        content: tuple,
+        caller_frame,
+        caller_name_alias: Optional[str] = None,
+        series: Optional[str] = None,
+        style: LogStyle = None,
+    ):
+        self.caller_name_alias = caller_name_alias
+        self.timestamp = datetime.now()
+        self.series = series
+        self.style = style or LogStyle()
+        self._content = content
+        self._message = None
+        code = caller_frame.f_code
+        class_obj = None
+        if code.co_argcount and code.co_varnames[0] == "self":  # a method
+            self_obj = caller_frame.f_locals.get("self")
+            class_obj = self_obj.__class__ if self_obj is not None else None
+        self._caller = (
+            code.co_filename,
+            caller_frame.f_lineno,
+            code.co_name,
+            class_obj,
+            caller_frame.f_globals.get("__name__"),
+        )
+        self._caller_info = None
+
+    @property
+    def message(self) -> str:
+        if self._message is None:
+            self._message = "".join([str(msg) + " " for msg in self._content])
+        return self._message
+
+    def derive(self, content: tuple) -> "LazyRawLog":
+        """a log of other content from the same caller, timestamped now"""
+        derived = copy.copy(self)
+        derived.timestamp = datetime.now()
+        derived._content = content
+        derived._message = None
+        return derived
+
+    @property
+    def caller_info(self) -> TracebackInfo:
+        if self._caller_info is None:
+            filename, lineno, func_name, class_obj, module_name = self._caller
+            caller_info = TracebackInfo()
+            caller_info.lineno = lineno
+            caller_info.func_name = func_name if func_name != "<module>" else None
+            caller_info.class_obj = class_obj
+            caller_info.class_name = class_obj.__name__ if class_obj else None
+            caller_info.module = sys.modules.get(module_name)
+            caller_info.module_name = module_name
+            caller_info.filepath = os.path.abspath(filename)
+            caller_info.filename = os.path.basename(filename)
+            self._caller_info = caller_info
+        return self._caller_info
@@ -6,18 +6,21 @@
 
 import functools
 import os
-import warnings
+import sys
 from datetime import date
 from enum import Enum
 from typing import Callable, Optional, Union
 
-from vdtoys.framing import get_caller_info_traceback
-from vdtoys.registry import Registry
-
-from ._formatting import LogStyle, RawLog
-from .writers import FileLogWriter
-
-LogWriters = Registry("LOG_WRITERS")
+from ._dispatch import LogDispatcher, call_writers
+from ._formatting import LazyRawLog, LogStyle
+from ._throttle import CallSiteThrottle, RateLimit
+from .writers import (
+    FileLogWriter,
+    JsonLogWriter,
+    LogWriters,
+    WriterDict,
+    WriterRegistry,
+)
 
 
 class LogLevel(Enum):
@@ -46,9 +49,26 @@ class LogLevel(Enum):
         return self.value >= other.value
 
 
+def _parse_log_level(level: Union[LogLevel, str, int]) -> LogLevel:
+    if type(level) is str:
+        level = {
+            "ALL": LogLevel.ALL,
+            "DEBUG": LogLevel.DEBUG,
+            "INFO": LogLevel.INFO,
+            "WARNING": LogLevel.WARNING,
+            "ERROR": LogLevel.ERROR,
+        }[level]
+    if type(level) is int:
+        assert level >= 0 and level <= 4, "log level must be in [0, 4]"
+        level = LogLevel(level)
+    return level
+
+
 class Logger:
     # global static
     _IDENTITY2LOGGER = {}
+    _dispatcher: LogDispatcher = None  # writers are called synchronously if None
+    _global_rate_limit: RateLimit = None  # of loggers without their own rate limit
 
     def __init__(
         self,
@@ -68,9 +88,11 @@ class Logger:
 
         self.name_alias = name_alias
         self._default_style = style
-        self._log_level = log_level
-        self.private_writers = {}
-        self.skipped_writers_names = skip_writers_names
+        self.log_level = log_level
+        self.private_writers = WriterDict()
+        self.skipped_writers_names = list(skip_writers_names)
+        self._rate_limit: RateLimit = None
+        self._throttle = CallSiteThrottle()
 
     def __new__(cls, name_alias: str = None, *args, **kwargs) -> "Logger":
         if name_alias in Logger._IDENTITY2LOGGER:
@@ -92,36 +114,110 @@ class Logger:
         return self._log_level
 
     @log_level.setter
-    def log_level(self, level: Union[LogLevel, str]):
-        if type(level) is str:
-            level = {
-                "ALL": LogLevel.ALL,
-                "DEBUG": LogLevel.DEBUG,
-                "INFO": LogLevel.INFO,
-                "WARNING": LogLevel.WARNING,
-                "ERROR": LogLevel.ERROR,
-            }[level]
-        if type(level) is int:
-            assert level >= 0 and level <= 3, "log level must be in [0, 3]"
-            level = LogLevel(level)
-        self._log_level = level
+    def log_level(self, level: Union[LogLevel, str, int]):
+        self._log_level = _parse_log_level(level)
+        # plain int comparison on every call instead of comparing enums
+        self._log_level_value = self._log_level.value
 
     @classmethod
-    def set_global_log_level(cls, level: Union[LogLevel, str]):
-        if type(level) is str:
-            level = {
-                "ALL": LogLevel.ALL,
-                "DEBUG": LogLevel.DEBUG,
-                "INFO": LogLevel.INFO,
-                "WARNING": LogLevel.WARNING,
-                "ERROR": LogLevel.ERROR,
-            }[level]
-        if type(level) is int:
-            assert level >= 0 and level <= 3, "log level must be in [0, 3]"
-            level = LogLevel(level)
+    def set_global_log_level(cls, level: Union[LogLevel, str, int]):
+        level = _parse_log_level(level)
         for logger in cls._IDENTITY2LOGGER.values():
             logger.log_level = level
 
+    @classmethod
+    def set_async_dispatch(
+        cls, enable: bool = True, queue_size: int = 10000, policy: str = "drop-newest"
+    ):
+        """let writers of all loggers run on a background thread, so slow writers do not slow down the caller. could also be enabled by setting environment variable NEETBOX_LOG_DISPATCH=async.
+
+        Args:
+            enable (bool, optional): whether to dispatch asynchronously. Defaults to True.
+            queue_size (int, optional): max number of logs waiting for writers. Defaults to 10000.
+            policy (str, optional): what to do when the queue is full, one of "block", "drop-oldest" and "drop-newest". Defaults to "drop-newest".
+        """
+        if cls._dispatcher is not None:  # keep the order of logs already queued
+            cls._dispatcher.flush()
+        cls._dispatcher = LogDispatcher(queue_size=queue_size, policy=policy) if enable else None
+
+    @classmethod
+    def set_global_rate_limit(
+        cls,
+        max_per_second: float = None,
+        collapse_repeats: bool = False,
+        summary_interval: float = 10.0,
+    ):
+        """limit logs of every call site of loggers without their own rate limit, see set_rate_limit. call with no arguments to remove the limit."""
+        rate_limit = RateLimit(max_per_second, collapse_repeats, summary_interval)
+        cls._global_rate_limit = rate_limit if max_per_second or collapse_repeats else None
+
+    def set_rate_limit(
+        self,
+        max_per_second: float = None,
+        collapse_repeats: bool = False,
+        summary_interval: float = 10.0,
+        inherit: bool = False,
+    ):
+        """limit logs of every call site of this logger. logs held back are summarized in the next log written from the same line, like "last message repeated 10 times".
+
+        Args:
+            max_per_second (float, optional): max logs per call site per second. Defaults to None, unlimited.
+            collapse_repeats (bool, optional): whether to hold back logs identical to the previous one from the same line. Defaults to False.
+            summary_interval (float, optional): max seconds a run of repeats goes without a summary. Defaults to 10.0.
+            inherit (bool, optional): follow the global rate limit again, ignoring other arguments. Defaults to False.
+        """
+        self._rate_limit = (
+            None if inherit else RateLimit(max_per_second, collapse_repeats, summary_interval)
+        )
+        return self
+
+    @classmethod
+    def flush(cls, timeout: float = None) -> bool:
+        """wait until logs queued for async dispatch are written
+
+        Returns:
+            bool: False on timeout
+        """
+        return cls._dispatcher.flush(timeout) if cls._dispatcher else True
+
+    @property
+    def private_writers(self):
+        return self._private_writers
+
+    @private_writers.setter
+    def private_writers(self, writers: dict):
+        self._private_writers = writers if isinstance(writers, WriterDict) else WriterDict(writers)
+        self._writers_cache = {}  # skip writers names -> list of (name, writer)
+        self._writers_cache_version = None
+
+    @property
+    def skipped_writers_names(self):
+        return self._skipped_writers_names
+
+    @skipped_writers_names.setter
+    def skipped_writers_names(self, names: list):
+        self._skipped_writers_names = names
+        self._writers_cache = {}
+
+    def _get_writers(self, skip_writers_names) -> list:
+        """writers to be called, rebuilt only after global or private writers change"""
+        version = (WriterRegistry.version, self._private_writers.version)
+        if version != self._writers_cache_version:
+            self._writers_cache = {}
+            self._writers_cache_version = version
+        key = tuple(skip_writers_names) if skip_writers_names else ()
+        writers = self._writers_cache.get(key)
+        if writers is None:
+            skipped = set(self._skipped_writers_names).union(key)
+            writers = [
+                (writer_name, writer_func)
+                for writer_name, writer_func in LogWriters.items()
+                + list(self._private_writers.items())
+                if writer_name not in skipped
+            ]
+            self._writers_cache[key] = writers
+        return writers
+
     def writer(self, name: str):
         def _add_private_writer(name, writer_func: Callable):
             if name in self.private_writers:
@@ -132,7 +228,8 @@ class Logger:
         return functools.partial(_add_private_writer, name=name)
 
     def skip_writer_name(self, name: str):
-        self.skipped_writers_names.append(name)
+        self._skipped_writers_names.append(name)
+        self._writers_cache = {}
 
     def log(
         self,
@@ -140,40 +237,53 @@ class Logger:
         series: Optional[str] = None,
         skip_writers_names: list[str] = [],
         stack_offset=2,
+        sync=False,
     ):
-        # converting passed message args into a single string
-        message = ""
-        for msg in content:
-            message += str(msg) + " "
-
-        log = RawLog(
-            message=message,
-            caller_info=get_caller_info_traceback(stack_offset=stack_offset),
+        writers = self._get_writers(skip_writers_names)
+        if not writers:
+            return self
+        # the frame of the caller, stack_offset counts from the caller of get_caller_info_traceback
+        try:
+            caller_frame = sys._getframe(stack_offset - 1)
+        except ValueError:  # not that deep, take the outermost one
+            caller_frame = sys._getframe()
+            while caller_frame.f_back is not None:
+                caller_frame = caller_frame.f_back
+        # message and caller info are built by the first writer reading them
+        log = LazyRawLog(
+            content=content,
+            caller_frame=caller_frame,
             caller_name_alias=self.name_alias,
             series=series,
             style=self._default_style,
         )
 
-        writers = []
-        for (
-            writer_name,
-            writer_func,
-        ) in LogWriters.items():  # collect global writers
-            if writer_name not in self.skipped_writers_names + skip_writers_names:
-                writers.append((writer_name, writer_func))
-
-        for (
-            writer_name,
-            writer_func,
-        ) in self.private_writers.items():  # collect private writers
-            if writer_name not in self.skipped_writers_names + skip_writers_names:
-                writers.append((writer_name, writer_func))
-
-        for writer_name, writer_func in writers:
-            try:
-                writer_func(log)
-            except Exception as e:
-                warnings.warn(f"log writer {writer_name} fialed: {e}")
+        rate_limit = self._rate_limit or Logger._global_rate_limit
+        if rate_limit is not None and not sync:
+            # a call site is a line of code
+            site = (caller_frame.f_code, caller_frame.f_lineno)
+            should_write, summary = self._throttle.check(
+                site,
+                log,
+                rate_limit,
+                emit=lambda summary, sync: self._write(writers, log.derive((summary,)), sync),
+            )
+            if summary:
+                self._write(writers, log.derive((summary,)))
+            if not should_write:
+                return self
+        return self._write(writers, log, sync)
+
+    def _write(self, writers: list, log: LazyRawLog, sync=False):
+        dispatcher = Logger._dispatcher
+        if dispatcher is None:
+            call_writers(writers, log)
+        elif sync:  # written before returning, after the ones queued
+            dispatcher.flush()
+            call_writers(writers, log)
+        else:
+            log.message  # content may change before written
+            dispatcher.put(writers, log)
         return self
 
     def ok(
@@ -182,7 +292,7 @@ class Logger:
         skip_writers_names: list[str] = [],
         stack_offset=2,
     ):
-        if self._log_level >= LogLevel.INFO:
+        if self._log_level_value >= 2:  # LogLevel.INFO
             self.log(
                 *content,
                 series=f"ok",
@@ -197,7 +307,7 @@ class Logger:
         skip_writers_names: list[str] = [],
         stack_offset=2,
     ):
-        if self._log_level >= LogLevel.INFO:
+        if self._log_level_value >= 3:  # LogLevel.DEBUG
             self.log(
                 *content,
                 series=f"debug",
@@ -212,7 +322,7 @@ class Logger:
         skip_writers_names: list[str] = [],
         stack_offset=2,
     ):
-        if self._log_level >= LogLevel.INFO:
+        if self._log_level_value >= 2:  # LogLevel.INFO
             self.log(
                 *content,
                 series=f"info",
@@ -227,7 +337,7 @@ class Logger:
         skip_writers_names: list[str] = [],
         stack_offset=2,
     ):
-        if self._log_level >= LogLevel.INFO:
+        if self._log_level_value >= 1:  # LogLevel.WARNING
             self.log(
                 *content,
                 series=f"warning",
@@ -243,12 +353,13 @@ class Logger:
         stack_offset=2,
         reraise=False,
     ):
-        if self._log_level >= LogLevel.ERROR:
+        if self._log_level_value >= 0:  # LogLevel.ERROR
             self.log(
                 str(err),
                 series=f"error",
                 skip_writers_names=skip_writers_names,
                 stack_offset=stack_offset + 1,
+                sync=reraise,  # the error may end the process right after
             )
         if reraise:
             if not isinstance(err, Exception):
@@ -309,7 +420,15 @@ class Logger:
         )
         return self
 
-    def set_log_dir(self, path, dedicated_file=False):
+    def set_log_dir(self, path, dedicated_file=False, structured=False, **file_writer_options):
+        """write logs into a file in path, named by date
+
+        Args:
+            path (str): the directory
+            dedicated_file (bool, optional): whether to prefix the file name with the logger name alias. Defaults to False.
+            structured (bool, optional): write indexed json lines with JsonLogWriter instead of plain text, which could be read back by neetbox.logging.read_logs. Defaults to False.
+            file_writer_options: buffering, rotation, compression and retention options passed to FileLogWriter, or JsonLogWriter if structured.
+        """
         if os.path.isfile(path):
             raise FileExistsError("Target path is not a directory.")
         if not os.path.exists(path):
@@ -319,10 +438,27 @@ class Logger:
                 raise OSError(f"Failed when trying to create directory {path}")
         filename = ""
         filename += self.name_alias or "" if dedicated_file else ""
-        filename += str(date.today()) + ".log"
-        file_writer = FileLogWriter(os.path.join(path, filename))
+        filename += str(date.today()) + (".jsonl" if structured else ".log")
+        file_writer = (JsonLogWriter if structured else FileLogWriter)(
+            os.path.join(path, filename), **file_writer_options
+        )
         self.private_writers["file"] = file_writer.write
         return self
 
 
 DEFAULT_LOGGER = Logger(None)
+
+if os.environ.get("NEETBOX_LOG_DISPATCH") == "async":
+    Logger.set_async_dispatch()
+
+
+def _reset_dispatcher_after_fork():
+    if Logger._dispatcher is not None:
+        Logger._dispatcher._reset_after_fork()
+
+
+if hasattr(os, "register_at_fork"):  # logs queued before fork are written by the parent
+    os.register_at_fork(
+        before=functools.partial(Logger.flush, timeout=1),
+        after_in_child=_reset_dispatcher_after_fork,
+    )
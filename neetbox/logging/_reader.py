@@ -0,0 +1,98 @@
+# -*- coding: utf-8 -*-
+#
+# Author: GavinGong aka VisualDust
+# Github: github.com/visualDust
+# Date:   20261018
+
+import bisect
+import json
+import os
+from datetime import datetime, timedelta
+from typing import Iterator, List, Optional, Union
+
+from neetbox._protocol import SERIES_KEY, TIMESTAMP_KEY
+
+from .writers._jsonl import (
+    INDEX_ENTRY,
+    JSONL_DATETIME_FORMAT,
+    index_path_of,
+    segments_of,
+)
+
+# logs are written in about the order of their timestamps, keep reading a while after the range ends
+_MAX_DISORDER = timedelta(seconds=1)
+
+
+def _as_datetime(when: Union[datetime, str, float, None]) -> Optional[datetime]:
+    if when is None or isinstance(when, datetime):
+        return when
+    if isinstance(when, str):
+        return datetime.fromisoformat(when)
+    return datetime.fromtimestamp(when)
+
+
+def _load_index(segment_path: str) -> list:
+    index_path = index_path_of(segment_path)
+    if not os.path.exists(index_path):
+        return []
+    with open(index_path, "rb") as index_file:
+        data = index_file.read()
+    return list(INDEX_ENTRY.iter_unpack(data[: len(data) - len(data) % INDEX_ENTRY.size]))
+
+
+def read_logs(
+    path: str,
+    since: Union[datetime, str, float] = None,
+    until: Union[datetime, str, float] = None,
+    series: Union[str, List[str]] = None,
+) -> Iterator[dict]:
+    """read logs written by a JsonLogWriter, seeking to the first one not earlier than since with the sparse index instead of scanning.
+
+    Args:
+        path (str): path the JsonLogWriter writes, rotated segments next to it are read as well
+        since (Union[datetime, str, float], optional): the earliest timestamp, a datetime, an iso format string or seconds since epoch. Defaults to None, from the beginning.
+        until (Union[datetime, str, float], optional): the latest timestamp, included. Defaults to None, till the end.
+        series (Union[str, List[str]], optional): only logs of the series. Defaults to None, all series.
+
+    Yields:
+        dict: logs with keys timestamp, series, whom and message, in the order they are written
+    """
+    since, until = _as_datetime(since), _as_datetime(until)
+    if isinstance(series, str):
+        series = [series]
+    segments = segments_of(os.path.abspath(path))
+    # the last index entry of which every line up to is earlier than since
+    begin_segment, begin_offset = 0, 0
+    if since is not None:
+        since_timestamp = since.timestamp()
+        entries = [
+            (max_timestamp, segment_id, offset)
+            for segment_id, segment in enumerate(segments)
+            for max_timestamp, offset in _load_index(segment)
+        ]  # sorted, since max timestamps grow
+        position = bisect.bisect_left(entries, (since_timestamp,)) - 1
+        if position >= 0:
+            _, begin_segment, begin_offset = entries[position]
+    # timestamps are compared as strings of fixed width
+    since_str = since.strftime(JSONL_DATETIME_FORMAT) if since else None
+    until_str = until.strftime(JSONL_DATETIME_FORMAT) if until else None
+    stop_str = (until + _MAX_DISORDER).strftime(JSONL_DATETIME_FORMAT) if until else None
+    for segment in segments[begin_segment:]:
+        with open(segment, "rb") as segment_file:
+            segment_file.seek(begin_offset)
+            begin_offset = 0
+            for line in segment_file:
+                try:
+                    log = json.loads(line)
+                except ValueError:  # partially written
+                    continue
+                timestamp = log[TIMESTAMP_KEY]
+                if stop_str is not None and timestamp > stop_str:
+                    return
+                if since_str is not None and timestamp < since_str:
+                    continue
+                if until_str is not None and timestamp > until_str:
+                    continue
+                if series is not None and log[SERIES_KEY] not in series:
+                    continue
+                yield log
@@ -0,0 +1,170 @@
+# -*- coding: utf-8 -*-
+#
+# Author: GavinGong aka VisualDust
+# Github: github.com/visualDust
+# Date:   20261018
+
+import atexit
+import time
+import weakref
+from dataclasses import dataclass
+from threading import Lock, Thread
+from typing import Callable, Optional, Tuple
+
+SUMMARY_CHECK_INTERVAL = 1.0  # seconds between checks of summaries held back by quiet call sites
+SUMMARY_IDLE_SECONDS = 1.0  # a call site quiet for this long gets its pending summary written
+
+
+@dataclass
+class RateLimit:
+    max_per_second: Optional[
+        float
+    ] = None  # max logs written per call site per second, None for unlimited
+    collapse_repeats: bool = False  # write identical consecutive logs of a call site as a summary
+    summary_interval: float = 10.0  # max seconds a run of repeats goes without a summary
+
+
+class _CallSite:
+    __slots__ = [
+        "tokens",
+        "last_refill_time",
+        "last_message",
+        "num_repeated",
+        "num_suppressed",
+        "last_summary_time",
+        "last_log_time",
+        "emit",
+    ]
+
+    def __init__(self, max_per_second, now):
+        self.tokens = max_per_second or 0
+        self.last_refill_time = now
+        self.last_message = None
+        self.num_repeated = 0
+        self.num_suppressed = 0
+        self.last_summary_time = now
+        self.last_log_time = now
+        self.emit = None  # writes a summary of the site, see CallSiteThrottle.check
+
+    def pop_summary(self) -> Optional[str]:
+        """summary of the logs held back so far, None if none"""
+        summaries = []
+        if self.num_repeated:
+            summaries.append(f"last message repeated {self.num_repeated} times")
+            self.num_repeated = 0
+        if self.num_suppressed:
+            summaries.append(f"{self.num_suppressed} logs suppressed by rate limit")
+            self.num_suppressed = 0
+        return "; ".join(summaries) or None
+
+
+class CallSiteThrottle:
+    """rate limit and duplicate suppression of logs by call site. a token bucket per site allows bursts of max_per_second logs, logs beyond are counted and summarized in the next log written from the site. summaries of sites gone quiet are written by a background thread, and what is left at exit."""
+
+    def __init__(self):
+        self._sites = {}
+        self._lock = Lock()
+        _throttles.add(self)
+
+    def check(
+        self, site, log, rate_limit: RateLimit, emit: Callable[[str, bool], None] = None
+    ) -> Tuple[bool, Optional[str]]:
+        """
+        Args:
+            site (Hashable): where the log is from
+            log (RawLog): the log
+            rate_limit (RateLimit): the limits
+            emit (Callable[[str, bool], None], optional): writes a summary of the site with whether to write it synchronously, called if the site goes quiet with logs held back. Defaults to None.
+
+        Returns:
+            Tuple[bool, Optional[str]]: whether to write the log, and a summary of the logs held back from the site to be written before it
+        """
+        _start_summary_flusher()
+        now = time.monotonic()
+        with self._lock:
+            state = self._sites.get(site)
+            if state is None:
+                state = self._sites[site] = _CallSite(rate_limit.max_per_second, now)
+            state.last_log_time = now
+            state.emit = emit
+            summaries = []
+            if rate_limit.collapse_repeats:
+                message = log.message
+                if message == state.last_message:
+                    state.num_repeated += 1
+                    if now - state.last_summary_time < rate_limit.summary_interval:
+                        return False, None
+                    # a long run of repeats, summarize so far without writing the log
+                    summary = f"last message repeated {state.num_repeated} times"
+                    state.num_repeated = 0
+                    state.last_summary_time = now
+                    return False, summary
+                if state.num_repeated:
+                    summaries.append(f"last message repeated {state.num_repeated} times")
+                    state.num_repeated = 0
+                state.last_message = message
+            if rate_limit.max_per_second:
+                state.tokens = min(
+                    rate_limit.max_per_second,
+                    state.tokens + (now - state.last_refill_time) * rate_limit.max_per_second,
+                )
+                state.last_refill_time = now
+                if state.tokens < 1:
+                    state.num_suppressed += 1
+                    return False, "; ".join(summaries) or None
+                state.tokens -= 1
+                if state.num_suppressed:
+                    summaries.append(f"{state.num_suppressed} logs suppressed by rate limit")
+                    state.num_suppressed = 0
+            if summaries:
+                state.last_summary_time = now
+            return True, "; ".join(summaries) or None
+
+    def flush(self, idle_seconds: float = SUMMARY_IDLE_SECONDS, sync: bool = False):
+        """write summaries of call sites quiet for idle_seconds with logs held back
+
+        Args:
+            idle_seconds (float, optional): how long a site has been quiet. Defaults to SUMMARY_IDLE_SECONDS.
+            sync (bool, optional): write them synchronously, e.g. on exit. Defaults to False.
+        """
+        now = time.monotonic()
+        with self._lock:
+            pending = []
+            for state in self._sites.values():
+                if state.emit is None or now - state.last_log_time < idle_seconds:
+                    continue
+                summary = state.pop_summary()
+                if summary:
+                    state.last_summary_time = now
+                    pending.append((state.emit, summary))
+        for emit, summary in pending:  # outside of the lock, writers may log
+            emit(summary, sync)
+
+
+_throttles = weakref.WeakSet()  # of every logger
+_flusher_thread: Thread = None
+_flusher_lock = Lock()
+
+
+def _summary_flusher_loop():
+    while True:
+        time.sleep(SUMMARY_CHECK_INTERVAL)
+        for throttle in list(_throttles):
+            throttle.flush()
+
+
+def _start_summary_flusher():
+    global _flusher_thread
+    if _flusher_thread is not None:
+        return
+    with _flusher_lock:
+        if _flusher_thread is None:
+            _flusher_thread = Thread(target=_summary_flusher_loop, daemon=True)
+            _flusher_thread.start()
+            # registered after writers are imported, so that it runs before they flush on exit
+            atexit.register(_flush_summaries_on_exit)
+
+
+def _flush_summaries_on_exit():
+    for throttle in list(_throttles):
+        throttle.flush(idle_seconds=0, sync=True)
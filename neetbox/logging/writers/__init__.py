@@ -1,2 +1,4 @@
 from ._file import *
+from ._jsonl import JsonLogWriter
+from ._registry import LogWriters, WriterDict, WriterRegistry
 from ._stdout import *
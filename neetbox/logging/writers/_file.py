@@ -4,19 +4,60 @@
 # Github: github.com/visualDust
 # Date:   20240111
 
+import atexit
+import glob
+import gzip
 import os
+import shutil
+import threading
+import time
+import warnings
+from datetime import datetime
 
 from .._formatting import RawLog
 
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+COMPRESSION_GZIP = "gzip"
+COMPRESSION_ZSTD = "zstd"
+
 
 class FileLogWriter:
+    """write logs into a file. lines are buffered and flushed every flush_interval seconds by a background thread. the file could be rotated by size or by time, rotated segments are named like 'path.20240111-120000-000000' and compressed in background.
+
+    Writers are deduplicated by path, the options of the first one created for a path are used.
+    """
+
     # class level static
     PATH2WRITER = {}
+    _flusher: threading.Thread = None
 
     # instance level
     file_writer = None
 
-    def __new__(cls, path):
+    def __new__(
+        cls,
+        path,
+        buffer_size: int = 64 * 1024,
+        flush_interval: float = 1.0,
+        max_bytes: int = None,
+        rotate_interval: float = None,
+        compression: str = COMPRESSION_GZIP,
+        max_segments: int = None,
+    ):
+        """
+        Args:
+            path (str): path of the log file
+            buffer_size (int, optional): bytes buffered before written. Defaults to 64KB.
+            flush_interval (float, optional): max seconds a line stays in buffer. Defaults to 1.0.
+            max_bytes (int, optional): rotate when the file grows beyond. Defaults to None, never rotate by size.
+            rotate_interval (float, optional): rotate every rotate_interval seconds. Defaults to None, never rotate by time.
+            compression (str, optional): "gzip", "zstd" or None. zstd requires package zstandard, falls back to gzip if not installed. Defaults to "gzip".
+            max_segments (int, optional): number of rotated segments kept, the oldest ones are deleted. Defaults to None, keep all.
+        """
         path = os.path.abspath(path)
         if os.path.isdir(path):
             raise Exception("Target path is not a file.")
@@ -25,11 +66,33 @@ class FileLogWriter:
             os.makedirs(dirname)
         if path in FileLogWriter.PATH2WRITER:
             return FileLogWriter.PATH2WRITER[path]
+        if compression not in [COMPRESSION_GZIP, COMPRESSION_ZSTD, None]:
+            raise ValueError(f"unknown compression {compression}")
+        if compression == COMPRESSION_ZSTD and zstandard is None:
+            warnings.warn(
+                "package zstandard is not installed, compressing log segments with gzip instead."
+            )
+            compression = COMPRESSION_GZIP
         new_instance = super().__new__(cls)
-        new_instance.file_writer = open(path, "a", encoding="utf-8", buffering=1)
+        new_instance.path = path
+        new_instance.buffer_size = buffer_size
+        new_instance.flush_interval = flush_interval
+        new_instance.max_bytes = max_bytes
+        new_instance.rotate_interval = rotate_interval
+        new_instance.compression = compression
+        new_instance.max_segments = max_segments
+        new_instance._lock = threading.Lock()
+        new_instance._open()
         FileLogWriter.PATH2WRITER[path] = new_instance
+        FileLogWriter._start_flusher()
         return new_instance
 
+    def _open(self):
+        self.file_writer = open(self.path, "ab", buffering=self.buffer_size)
+        self.num_bytes = self.file_writer.tell()
+        self.segment_begin_time = time.time()
+        self.last_flush_time = self.segment_begin_time
+
     def write(self, log: RawLog):
         line = " ".join(
             [
@@ -39,4 +102,105 @@ class FileLogWriter:
                 str(log.message),
             ]
         )
-        self.file_writer.write(line + "\n")
+        data = (line + "\n").encode("utf-8")
+        with self._lock:
+            if self._should_rotate(len(data)):
+                self._rotate()
+            self.file_writer.write(data)
+            self.num_bytes += len(data)
+
+    def _should_rotate(self, num_incoming_bytes: int) -> bool:
+        if self.num_bytes == 0:  # never rotate an empty file
+            return False
+        if self.max_bytes and self.num_bytes + num_incoming_bytes > self.max_bytes:
+            return True
+        if self.rotate_interval and time.time() - self.segment_begin_time >= self.rotate_interval:
+            return True
+        return False
+
+    def _rotate(self):
+        self.file_writer.close()
+        segment_path = f"{self.path}.{datetime.now().strftime(r'%Y%m%d-%H%M%S-%f')}"
+        os.replace(self.path, segment_path)
+        self._open()
+        # not a daemon thread, the interpreter waits for it on exit
+        threading.Thread(
+            target=self._compress_and_prune, args=(segment_path,), name="neetbox log compressor"
+        ).start()
+
+    def _compress_and_prune(self, segment_path: str):
+        try:
+            if self.compression == COMPRESSION_GZIP:
+                with open(segment_path, "rb") as src, gzip.open(segment_path + ".gz", "wb") as dst:
+                    shutil.copyfileobj(src, dst)
+                os.remove(segment_path)
+            elif self.compression == COMPRESSION_ZSTD:
+                with open(segment_path, "rb") as src, open(segment_path + ".zst", "wb") as dst:
+                    zstandard.ZstdCompressor().copy_stream(src, dst)
+                os.remove(segment_path)
+            if self.max_segments is not None:
+                for expired in self.segments[: -self.max_segments or None]:
+                    os.remove(expired)
+        except Exception as e:
+            warnings.warn(f"failed to compress or prune log segment {segment_path}: {e}")
+
+    @property
+    def segments(self) -> list:
+        """paths of rotated segments, from the oldest to the newest. segments still being compressed are not included."""
+        segments = glob.glob(glob.escape(self.path) + ".*")
+        compressed_suffix = {COMPRESSION_GZIP: ".gz", COMPRESSION_ZSTD: ".zst"}.get(
+            self.compression
+        )
+        if compressed_suffix:
+            segments = [segment for segment in segments if segment.endswith(compressed_suffix)]
+        return sorted(segments)  # timestamps in names sort by time
+
+    def flush(self):
+        with self._lock:
+            if not self.file_writer.closed:
+                self.file_writer.flush()
+            self.last_flush_time = time.time()
+
+    @classmethod
+    def _start_flusher(cls):
+        if cls._flusher is not None:
+            return
+
+        def _flush_periodically():
+            while True:
+                now = time.time()
+                for writer in list(cls.PATH2WRITER.values()):
+                    if now - writer.last_flush_time >= writer.flush_interval:
+                        writer.flush()
+                time.sleep(
+                    min(
+                        [writer.flush_interval for writer in list(cls.PATH2WRITER.values())] + [1.0]
+                    )
+                )
+
+        cls._flusher = threading.Thread(
+            target=_flush_periodically, name="neetbox log flusher", daemon=True
+        )
+        cls._flusher.start()
+
+    @classmethod
+    def flush_all(cls):
+        for writer in list(cls.PATH2WRITER.values()):
+            writer.flush()
+
+    @classmethod
+    def _reset_after_fork(cls):
+        """threads of the parent process are not running in a forked child, and their locks may be held"""
+        for writer in cls.PATH2WRITER.values():
+            writer._lock = threading.Lock()
+        if cls._flusher is not None:
+            cls._flusher = None
+            cls._start_flusher()
+
+
+atexit.register(FileLogWriter.flush_all)
+# flushed before fork, or forked children write the buffer again
+if hasattr(os, "register_at_fork"):
+    os.register_at_fork(
+        before=FileLogWriter.flush_all, after_in_child=FileLogWriter._reset_after_fork
+    )
@@ -0,0 +1,142 @@
+# -*- coding: utf-8 -*-
+#
+# Author: GavinGong aka VisualDust
+# Github: github.com/visualDust
+# Date:   20261018
+
+import glob
+import json
+import os
+import struct
+import time
+from datetime import datetime
+
+from neetbox._protocol import CALLER_ID_KEY, MESSAGE_KEY, SERIES_KEY, TIMESTAMP_KEY
+
+from .._formatting import RawLog
+from ._file import FileLogWriter
+
+# an entry of the sparse index: (max timestamp of lines up to and including the indexed one, byte offset of the line)
+INDEX_ENTRY = struct.Struct("<dQ")
+INDEX_SUFFIX = ".idx"
+JSONL_DATETIME_FORMAT = r"%Y-%m-%dT%H:%M:%S.%f"  # fixed width, compares like the time it represents
+
+
+def index_path_of(segment_path: str) -> str:
+    return segment_path + INDEX_SUFFIX
+
+
+def segments_of(path: str) -> list:
+    """segments of a JsonLogWriter from the oldest to the newest, the one being written included"""
+    segments = [
+        segment
+        for segment in glob.glob(glob.escape(path) + ".*")
+        if not segment.endswith(INDEX_SUFFIX)
+    ]
+    segments.sort()  # timestamps in names sort by time
+    if os.path.exists(path):
+        segments.append(path)
+    return segments
+
+
+class JsonLogWriter(FileLogWriter):
+    """write logs as json lines with keys timestamp, series, whom and message, read them back with neetbox.logging.read_logs.
+
+    The file is rotated into segments of segment_size bytes. Each segment comes with a sidecar sparse index, an entry every index_interval bytes, so readers seek to a time range instead of scanning.
+    """
+
+    def __new__(
+        cls,
+        path,
+        segment_size: int = 64 * 1024 * 1024,
+        index_interval: int = 64 * 1024,
+        buffer_size: int = 64 * 1024,
+        flush_interval: float = 1.0,
+        max_segments: int = None,
+    ):
+        """
+        Args:
+            path (str): path of the segment being written
+            segment_size (int, optional): max bytes of a segment. Defaults to 64MB.
+            index_interval (int, optional): bytes between two index entries. Defaults to 64KB.
+            buffer_size (int, optional): see FileLogWriter. Defaults to 64KB.
+            flush_interval (float, optional): see FileLogWriter. Defaults to 1.0.
+            max_segments (int, optional): number of rotated segments kept. Defaults to None, keep all.
+        """
+        path = os.path.abspath(path)
+        if path in FileLogWriter.PATH2WRITER:
+            return FileLogWriter.PATH2WRITER[path]
+        new_instance = super().__new__(
+            cls,
+            path,
+            buffer_size=buffer_size,
+            flush_interval=flush_interval,
+            max_bytes=segment_size,
+            compression=None,  # segments are seeked into
+            max_segments=max_segments,
+        )
+        new_instance.index_interval = index_interval
+        return new_instance
+
+    def _open(self):
+        super()._open()
+        index_path = index_path_of(self.path)
+        self.index_writer = open(index_path, "ab", buffering=self.buffer_size)
+        self.max_timestamp = 0.0
+        self.last_indexed_offset = None
+        if self.index_writer.tell() >= INDEX_ENTRY.size:  # appending to an existing segment
+            with open(index_path, "rb") as index_file:
+                index_file.seek(-INDEX_ENTRY.size, os.SEEK_END)
+                self.max_timestamp, self.last_indexed_offset = INDEX_ENTRY.unpack(index_file.read())
+
+    def write(self, log: RawLog):
+        data = (
+            json.dumps(
+                {
+                    TIMESTAMP_KEY: log.timestamp.strftime(JSONL_DATETIME_FORMAT),
+                    SERIES_KEY: log.series,
+                    CALLER_ID_KEY: log.caller_name_alias or log.caller_info.format(r"%m.%c.%f:%l"),
+                    MESSAGE_KEY: str(log.message),
+                },
+                ensure_ascii=False,
+            )
+            + "\n"
+        ).encode("utf-8")
+        with self._lock:
+            if self._should_rotate(len(data)):
+                self._rotate()
+            self.max_timestamp = max(self.max_timestamp, log.timestamp.timestamp())
+            if (
+                self.last_indexed_offset is None
+                or self.num_bytes - self.last_indexed_offset >= self.index_interval
+            ):
+                self.index_writer.write(INDEX_ENTRY.pack(self.max_timestamp, self.num_bytes))
+                self.last_indexed_offset = self.num_bytes
+            self.file_writer.write(data)
+            self.num_bytes += len(data)
+
+    def _rotate(self):
+        self.file_writer.close()
+        self.index_writer.close()
+        segment_path = f"{self.path}.{datetime.now().strftime(r'%Y%m%d-%H%M%S-%f')}"
+        os.replace(self.path, segment_path)
+        os.replace(index_path_of(self.path), index_path_of(segment_path))
+        max_timestamp = self.max_timestamp
+        self._open()
+        self.max_timestamp = max_timestamp  # keeps growing across segments
+        if self.max_segments is not None:
+            for expired in self.segments[: -self.max_segments or None]:
+                os.remove(expired)
+                os.remove(index_path_of(expired))
+
+    @property
+    def segments(self) -> list:
+        """paths of rotated segments, from the oldest to the newest"""
+        return segments_of(self.path)[:-1]
+
+    def flush(self):
+        with self._lock:
+            if not self.file_writer.closed:
+                self.file_writer.flush()
+                self.index_writer.flush()  # after the lines it points to
+            self.last_flush_time = time.time()
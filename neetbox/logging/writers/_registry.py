@@ -0,0 +1,69 @@
+# -*- coding: utf-8 -*-
+#
+# Author: GavinGong aka VisualDust
+# Github: github.com/visualDust
+# Date:   20261018
+
+from vdtoys.registry import Registry
+
+
+class WriterRegistry(Registry):
+    """Registry of log writers counting modifications, so loggers know when to rebuild their cached writer lists"""
+
+    version = 0
+
+    def __setitem__(self, k, v) -> None:
+        super().__setitem__(k, v)
+        WriterRegistry.version += 1
+
+    def __delitem__(self, k) -> None:
+        del self.__dict__[k]
+        WriterRegistry.version += 1
+
+    def update(self, *args, **kwargs):
+        super().update(*args, **kwargs)
+        WriterRegistry.version += 1
+
+    def clear(self):
+        super().clear()
+        WriterRegistry.version += 1
+
+
+class WriterDict(dict):
+    """dict of writers counting modifications, see WriterRegistry"""
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.version = 0
+
+    def __setitem__(self, k, v) -> None:
+        super().__setitem__(k, v)
+        self.version += 1
+
+    def __delitem__(self, k) -> None:
+        super().__delitem__(k)
+        self.version += 1
+
+    def pop(self, *args):
+        self.version += 1
+        return super().pop(*args)
+
+    def popitem(self):
+        self.version += 1
+        return super().popitem()
+
+    def setdefault(self, k, default=None):
+        self.version += 1
+        return super().setdefault(k, default)
+
+    def update(self, *args, **kwargs):
+        super().update(*args, **kwargs)
+        self.version += 1
+
+    def clear(self):
+        super().clear()
+        self.version += 1
+
+
+# created before any other Registry("LOG_WRITERS"), which returns this one from the registry pool
+LogWriters = WriterRegistry("LOG_WRITERS")
@@ -4,37 +4,52 @@
 # Github: github.com/visualDust
 # Date:   20240111
 
-from random import random
+import atexit
+import functools
+import os
+import sys
+import threading
+import time
+import zlib
 
 from rich.console import Console
 from rich.table import Table
 from rich.text import Text
-from vdtoys.mvc import Singleton
-from vdtoys.registry import Registry
 
-from .._formatting import RawLog
+from neetbox.utils.ansi import ANSI_RESET, ansi_prefix, colored
 
-LogWriters = Registry("LOG_WRITERS")
+from .._formatting import RawLog
+from ._registry import LogWriters
 
+STDOUT_MODE_AUTO = "auto"  # plain if stdout is not a tty, otherwise rich
+STDOUT_MODE_RICH = "rich"
+STDOUT_MODE_PLAIN = "plain"
 
 console = Console()
-whom2color = {}
 
 supported_colors = ["red", "green", "blue", "cyan", "yellow", "magenta"]
 supported_text_styles = ["bold", "italic", "blink", "dim"]
+series2color = {
+    "ok": "green",
+    "debug": "cyan",
+    "info": "white",
+    "warning": "yellow",
+    "mention": "yellow",
+    "error": "red",
+}
 
 
-@LogWriters.register(name="stdout")
-def log_write_stdout(log: RawLog):
+@functools.lru_cache(maxsize=1024)
+def color_of(whom: str) -> str:
+    """a color for each caller, the same one across runs"""
+    return supported_colors[zlib.crc32(whom.encode()) % len(supported_colors)]
+
+
+def log_write_rich(log: RawLog):
     series = (
-        {
-            "ok": Text("[ok]", style="green"),
-            "debug": Text("[debug]", style="cyan"),
-            "info": Text("[info]", style="white"),
-            "warning": Text("[warning]", style="yellow"),
-            "mention": Text("[mention]", style="yellow"),
-            "error": Text("[error]", style="red"),
-        }.get(log.series, Text(log.series))
+        Text(f"[{log.series}]", style=series2color[log.series])
+        if log.series in series2color
+        else Text(log.series)
         if log.series
         else Text("")
     )
@@ -42,9 +57,7 @@ def log_write_stdout(log: RawLog):
     table.add_column(justify="left")
     table.add_column(justify="right")
     whom = log.caller_name_alias or log.caller_info_formatted
-    if whom not in whom2color:
-        whom2color[whom] = supported_colors[int(random() * len(supported_colors))]
-    color = whom2color[whom]
+    color = color_of(whom)
     whom_text = Text(whom, color)
     split_text = Text(" > ", style="dim " + color)
     message_text = Text(log.message, style="default")
@@ -53,3 +66,121 @@ def log_write_stdout(log: RawLog):
         whom_text + split_text + message_text, series + " " + time_text if series else time_text
     )
     console.print(table)
+
+
+@functools.lru_cache(maxsize=1024)
+def _prefix_of(whom: str, colorful: bool) -> str:
+    if not colorful:
+        return f"{whom} > "
+    color = color_of(whom)
+    return f"{colored(whom, color)}{ansi_prefix('dim', color)} > {ANSI_RESET}"
+
+
+@functools.lru_cache(maxsize=64)
+def _series_tag_of(series: str, colorful: bool) -> str:
+    if not series:
+        return ""
+    tag = f" [{series}]"
+    return colored(tag, series2color[series]) if colorful and series in series2color else tag
+
+
+class PlainStdoutWriter:
+    """write logs as plain lines, colored with ansi escape sequences if the stream is a terminal. lines are written in batches, at most flush_interval seconds late. much cheaper than rendering a rich table for every log."""
+
+    def __init__(self, stream=None, batch_size: int = 256, flush_interval: float = 0.1):
+        self.stream = stream  # defaults to sys.stdout at the time of writing
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self._lines = []
+        self._lock = threading.Lock()
+        self._flusher: threading.Thread = None
+
+    @functools.cached_property
+    def colorful(self) -> bool:
+        stream = self.stream or sys.stdout
+        return "NO_COLOR" not in os.environ and hasattr(stream, "isatty") and stream.isatty()
+
+    def write(self, log: RawLog):
+        line = "".join(
+            [
+                log.timestamp.strftime(r"%H:%M:%S"),
+                _series_tag_of(log.series, self.colorful),
+                " ",
+                _prefix_of(log.caller_name_alias or log.caller_info_formatted, self.colorful),
+                log.message,
+                "\n",
+            ]
+        )
+        with self._lock:
+            self._lines.append(line)
+            if len(self._lines) < self.batch_size:
+                if self._flusher is None:
+                    self._start_flusher()
+                return
+            self._write_lines()
+
+    def _write_lines(self):
+        lines, self._lines = self._lines, []
+        if lines:
+            stream = self.stream or sys.stdout
+            stream.write("".join(lines))
+            stream.flush()
+
+    def flush(self):
+        with self._lock:
+            self._write_lines()
+
+    def _start_flusher(self):
+        def _flush_periodically():
+            while True:
+                time.sleep(self.flush_interval)
+                self.flush()
+
+        self._flusher = threading.Thread(
+            target=_flush_periodically, name="neetbox stdout flusher", daemon=True
+        )
+        self._flusher.start()
+
+    def _reset_after_fork(self):
+        self._lines = []
+        self._lock = threading.Lock()
+        self._flusher = None
+
+
+plain_stdout_writer = PlainStdoutWriter()
+atexit.register(plain_stdout_writer.flush)
+if hasattr(os, "register_at_fork"):
+    os.register_at_fork(
+        before=plain_stdout_writer.flush, after_in_child=plain_stdout_writer._reset_after_fork
+    )
+_stdout_mode = None  # resolved on first write
+
+
+def set_stdout_mode(mode: str):
+    """choose how logs are written to stdout, could also be set by environment variable NEETBOX_LOG_STDOUT.
+
+    Args:
+        mode (str): "rich" renders every log as a rich table, "plain" writes ansi colored lines in batches, "auto" chooses plain if stdout is not a terminal, rich otherwise.
+    """
+    global _stdout_mode
+    if mode not in [STDOUT_MODE_AUTO, STDOUT_MODE_RICH, STDOUT_MODE_PLAIN]:
+        raise ValueError(f"unknown stdout mode {mode}")
+    if mode == STDOUT_MODE_AUTO:
+        mode = (
+            STDOUT_MODE_RICH
+            if sys.stdout is not None and sys.stdout.isatty()
+            else STDOUT_MODE_PLAIN
+        )
+    if mode == STDOUT_MODE_RICH:
+        plain_stdout_writer.flush()  # keep the order of lines written
+    _stdout_mode = mode
+
+
+@LogWriters.register(name="stdout")
+def log_write_stdout(log: RawLog):
+    if _stdout_mode is None:
+        set_stdout_mode(os.environ.get("NEETBOX_LOG_STDOUT", STDOUT_MODE_AUTO))
+    if _stdout_mode == STDOUT_MODE_PLAIN:
+        plain_stdout_writer.write(log)
+    else:
+        log_write_rich(log)
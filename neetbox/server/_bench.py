@@ -0,0 +1,664 @@
+# -*- coding: utf-8 -*-
+#
+# Author: GavinGong aka VisualDust
+# Github: github.com/visualDust
+# Date:   20261018
+
+import asyncio
+import json
+import multiprocessing
+import os
+import platform
+import random
+import shutil
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+from collections import Counter
+from datetime import datetime
+from threading import Event, Thread
+from typing import Dict, List, Optional
+from uuid import uuid4
+
+import httpx
+import psutil
+import toml
+import websockets
+
+from neetbox._protocol import *
+from neetbox.config.user import get as get_global_config
+from neetbox.logging import Logger
+
+logger = Logger("BENCH SERVER", skip_writers_names=["ws"])
+
+BENCH_EVENT_TYPES = [
+    EVENT_TYPE_NAME_SCALAR,
+    EVENT_TYPE_NAME_LOG,
+    EVENT_TYPE_NAME_PROGRESS,
+    EVENT_TYPE_NAME_HARDWARE,
+    EVENT_TYPE_NAME_IMAGE,
+]
+DEFAULT_MIX = "scalar=70,log=20,progress=5,hardware=4,image=1"
+SENT_AT_KEY = "sentAt"  # wall clock time an event is sent, in its payload
+BATCH_SIZE = 64  # events per frame, as clients do by default
+BATCH_INTERVAL = 0.05  # seconds between frames of a client
+MAX_UPLOADS_IN_FLIGHT = 2  # images of a client, more are skipped
+LATENCY_SAMPLES = 100000  # kept by each load process
+DRAIN_TIMEOUT = 10  # max seconds frontends wait for events after sending stopped
+DRAIN_IDLE = 1  # seconds without events after which frontends stop waiting
+SERVER_STARTUP_TIMEOUT = 60
+SAMPLE_INTERVAL = 0.5  # seconds between samples of server cpu and memory
+
+
+def parse_mix(mix: str) -> Dict[str, float]:
+    """parse weights of event types like "scalar=70,log=20", an event type without weight weighs 1"""
+    weights = {}
+    for item in mix.split(","):
+        event_type, _, weight = item.partition("=")
+        event_type = event_type.strip()
+        if event_type not in BENCH_EVENT_TYPES:
+            raise ValueError(
+                f"unknown event type '{event_type}' in mix, expect {BENCH_EVENT_TYPES}"
+            )
+        weights[event_type] = float(weight or 1)
+    if sum(weights.values()) <= 0:
+        raise ValueError(f"weights of mix '{mix}' sum up to 0")
+    return weights
+
+
+def percentiles(samples: list) -> dict:
+    """p50, p90, p99 and max of seconds, in milliseconds"""
+    samples = sorted(samples)
+    if not samples:
+        return {}
+    return {
+        name: samples[min(int(len(samples) * q), len(samples) - 1)] * 1000
+        for name, q in [("p50", 0.5), ("p90", 0.9), ("p99", 0.99), ("max", 1.0)]
+    }
+
+
+class _LoadStats:
+    def __init__(self):
+        self.sent = Counter()  # events by type
+        self.sent_by_project = Counter()
+        self.skipped = 0  # events not sent for the clients fell behind
+        self.images_uploaded = 0
+        self.images_failed = 0
+        self.upload_latencies = []
+        self.received = Counter()  # events by type, of all frontends
+        self.latencies = []  # from sent by client to received by frontend
+        self.num_latencies = 0
+        self.handshake_latencies = []
+        self.errors = []
+
+    def add_latency(self, latency: float):
+        self.num_latencies += 1
+        if len(self.latencies) < LATENCY_SAMPLES:
+            self.latencies.append(latency)
+        else:  # a uniform sample of all
+            index = random.randrange(self.num_latencies)
+            if index < LATENCY_SAMPLES:
+                self.latencies[index] = latency
+
+    def add_error(self, error: str):
+        if len(self.errors) < 20:
+            self.errors.append(error)
+
+    @property
+    def json(self) -> dict:
+        return {k: v for k, v in self.__dict__.items()}
+
+
+def _event_of(event_type: str, project_id: str, run_id: str, step: int) -> EventMsg:
+    """a synthetic event shaped like the one sent by neetbox apis"""
+    series, history_len = None, -1
+    payload = {SENT_AT_KEY: time.time()}
+    if event_type == EVENT_TYPE_NAME_SCALAR:
+        series = f"loss{step % 4}"
+        payload.update({"x": step, "y": random.random()})
+    elif event_type == EVENT_TYPE_NAME_LOG:
+        series = "info"
+        payload.update(
+            {
+                CALLER_ID_KEY: "bench > train",
+                MESSAGE_KEY: f"step {step} {random.randbytes(32).hex()}",
+                SERIES_KEY: series,
+            }
+        )
+    elif event_type == EVENT_TYPE_NAME_PROGRESS:
+        series, history_len = "train", 1
+        payload.update({NAME_KEY: series, "step": step, "current": step, "total": -1, "rate": 1})
+    elif event_type == EVENT_TYPE_NAME_HARDWARE:
+        history_len = 1000
+        payload.update(
+            {
+                "cpus": [
+                    {"id": i, "percentage": random.random() * 100, "frequency": 3000.0}
+                    for i in range(8)
+                ],
+                "ram": {"total": 65536.0, "available": 32768.0, "used": 32768.0, "free": 0.0},
+            }
+        )
+    return EventMsg(
+        project_id=project_id,
+        run_id=run_id,
+        event_type=event_type,
+        series=series,
+        payload=payload,
+        identity_type=IdentityType.CLI,
+        timestamp=get_timestamp(),
+        history_len=history_len,
+    )
+
+
+class _LoadProcess:
+    """synthetic cli clients and frontends in a process, driven by an event loop"""
+
+    def __init__(self, cfg: dict, clients: list, frontends: list, barrier):
+        self.cfg = cfg
+        self.clients = clients  # [(project id, run id)]
+        self.frontends = frontends  # [project id]
+        self.barrier = barrier  # passed once clients are connected, and once frontends are
+        self.stats = _LoadStats()
+        self.image = random.randbytes(int(cfg["imageSize"] * 1024))
+        self.weights = parse_mix(cfg["mix"])
+        self.deadline = None  # of sending, set once everyone is connected
+
+    async def _connect_client(self, project_id: str, run_id: str):
+        ws = await websockets.connect(
+            f"{self.cfg['wsUrl']}{WS_ROOT}/{PROJECT_KEY}/",
+            max_size=None,
+            ping_interval=None,
+            compression=None,  # as the websocket client of neetbox
+        )
+        handshake = EventMsg(
+            project_id=project_id,
+            run_id=run_id,
+            event_type=EVENT_TYPE_NAME_HANDSHAKE,
+            identity_type=IdentityType.CLI,
+            event_id=0,
+            payload={WIRE_FORMATS_KEY: list(dict.fromkeys([self.cfg["wire"], WIRE_FORMAT_JSON]))},
+        )
+        began = time.time()
+        await ws.send(handshake.dumps())
+        reply = EventMsg.loads(await ws.recv())
+        self.stats.handshake_latencies.append(time.time() - began)
+        if reply.payload.get(RESULT_KEY) != 200:
+            raise RuntimeError(f"handshake of run '{run_id}' rejected: {reply.payload}")
+        config = EventMsg(
+            project_id=project_id,
+            run_id=run_id,
+            event_type=EVENT_TYPE_NAME_STATUS,
+            series="config",
+            identity_type=IdentityType.CLI,
+            payload={NAME_KEY: "neetbox bench", PROJECT_ID_KEY: project_id},
+        )
+        await ws.send(config.dumps())
+        if reply.payload.get(WIRE_FORMAT_KEY) == WIRE_FORMAT_BINARY:
+            return ws, BinaryWire()
+        return ws, None
+
+    async def _drain_client(self, ws):
+        try:
+            async for _ in ws:  # actions from frontends, ignored
+                pass
+        except websockets.ConnectionClosed:
+            pass
+
+    async def _upload_image(self, http: httpx.AsyncClient, project_id: str, run_id: str):
+        metadata = EventMsg(
+            project_id=project_id,
+            run_id=run_id,
+            event_type=EVENT_TYPE_NAME_IMAGE,
+            series="samples",
+            identity_type=IdentityType.CLI,
+            payload={SENT_AT_KEY: time.time()},
+        )
+        began = time.time()
+        try:
+            response = await http.post(
+                f"{self.cfg['url']}{API_ROOT}/{PROJECT_KEY}/{project_id}/image",
+                data={METADATA_KEY: metadata.dumps()},
+                files={"image": ("image.png", self.image)},
+            )
+            response.raise_for_status()
+            self.stats.upload_latencies.append(time.time() - began)
+            self.stats.images_uploaded += 1
+        except Exception as e:
+            self.stats.images_failed += 1
+            self.stats.add_error(f"failed to upload image cause {e!r}")
+
+    async def _run_client(self, ws, binary_wire, project_id: str, run_id: str):
+        event_types, weights = list(self.weights), list(self.weights.values())
+        rate = self.cfg["rate"]
+        uploads = set()
+        step = 0
+        began = time.time()
+        async with httpx.AsyncClient(timeout=30) as http:
+            while time.time() < self.deadline:
+                due = int((time.time() - began) * rate) - step
+                if due > rate:  # fell behind for more than a second, not catching up
+                    self.stats.skipped += due - int(rate)
+                    step += due - int(rate)
+                    due = int(rate)
+                events = []
+                for event_type in random.choices(event_types, weights, k=max(due, 0)):
+                    step += 1
+                    if event_type != EVENT_TYPE_NAME_IMAGE:
+                        events.append(_event_of(event_type, project_id, run_id, step))
+                    elif len(uploads) < MAX_UPLOADS_IN_FLIGHT:
+                        upload = asyncio.ensure_future(self._upload_image(http, project_id, run_id))
+                        uploads.add(upload)
+                        upload.add_done_callback(uploads.discard)
+                        self.stats.sent[event_type] += 1
+                        self.stats.sent_by_project[project_id] += 1
+                    else:
+                        self.stats.skipped += 1
+                for i in range(0, len(events), BATCH_SIZE):
+                    frame = events[i : i + BATCH_SIZE]
+                    if binary_wire is not None:
+                        await ws.send(binary_wire.dumps(frame))
+                    elif len(frame) == 1:
+                        await ws.send(frame[0].dumps())
+                    else:
+                        await ws.send(EventMsg.dumps_batch(frame))
+                    self.stats.sent.update(event.event_type for event in frame)
+                    self.stats.sent_by_project[project_id] += len(frame)
+                await asyncio.sleep(BATCH_INTERVAL)
+            if uploads:
+                await asyncio.wait(list(uploads))
+
+    async def _connect_frontend(self, project_id: str):
+        ws = await websockets.connect(  # compressed, as browsers do
+            f"{self.cfg['wsUrl']}{WS_ROOT}/{PROJECT_KEY}/", max_size=None, ping_interval=None
+        )
+        handshake = EventMsg(
+            project_id=project_id,
+            run_id=None,
+            event_type=EVENT_TYPE_NAME_HANDSHAKE,
+            identity_type=IdentityType.WEB,
+        )
+        await ws.send(handshake.dumps())
+        reply = EventMsg.loads(await ws.recv())
+        if reply.payload.get(RESULT_KEY) != 200:
+            raise RuntimeError(f"handshake of frontend rejected: {reply.payload}")
+        return ws
+
+    async def _run_frontend(self, ws):
+        while True:
+            now = time.time()
+            if self.deadline is not None and now > self.deadline + DRAIN_TIMEOUT:
+                return
+            try:
+                text = await asyncio.wait_for(ws.recv(), timeout=DRAIN_IDLE)
+            except asyncio.TimeoutError:
+                if self.deadline is not None and now > self.deadline:
+                    return  # sending stopped and nothing more arrived
+                continue
+            except websockets.ConnectionClosed:
+                return
+            received = time.time()
+            message = json.loads(text)
+            payload = message.get(PAYLOAD_KEY)
+            if isinstance(payload, dict) and SENT_AT_KEY in payload:
+                self.stats.received[message.get(EVENT_TYPE_KEY)] += 1
+                self.stats.add_latency(received - payload[SENT_AT_KEY])
+
+    async def run(self) -> dict:
+        clients = await asyncio.gather(
+            *[self._connect_client(project_id, run_id) for project_id, run_id in self.clients]
+        )
+        drains = [asyncio.ensure_future(self._drain_client(ws)) for ws, _ in clients]
+        await asyncio.to_thread(self.barrier.wait)  # every project has a client connected
+        frontends = await asyncio.gather(*[self._connect_frontend(pid) for pid in self.frontends])
+        receivers = [asyncio.ensure_future(self._run_frontend(ws)) for ws in frontends]
+        await asyncio.to_thread(self.barrier.wait)  # everyone connected
+        self.deadline = time.time() + self.cfg["duration"]
+        senders = await asyncio.gather(
+            *[
+                self._run_client(ws, binary_wire, project_id, run_id)
+                for (ws, binary_wire), (project_id, run_id) in zip(clients, self.clients)
+            ],
+            return_exceptions=True,
+        )
+        for error in senders:
+            if isinstance(error, Exception):
+                self.stats.add_error(f"client failed cause {error!r}")
+        await asyncio.gather(*receivers, return_exceptions=True)
+        for ws in [ws for ws, _ in clients] + list(frontends):
+            await ws.close()
+        await asyncio.gather(*drains, return_exceptions=True)
+        return self.stats.json
+
+
+def _load_process(cfg: dict, clients: list, frontends: list, barrier, results):
+    try:
+        results.put(asyncio.run(_LoadProcess(cfg, clients, frontends, barrier).run()))
+    except Exception as e:
+        barrier.abort()
+        results.put({"errors": [f"load process failed cause {e!r}"]})
+
+
+class _ServerSampler:
+    """samples cpu time and memory of a server process and its children, like workers"""
+
+    def __init__(self, pid: int):
+        self.process = psutil.Process(pid)
+        self.cpu_times = {}  # {pid : cpu seconds when last sampled}
+        self.cpu_seconds = 0.0
+        self.cpu_percents = []
+        self.rss = []
+        self.began = None
+        self._stop = Event()
+        self._thread = Thread(target=self._loop, daemon=True)
+
+    def _sample(self):
+        cpu_seconds, rss = 0.0, 0
+        try:
+            processes = [self.process] + self.process.children(recursive=True)
+        except psutil.Error:
+            return
+        for process in processes:
+            try:
+                with process.oneshot():
+                    times = process.cpu_times()
+                    seconds = times.user + times.system
+                    rss += process.memory_info().rss
+            except psutil.Error:  # exited
+                continue
+            # processes started while sampling count from their start
+            cpu_seconds += seconds - self.cpu_times.get(process.pid, 0 if self.began else seconds)
+            self.cpu_times[process.pid] = seconds
+        self.cpu_seconds += cpu_seconds
+        self.rss.append(rss)
+        return cpu_seconds
+
+    def _loop(self):
+        while not self._stop.wait(SAMPLE_INTERVAL):
+            cpu_seconds = self._sample()
+            if cpu_seconds is not None:
+                self.cpu_percents.append(cpu_seconds / SAMPLE_INTERVAL * 100)
+
+    def start(self):
+        self._sample()  # cpu spent before is not counted
+        self.began = time.time()
+        self._thread.start()
+
+    def stop(self) -> dict:
+        self._stop.set()
+        self._thread.join()
+        self._sample()
+        seconds = time.time() - self.began
+        return {
+            "cpuPercent": self.cpu_seconds / max(seconds, 1e-3) * 100,
+            "cpuPercentMax": max(self.cpu_percents, default=None),
+            "rssMB": max(self.rss) / 1e6 if self.rss else None,
+            "rssMBEnd": self.rss[-1] / 1e6 if self.rss else None,
+            "processes": len(self.cpu_times),
+        }
+
+
+def _free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def _isolated_env(vault: str) -> Dict[str, str]:
+    """environment of a server process using vault instead of the one of the user, so that it neither loads projects of the user nor writes next to them"""
+    config_dir = os.path.join(vault, "config")
+    os.makedirs(os.path.join(config_dir, "neetbox"))
+    with open(os.path.join(config_dir, "neetbox", "neetbox.global.toml"), "w") as config_file:
+        toml.dump({**get_global_config(), "vault": vault}, config_file)
+    # where neetbox.config.user looks for the global config
+    return {**os.environ, "LOCALAPPDATA" if os.name == "nt" else "XDG_CONFIG_HOME": config_dir}
+
+
+def _launch_server(port: int, workers: int, log_file, vault: str) -> subprocess.Popen:
+    popen = subprocess.Popen(
+        [
+            sys.executable,
+            "-m",
+            "neetbox.server._daemon_server_launch_script",
+            "--config",
+            json.dumps({"port": port, "workers": workers}),
+        ],
+        stdout=log_file,
+        stderr=subprocess.STDOUT,
+        env=_isolated_env(vault),
+    )
+    deadline = time.time() + SERVER_STARTUP_TIMEOUT
+    while True:
+        try:
+            httpx.get(f"http://127.0.0.1:{port}{API_ROOT}/{SERVER_KEY}/hello", timeout=1)
+            return popen
+        except httpx.HTTPError:
+            if popen.poll() is not None or time.time() > deadline:
+                popen.kill()
+                raise RuntimeError(f"server failed to start, see {log_file.name}")
+            time.sleep(0.2)
+
+
+def _history_files_of(vault: str, project_id: str) -> List[str]:
+    path = f"{vault}/server/db/project/{project_id}.projectdb"
+    return [f"{path}{suffix}" for suffix in ["", "-wal", "-shm"]]
+
+
+def _ingest_stats_of(url: str, project_ids: List[str]) -> dict:
+    """rows committed to history of the projects, once nothing is queued"""
+    stats = {}
+    deadline = time.time() + DRAIN_TIMEOUT
+    for project_id in project_ids:
+        while True:
+            try:
+                stats[project_id] = httpx.get(
+                    f"{url}{API_ROOT}/{PROJECT_KEY}/{project_id}/ingest", timeout=10
+                ).json()
+            except Exception as e:
+                logger.warn(f"failed to get ingest stats of project {project_id} cause {e!r}")
+                break
+            if not stats[project_id].get("queued") or time.time() > deadline:
+                break
+            time.sleep(0.2)
+    return stats
+
+
+def run_bench(
+    clients: int = 4,
+    frontends: int = 1,
+    projects: int = 0,
+    rate: float = 200,
+    mix: str = DEFAULT_MIX,
+    duration: float = 10,
+    wire: str = WIRE_FORMAT_BINARY,
+    workers: int = 1,
+    image_size: float = 64,
+    load_processes: int = 1,
+    server: Optional[str] = None,
+    server_pid: Optional[int] = None,
+    output: Optional[str] = None,
+    keep_history: bool = False,
+) -> dict:
+    """launch a server, or use a running one, and drive it with synthetic cli clients and frontends.
+
+    Args:
+        clients (int, optional): number of cli clients, each a run. Defaults to 4.
+        frontends (int, optional): number of frontends, spread over the projects. Defaults to 1.
+        projects (int, optional): number of projects the clients are spread over, one project per client if 0. Defaults to 0.
+        rate (float, optional): events sent by each client per second. Defaults to 200.
+        mix (str, optional): weights of event types. Defaults to DEFAULT_MIX.
+        duration (float, optional): seconds of sending. Defaults to 10.
+        wire (str, optional): wire format offered by clients, "binary" or "json". Defaults to "binary".
+        workers (int, optional): worker processes of the server launched. Defaults to 1.
+        image_size (float, optional): kilobytes of each image. Defaults to 64.
+        load_processes (int, optional): processes the clients and frontends are split over, in case one process could not generate the load. Defaults to 1.
+        server (str, optional): url of a running server like http://127.0.0.1:20202, launch one if None. Defaults to None.
+        server_pid (int, optional): pid of the running server, to sample its cpu and memory. Defaults to None.
+        output (str, optional): path of the json report. Defaults to bench-server-<version>-<time>.json.
+        keep_history (bool, optional): keep the temporary vault of the server launched, where history of the synthetic projects is. Defaults to False.
+
+    Returns:
+        dict: the report
+    """
+    parse_mix(mix)  # fail early
+    projects = projects or clients
+    project_ids = [str(uuid4()) for _ in range(projects)]
+    client_specs = [(project_ids[i % projects], str(uuid4())) for i in range(clients)]
+    frontend_specs = [project_ids[i % projects] for i in range(frontends)]
+    load_processes = max(1, min(load_processes, clients))
+    log_file = tempfile.NamedTemporaryFile("w+", prefix="neetbox-bench-server-", suffix=".log")
+    launching, popen = server is None, None
+    # a server launched keeps history in a temporary vault, a running one in the vault of the user
+    vault = (
+        tempfile.mkdtemp(prefix="neetbox-bench-vault-") if launching else get_global_config("vault")
+    )
+    try:
+        if launching:
+            port = _free_port()
+            logger.log(f"launching a server with {workers} worker(s) on port {port}...")
+            popen = _launch_server(port, workers, log_file, vault)
+            server, server_pid = f"http://127.0.0.1:{port}", popen.pid
+        server = server.rstrip("/")
+        cfg = {
+            "url": server,
+            "wsUrl": server.replace("http", "ws", 1),
+            "rate": rate,
+            "mix": mix,
+            "duration": duration,
+            "wire": wire,
+            "imageSize": image_size,
+        }
+        context = multiprocessing.get_context("spawn")
+        barrier = context.Barrier(load_processes + 1)
+        results = context.Queue()
+        processes = [
+            context.Process(
+                target=_load_process,
+                args=(cfg, client_specs[i::load_processes], frontend_specs[i::load_processes]),
+                kwargs={"barrier": barrier, "results": results},
+                daemon=True,
+            )
+            for i in range(load_processes)
+        ]
+        sampler = _ServerSampler(server_pid) if server_pid else None
+        try:
+            for process in processes:
+                process.start()
+            logger.log(f"connecting {clients} clients and {frontends} frontends...")
+            barrier.wait(timeout=SERVER_STARTUP_TIMEOUT)
+            barrier.wait(timeout=SERVER_STARTUP_TIMEOUT)
+            if sampler:
+                sampler.start()
+            began = time.time()
+            logger.log(f"sending for {duration} seconds...")
+            stats = [results.get(timeout=duration + DRAIN_TIMEOUT * 3) for _ in processes]
+            seconds = time.time() - began
+            server_stats = sampler.stop() if sampler else None
+            ingest = _ingest_stats_of(server, project_ids)
+        except Exception as e:
+            for process in processes:
+                process.kill()
+            if popen is not None:
+                popen.kill()
+            log_file.seek(0)
+            raise RuntimeError(
+                f"benchmark failed cause {e!r}, server said:\n{log_file.read()[-4000:]}"
+            )
+        history_bytes = sum(
+            os.path.getsize(path)
+            for project_id in project_ids
+            for path in _history_files_of(vault, project_id)
+            if os.path.isfile(path)
+        )
+    finally:
+        if popen is not None:
+            if popen.poll() is None:
+                try:
+                    httpx.post(f"{server}{API_ROOT}/{SERVER_KEY}/shutdown", timeout=10)
+                    popen.wait(timeout=30)
+                except Exception:
+                    popen.kill()
+                    popen.wait()
+        if launching:
+            if keep_history:
+                logger.log(f"history of the synthetic projects is kept in {vault}")
+            else:
+                shutil.rmtree(vault, ignore_errors=True)
+        log_file.close()
+
+    def _sum(key):
+        return sum((Counter(s.get(key, {})) for s in stats), Counter())
+
+    sent, received = _sum("sent"), _sum("received")
+    # every frontend of a project receives what is sent to the project
+    expected = sum(
+        num_sent * frontend_specs.count(project_id)
+        for project_id, num_sent in _sum("sent_by_project").items()
+    )
+    latencies = [latency for s in stats for latency in s.get("latencies", [])]
+    committed = sum(s.get("committed", 0) for s in ingest.values())
+    report = {
+        "neetbox": VERSION,
+        "time": datetime.now().isoformat(),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "cpuCount": os.cpu_count(),
+        "config": {
+            "clients": clients,
+            "frontends": frontends,
+            "projects": projects,
+            "rate": rate,
+            "mix": parse_mix(mix),
+            "duration": duration,
+            "wire": wire,
+            "workers": workers if launching else None,
+            "imageSizeKB": image_size,
+            "loadProcesses": load_processes,
+            "server": server,
+        },
+        "seconds": seconds,
+        "sent": {
+            "total": sum(sent.values()),
+            "perSecond": sum(sent.values()) / duration,
+            "byType": dict(sent),
+            "skipped": sum(s.get("skipped", 0) for s in stats),
+        },
+        "ingest": {
+            "committed": committed,
+            "perSecond": committed / duration,
+            "commitLatency": max(
+                (s.get("commitLatency", {}) for s in ingest.values()),
+                key=lambda latency: latency.get("p99", 0),
+                default={},
+            ),
+        },
+        "forward": {
+            "received": sum(received.values()),
+            "expected": expected,
+            "delivered": sum(received.values()) / expected if expected else None,
+            "perSecond": sum(received.values()) / duration,
+            "byType": dict(received),
+            "latency": percentiles(latencies),
+        },
+        "images": {
+            "uploaded": sum(s.get("images_uploaded", 0) for s in stats),
+            "failed": sum(s.get("images_failed", 0) for s in stats),
+            "latency": percentiles([x for s in stats for x in s.get("upload_latencies", [])]),
+        },
+        "handshakeLatency": percentiles(
+            [x for s in stats for x in s.get("handshake_latencies", [])]
+        ),
+        "history": {
+            "bytes": history_bytes,
+            "bytesPerRow": history_bytes / committed if committed else None,
+        },
+        "server": server_stats,
+        "errors": [error for s in stats for error in s.get("errors", [])],
+    }
+    output = output or f"bench-server-{VERSION}-{datetime.now().strftime('%Y%m%d-%H%M%S')}.json"
+    with open(output, "w") as f:
+        json.dump(report, f, indent=2)
+    report["output"] = output
+    return report
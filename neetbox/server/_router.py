@@ -0,0 +1,278 @@
+# -*- coding: utf-8 -*-
+#
+# Author: GavinGong aka VisualDust
+# Github: github.com/visualDust
+# Date:   20261018
+
+import asyncio
+import json
+import multiprocessing
+import os
+import socket
+import time
+from threading import Thread
+from typing import List
+
+import httpx
+import setproctitle
+import uvicorn
+import websockets
+from fastapi import FastAPI, Request, Response, WebSocket
+from fastapi.responses import JSONResponse, StreamingResponse
+from starlette.background import BackgroundTask
+
+from neetbox._protocol import *
+from neetbox.logging import Logger
+
+from ._sharding import SHARD_ENV, get_hash_ring
+
+logger = Logger("SERVER ROUTER", skip_writers_names=["ws"])
+
+WORKER_STARTUP_TIMEOUT = 60  # seconds to wait for workers to serve
+WORKER_WATCH_INTERVAL = 1  # seconds between checks of workers alive
+# not forwarded between client and worker, they describe a single connection
+HOP_BY_HOP_HEADERS = {
+    "connection",
+    "keep-alive",
+    "proxy-authenticate",
+    "proxy-authorization",
+    "te",
+    "trailer",
+    "transfer-encoding",
+    "upgrade",
+    "host",
+}
+
+
+def _worker_process(cfg: dict, index: int, num_workers: int, port: int, debug: bool):
+    os.environ[SHARD_ENV] = f"{index}/{num_workers}"  # before history files are loaded
+    setproctitle.setproctitle(f"NEETBOX SERVER WORKER {index}")
+    from .fastapi import serverapp
+
+    uvicorn_log_level = "info" if debug else "critical"
+    uvicorn.run(serverapp, host="127.0.0.1", port=port, log_level=uvicorn_log_level)
+
+
+def _free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+class ShardedServer:
+    """worker processes each serving the projects assigned to it by consistent hashing of project ids, so that every project has a single writer to its history, and a router forwarding http requests and websockets of a project to its worker. requests not of a project go to the first worker."""
+
+    def __init__(self, cfg: dict, num_workers: int, debug: bool = False):
+        self.cfg = cfg
+        self.num_workers = num_workers
+        self.debug = debug
+        self.ring = get_hash_ring(num_workers)
+        self.ports = [_free_port() for _ in range(num_workers)]
+        self.workers: List[multiprocessing.Process] = [None] * num_workers
+        self.shutting_down = False
+        self._context = multiprocessing.get_context("spawn")  # not inheriting threads and dbs
+        self._http = httpx.AsyncClient(
+            timeout=httpx.Timeout(None, connect=5),
+            limits=httpx.Limits(max_connections=None, max_keepalive_connections=64),
+        )
+        self.app = self._create_app()
+
+    def _start_worker(self, index: int):
+        worker = self._context.Process(
+            target=_worker_process,
+            args=(self.cfg, index, self.num_workers, self.ports[index], self.debug),
+            name=f"neetbox server worker {index}",
+            daemon=True,
+        )
+        worker.start()
+        self.workers[index] = worker
+
+    def _wait_for_workers(self):
+        deadline = time.time() + WORKER_STARTUP_TIMEOUT
+        for index, port in enumerate(self.ports):
+            while True:
+                try:
+                    httpx.get(f"http://127.0.0.1:{port}{API_ROOT}/{SERVER_KEY}/hello", timeout=1)
+                    break
+                except httpx.HTTPError:
+                    if time.time() > deadline or not self.workers[index].is_alive():
+                        raise RuntimeError(f"worker {index} failed to start")
+                    time.sleep(0.1)
+
+    def _watch_workers(self):
+        while not self.shutting_down:
+            time.sleep(WORKER_WATCH_INTERVAL)
+            for index, worker in enumerate(self.workers):
+                if not worker.is_alive() and not self.shutting_down:
+                    logger.err(f"worker {index} exited with code {worker.exitcode}, restarting...")
+                    self._start_worker(index)
+
+    def worker_url(self, index: int, scheme: str = "http") -> str:
+        return f"{scheme}://127.0.0.1:{self.ports[index]}"
+
+    def worker_of_path(self, path: str) -> int:
+        """index of the worker serving an http path, of the owner if the path is of a project"""
+        parts = path.strip("/").split("/")
+        if parts[:2] == [API_ROOT.strip("/"), PROJECT_KEY] and len(parts) > 2:
+            return self.ring.worker_of(parts[2])
+        return 0
+
+    async def _forward(self, request: Request, index: int) -> Response:
+        url = self.worker_url(index) + request.url.path
+        if request.url.query:
+            url = f"{url}?{request.url.query}"
+        headers = [
+            (k, v) for k, v in request.headers.items() if k.lower() not in HOP_BY_HOP_HEADERS
+        ]
+        upstream_request = self._http.build_request(
+            request.method, url, headers=headers, content=await request.body()
+        )
+        try:
+            upstream = await self._http.send(upstream_request, stream=True)
+        except httpx.HTTPError as e:
+            logger.err(f"failed to forward {request.method} {request.url.path} cause {e!r}")
+            return JSONResponse({ERROR_KEY: f"worker {index} unavailable"}, status_code=502)
+        return StreamingResponse(  # bodies of history could be large, not buffered
+            upstream.aiter_raw(),
+            status_code=upstream.status_code,
+            headers={
+                k: v
+                for k, v in upstream.headers.multi_items()
+                if k.lower() not in HOP_BY_HOP_HEADERS
+            },
+            background=BackgroundTask(upstream.aclose),
+        )
+
+    async def _list_projects(self) -> Response:
+        async def _list_of(index):
+            try:
+                response = await self._http.get(
+                    f"{self.worker_url(index)}{API_ROOT}/{PROJECT_KEY}/list"
+                )
+                return response.json()
+            except Exception as e:
+                logger.err(f"failed to list projects of worker {index} cause {e!r}")
+                return []
+
+        lists = await asyncio.gather(*[_list_of(index) for index in range(self.num_workers)])
+        return JSONResponse([project for projects in lists for project in projects])
+
+    async def _shutdown(self) -> Response:
+        self.shutting_down = True
+        results = await asyncio.gather(
+            *[
+                self._http.post(f"{self.worker_url(index)}{API_ROOT}/{SERVER_KEY}/shutdown")
+                for index in range(self.num_workers)
+            ],
+            return_exceptions=True,
+        )
+
+        def _join_and_exit():
+            for worker in self.workers:
+                worker.join(timeout=10)
+            os._exit(0)
+
+        Thread(target=_join_and_exit).start()
+        logger.info(f"BYE.")
+        errors = [repr(result) for result in results if isinstance(result, Exception)]
+        if errors:
+            return {RESULT_KEY: f"shutdown with errors {errors}"}
+        return results[0].json()
+
+    async def _forward_websocket(self, websocket: WebSocket, path: str):
+        """route a websocket by the project id of its handshake, the first message"""
+        await websocket.accept()
+        handshake = await websocket.receive()
+        if handshake["type"] == "websocket.disconnect":
+            return
+        handshake = handshake.get("text") or handshake.get("bytes")
+        try:
+            project_id = json.loads(handshake).get(PROJECT_ID_KEY)
+        except Exception:  # let the worker reject it
+            project_id = None
+        index = self.ring.worker_of(project_id) if project_id else 0
+        try:
+            async with websockets.connect(
+                self.worker_url(index, scheme="ws") + path,
+                max_size=None,
+                ping_interval=None,  # the router is the one pinged by clients
+                compression=None,  # over loopback
+            ) as upstream:
+                await upstream.send(handshake)
+
+                async def _to_worker():
+                    while True:
+                        frame = await websocket.receive()
+                        if frame["type"] == "websocket.disconnect":
+                            return
+                        if frame.get("text") is not None:
+                            await upstream.send(frame["text"])
+                        else:
+                            await upstream.send(frame["bytes"])
+
+                async def _to_client():
+                    async for message in upstream:
+                        if isinstance(message, str):
+                            await websocket.send_text(message)
+                        else:
+                            await websocket.send_bytes(message)
+
+                tasks = [asyncio.ensure_future(_to_worker()), asyncio.ensure_future(_to_client())]
+                done, pending = await asyncio.wait(tasks, return_when=asyncio.FIRST_COMPLETED)
+                for task in pending:
+                    task.cancel()
+                for task in done:
+                    task.exception()  # retrieved, a closed connection is expected
+        except Exception as e:
+            logger.debug(f"stopped forwarding websocket to worker {index} cause {e!r}")
+        try:
+            await websocket.close()
+        except Exception:  # closed already
+            pass
+
+    def _create_app(self) -> FastAPI:
+        app = FastAPI()
+
+        @app.websocket(f"{WS_ROOT}/{PROJECT_KEY}/")
+        async def _project_websocket(websocket: WebSocket):
+            await self._forward_websocket(websocket, f"{WS_ROOT}/{PROJECT_KEY}/")
+
+        @app.websocket(f"{WS_ROOT}/{SERVER_KEY}/")
+        async def _server_websocket(websocket: WebSocket):
+            await self._forward_websocket(websocket, f"{WS_ROOT}/{SERVER_KEY}/")
+
+        @app.api_route("/{path:path}", methods=["GET", "POST", "PUT", "DELETE", "PATCH", "HEAD"])
+        async def _http(request: Request, path: str):
+            path = request.url.path
+            if path == f"{API_ROOT}/{PROJECT_KEY}/list":
+                return await self._list_projects()
+            if path == f"{API_ROOT}/{SERVER_KEY}/shutdown" and request.method == "POST":
+                return await self._shutdown()
+            return await self._forward(request, self.worker_of_path(path))
+
+        return app
+
+    def serve(self):
+        port = self.cfg["port"]
+        for index in range(self.num_workers):
+            self._start_worker(index)
+        self._wait_for_workers()
+        Thread(target=self._watch_workers, name="neetbox worker watcher", daemon=True).start()
+        logger.log(
+            f"routing http://0.0.0.0:{port} to {self.num_workers} workers on ports {self.ports}"
+        )
+        uvicorn_log_level = "info" if self.debug else "critical"
+        try:
+            uvicorn.run(self.app, host="0.0.0.0", port=port, log_level=uvicorn_log_level)
+        finally:  # interrupted, let workers commit what is queued before exiting
+            if not self.shutting_down:
+                self.shutting_down = True
+                for index in range(self.num_workers):
+                    try:
+                        httpx.post(f"{self.worker_url(index)}{API_ROOT}/{SERVER_KEY}/shutdown")
+                    except httpx.HTTPError:
+                        pass
+            for worker in self.workers:
+                worker.join(timeout=10)
+                if worker.is_alive():
+                    worker.terminate()
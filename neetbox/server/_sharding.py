@@ -0,0 +1,62 @@
+# -*- coding: utf-8 -*-
+#
+# Author: GavinGong aka VisualDust
+# Github: github.com/visualDust
+# Date:   20261018
+
+import bisect
+import functools
+import hashlib
+import os
+from typing import Optional, Tuple
+
+SHARD_ENV = "NEETBOX_SERVER_SHARD"  # "index/number of workers" of a worker process
+VIRTUAL_NODES = 64  # points of a worker on the hash ring
+
+
+def _hash(key: str) -> int:
+    return int.from_bytes(hashlib.md5(key.encode()).digest()[:8], "big")
+
+
+class HashRing:
+    """consistent hashing of project ids to workers. each worker takes points on a ring of hashes, a project belongs to the worker of the first point after the hash of its id, so that changing the number of workers moves only the projects of the points added or removed."""
+
+    def __init__(self, num_workers: int, virtual_nodes: int = VIRTUAL_NODES):
+        if num_workers < 1:
+            raise ValueError(f"expect at least 1 worker but got {num_workers}")
+        self.num_workers = num_workers
+        points = sorted(
+            (_hash(f"worker-{index}#{node}"), index)
+            for index in range(num_workers)
+            for node in range(virtual_nodes)
+        )
+        self._hashes = [hash_value for hash_value, _ in points]
+        self._workers = [index for _, index in points]
+
+    def worker_of(self, project_id: str) -> int:
+        """index of the worker owning the project"""
+        position = bisect.bisect(self._hashes, _hash(project_id)) % len(self._hashes)
+        return self._workers[position]
+
+
+@functools.lru_cache(maxsize=8)
+def get_hash_ring(num_workers: int) -> HashRing:
+    return HashRing(num_workers)
+
+
+def current_shard() -> Optional[Tuple[int, int]]:
+    """(index, number of workers) if this process is a worker of a sharded server, None otherwise"""
+    shard = os.environ.get(SHARD_ENV)
+    if not shard:
+        return None
+    index, num_workers = shard.split("/")
+    return int(index), int(num_workers)
+
+
+def owns_project(project_id: str) -> bool:
+    """whether the project is served by this process, always true if the server is not sharded"""
+    shard = current_shard()
+    if shard is None:
+        return True
+    index, num_workers = shard
+    return get_hash_ring(num_workers).worker_of(project_id) == index
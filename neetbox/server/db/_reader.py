@@ -0,0 +1,62 @@
+# -*- coding: utf-8 -*-
+#
+# Author: GavinGong aka VisualDust
+# Github: github.com/visualDust
+# Date:   20261018
+
+import pathlib
+import sqlite3
+import threading
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Any, Callable
+
+READ_POOL_SIZE = 4  # threads reading a db concurrently
+
+
+class DBReaderPool:
+    """threads reading a sqlite db in WAL mode, each through a read only connection of its own, so that queries run concurrently with each other and with the writer, and never on the event loop. readers see what is committed."""
+
+    def __init__(self, path: str, name: str = None, size: int = READ_POOL_SIZE):
+        """
+        Args:
+            path (str): path of the db file, which should exist
+            name (str, optional): name of the reader threads. Defaults to None.
+            size (int, optional): number of reader threads. Defaults to READ_POOL_SIZE.
+        """
+        self.path = path
+        self._uri = f"{pathlib.Path(path).absolute().as_uri()}?mode=ro"
+        self._local = threading.local()  # connection of the reader thread
+        self._connections = []
+        self._connections_lock = threading.Lock()
+        self._executor = ThreadPoolExecutor(
+            max_workers=size,
+            thread_name_prefix=f"neetbox db reader {name or path}",
+            initializer=self._connect,
+        )
+
+    def _connect(self):
+        connection = sqlite3.connect(self._uri, uri=True, check_same_thread=False)
+        with self._connections_lock:
+            self._connections.append(connection)
+        self._local.connection = connection
+
+    def is_current(self) -> bool:
+        """whether called on a reader thread"""
+        return hasattr(self._local, "connection")
+
+    @property
+    def connection(self) -> sqlite3.Connection:
+        """read only connection of the current reader thread"""
+        return self._local.connection
+
+    def submit(self, job: Callable[[], Any]) -> Future:
+        """run a job on a reader thread, queries in it go through the read only connection of the thread"""
+        return self._executor.submit(job)
+
+    def close(self):
+        """wait for the queries running and close the connections"""
+        self._executor.shutdown(wait=True, cancel_futures=True)
+        with self._connections_lock:
+            for connection in self._connections:
+                connection.close()
+            self._connections.clear()
@@ -0,0 +1,215 @@
+# -*- coding: utf-8 -*-
+#
+# Author: GavinGong aka VisualDust
+# Github: github.com/visualDust
+# Date:   20261018
+
+import queue
+import sqlite3
+import threading
+import time
+from collections import deque
+from concurrent.futures import Future
+from typing import Any, Callable
+
+from neetbox.logging import Logger
+
+logger = Logger("DB Writer", skip_writers_names=["ws"])
+
+_RATE_WINDOW = 10.0  # seconds the ingest rate is averaged over
+_LATENCY_SAMPLES = 1024  # commits the latency percentiles are computed from
+
+
+class DBWriter:
+    """a thread owning the write connection of a sqlite db. writes are queued as jobs and committed in groups, a transaction every max_batch_rows rows or max_batch_delay seconds whichever comes first, so that callers never wait on a fsync unless they want to.
+
+    On the writer thread, jobs see the writes of the transaction not committed yet. Each job runs in a savepoint, a failed job is rolled back alone.
+
+    Submitting never blocks, since it is mostly done on the event loop. Jobs submitted while queue_size jobs are queued are rejected, their futures fail with queue.Full.
+    """
+
+    def __init__(
+        self,
+        path: str,
+        name: str = None,
+        max_batch_rows: int = 1024,
+        max_batch_delay: float = 0.02,
+        queue_size: int = 100000,
+    ):
+        """
+        Args:
+            path (str): path of the db file
+            name (str, optional): name of the writer thread. Defaults to None.
+            max_batch_rows (int, optional): max rows written in a transaction. Defaults to 1024.
+            max_batch_delay (float, optional): max seconds a write waits for others to be committed together. Defaults to 0.02.
+            queue_size (int, optional): max jobs queued, more are rejected. Defaults to 100000.
+        """
+        self.path = path
+        self.max_batch_rows = max_batch_rows
+        self.max_batch_delay = max_batch_delay
+        self.connection = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self.connection.execute("pragma journal_mode=wal")
+        self.connection.execute("PRAGMA foreign_keys = ON")
+        self.num_ingested = 0  # rows submitted
+        self.num_committed = 0  # rows committed
+        self.num_commits = 0
+        self.num_rejected = 0  # rows rejected because the queue is full
+        self.queue_size = queue_size
+        self._overloaded = False  # whether rejecting, logged once until the queue drains
+        self._jobs = queue.Queue()  # bounded by queue_size in submit, barriers are never rejected
+        self._stats_lock = threading.Lock()
+        self._rate_samples = deque([(time.monotonic(), 0)])  # (time, num_ingested)
+        self._commit_latencies = deque(maxlen=_LATENCY_SAMPLES)  # from submitted to committed
+        self._transaction_times = deque(maxlen=_LATENCY_SAMPLES)
+        self._thread = threading.Thread(
+            target=self._loop, name=f"neetbox db writer {name or path}", daemon=True
+        )
+        self._thread.start()
+
+    def is_current(self) -> bool:
+        """whether called on the writer thread"""
+        return threading.current_thread() is self._thread
+
+    def submit(
+        self, job: Callable[[], Any], num_rows: int = 1, urgent: bool = False, force: bool = False
+    ) -> Future:
+        """queue a job to run on the writer thread without blocking, jobs submitted on the writer thread run right away
+
+        Args:
+            job (Callable[[], Any]): the write
+            num_rows (int, optional): rows written by the job, counted against max_batch_rows. Defaults to 1.
+            urgent (bool, optional): commit as soon as the job is done instead of waiting for more, for callers waiting on it. Defaults to False.
+            force (bool, optional): queue the job even if the queue is full. Defaults to False.
+
+        Returns:
+            Future: result of the job, set once committed. fails with queue.Full if rejected
+        """
+        future = Future()
+        if self.is_current():
+            try:
+                future.set_result(job())
+            except Exception as e:
+                future.set_exception(e)
+            return future
+        num_queued = self._jobs.qsize()
+        if not force and num_queued >= self.queue_size:  # drop instead of stalling the caller
+            with self._stats_lock:
+                self.num_rejected += num_rows
+            if not self._overloaded:
+                self._overloaded = True
+                logger.warn(f"{num_queued} writes queued to {self.path}, rejecting more")
+            future.set_exception(queue.Full(f"{num_queued} writes queued to {self.path}"))
+            return future
+        if self._overloaded and num_queued < self.queue_size // 2:
+            self._overloaded = False
+            logger.ok(f"writes queued to {self.path} drained, accepting again")
+        with self._stats_lock:
+            self.num_ingested += num_rows
+        self._jobs.put_nowait((job, future, num_rows, urgent, time.monotonic()))
+        return future
+
+    def _loop(self):
+        while True:
+            first = self._jobs.get()
+            if first is None:  # closed
+                return
+            batch, num_rows, closing = [first], first[2], False
+            deadline = time.monotonic() + self.max_batch_delay
+            while num_rows < self.max_batch_rows and not batch[-1][3]:
+                timeout = deadline - time.monotonic()
+                try:
+                    job = self._jobs.get(timeout=max(timeout, 0))
+                except queue.Empty:
+                    break
+                if job is None:
+                    closing = True
+                    break
+                batch.append(job)
+                num_rows += job[2]
+            self._commit(batch, num_rows)
+            if closing:
+                return
+
+    def _commit(self, batch: list, num_rows: int):
+        began = time.monotonic()
+        cursor = self.connection.cursor()
+        results = []
+        cursor.execute("BEGIN")
+        for job, future, _, _, _ in batch:
+            cursor.execute("SAVEPOINT job")
+            try:
+                result = job()
+            except Exception as e:
+                cursor.execute("ROLLBACK TO job")
+                logger.err(f"failed to write to {self.path} cause '{e}'")
+                results.append((future, None, e))
+            else:
+                results.append((future, result, None))
+            cursor.execute("RELEASE job")
+        try:
+            cursor.execute("COMMIT")
+        except Exception as e:
+            cursor.execute("ROLLBACK")
+            logger.err(f"failed to commit {len(batch)} writes to {self.path} cause '{e}'")
+            results = [(future, None, e) for future, _, _ in results]
+        committed = time.monotonic()
+        with self._stats_lock:
+            self.num_committed += num_rows
+            self.num_commits += 1
+            self._transaction_times.append(committed - began)
+            self._commit_latencies.append(committed - batch[0][4])  # of the earliest in batch
+            self._rate_samples.append((committed, self.num_ingested))
+            self._prune_rate_samples(committed)
+        for future, result, error in results:
+            if error is None:
+                future.set_result(result)
+            else:
+                future.set_exception(error)
+
+    def _prune_rate_samples(self, now: float):
+        while len(self._rate_samples) > 1 and now - self._rate_samples[1][0] > _RATE_WINDOW:
+            self._rate_samples.popleft()
+
+    @property
+    def stats(self) -> dict:
+        """ingest rate in rows per second over the last 10 seconds, and latencies in milliseconds over the last 1024 commits"""
+
+        def _percentiles(samples):
+            samples = sorted(samples)
+            if not samples:
+                return {}
+            return {
+                name: samples[min(int(len(samples) * q), len(samples) - 1)] * 1000
+                for name, q in [("p50", 0.5), ("p99", 0.99), ("max", 1.0)]
+            }
+
+        now = time.monotonic()
+        with self._stats_lock:
+            self._prune_rate_samples(now)
+            since, num_ingested_since = self._rate_samples[0]
+            return {
+                "queued": self._jobs.qsize(),
+                "ingested": self.num_ingested,
+                "committed": self.num_committed,
+                "commits": self.num_commits,
+                "rejected": self.num_rejected,
+                "ingestRate": (self.num_ingested - num_ingested_since) / max(now - since, 1e-3),
+                "commitLatency": _percentiles(self._commit_latencies),
+                "transactionTime": _percentiles(self._transaction_times),
+            }
+
+    def barrier(self) -> Future:
+        """a future done once everything submitted so far is committed"""
+        return self.submit(lambda: None, num_rows=0, urgent=True, force=True)
+
+    def flush(self, timeout: float = None):
+        """wait until everything submitted so far is committed"""
+        if self._thread.is_alive() and not self.is_current():
+            self.barrier().result(timeout=timeout)
+
+    def close(self, timeout: float = None):
+        """commit what is queued, stop the thread and close the connection"""
+        if self._thread.is_alive():
+            self._jobs.put(None)
+            self._thread.join(timeout=timeout)
+        self.connection.close()
@@ -4,13 +4,15 @@
 # Github: github.com/visualDust
 # Date:   20231201
 
+import asyncio
 import collections
+import functools
 import json
 import os
 import sqlite3
 from datetime import datetime
 from threading import Lock
-from typing import Union
+from typing import Any, Callable, Union
 
 from vdtoys.localstorage import ResourceLoader, get_file_size_in_bytes
 
@@ -18,13 +20,39 @@ from neetbox._protocol import *
 from neetbox.config.user import get as get_global_config
 from neetbox.logging import Logger
 
+from ..._sharding import owns_project
 from .._manager import manager
+from .._reader import DBReaderPool
+from .._writer import DBWriter
 from ..abc import FetchType, ManageableDB, SortType
 from .condition import ProjectDbQueryCondition
 
 logger = Logger("PROJECT DB", skip_writers_names=["ws"])
 DB_PROJECT_FILE_FOLDER = f"{get_global_config('vault')}/server/db/project"
 DB_PROJECT_FILE_TYPE_NAME = "projectdb"
+# rows of a capped series are deleted once they exceed the cap by this fraction of it, or the min
+ROW_LIMIT_SLACK_RATIO = 0.1
+ROW_LIMIT_MIN_SLACK = 16
+
+
+def _on_writer_thread(method):
+    """run the method on the writer thread of the db and wait until committed"""
+
+    @functools.wraps(method)
+    def _method(self: "ProjectDB", *args, **kwargs):
+        return self._write(functools.partial(method, self, *args, **kwargs))
+
+    return _method
+
+
+def _async_read(method):
+    """an async version of the method, run on the read pool of the db without blocking the event loop"""
+
+    @functools.wraps(method)
+    async def _method(self: "ProjectDB", *args, **kwargs):
+        return await self.read_async(functools.partial(method, self, *args, **kwargs))
+
+    return _method
 
 
 class ProjectDB(ManageableDB):
@@ -34,8 +62,12 @@ class ProjectDB(ManageableDB):
     # not static. instance level vars
     project_id: str  # of which project id
     file_path: str  # where is the db file
-    connection: sqlite3.Connection  # the db connection
+    connection: sqlite3.Connection  # the db connection, shared by readers
+    writer: DBWriter  # owns the connection all writes go through
+    readers: DBReaderPool  # read only connections for async reads
     _inited_tables: collections.defaultdict
+    _next_ids: dict  # {table name : next id of row}
+    _num_rows: dict  # {(table name, id of run id, series) : number of rows}, of capped series
 
     def __new__(cls, project_id: str = None, path: str = None, **kwargs) -> "ProjectDB":
         if path is None and project_id is None:
@@ -52,7 +84,12 @@ class ProjectDB(ManageableDB):
         new_dbc.connection = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
         new_dbc.connection.execute("pragma journal_mode=wal")  # set journal mode WAL
         new_dbc.connection.execute("PRAGMA foreign_keys = ON")  # enable foreign keys features
+        new_dbc.writer = None
+        new_dbc.readers = None
         new_dbc._inited_tables = collections.defaultdict(lambda: False)
+        new_dbc._next_ids = {}
+        new_dbc._next_ids_lock = Lock()
+        new_dbc._num_rows = {}
         # check neetbox version
         _db_file_project_id = new_dbc.fetch_db_project_id(project_id)
         project_id = project_id or _db_file_project_id
@@ -70,6 +107,8 @@ class ProjectDB(ManageableDB):
                 raise RuntimeError(
                     f"History file version not match: reading from version {_db_file_version} with neetbox version {NEETBOX_VERSION}. If you want to bypass this check, set 'bypass-db-version-check' to True in global config. This may cause unexpected behavior."
                 )
+        new_dbc.writer = DBWriter(path, name=project_id)
+        new_dbc.readers = DBReaderPool(path, name=project_id)
         cls._path2dbc[path] = new_dbc
         manager.current[project_id] = new_dbc
         new_dbc.project_id = project_id
@@ -93,12 +132,72 @@ class ProjectDB(ManageableDB):
         return result
 
     def close(self):
-        try:
-            self.connection.commit()
-        except:
-            pass
+        if self.readers is not None:
+            self.readers.close()
+        if self.writer is not None:
+            self.writer.close()
         self.connection.close()
 
+    @classmethod
+    def flush_all(cls, timeout: float = None):
+        """wait until writes queued to every db are committed"""
+        for dbc in list(cls._path2dbc.values()):
+            dbc.writer.flush(timeout=timeout)
+
+    @property
+    def _connection(self) -> sqlite3.Connection:
+        """the connection of the writer on the writer thread, which sees writes not committed yet, a read only one on reader threads, the shared one elsewhere"""
+        if self.writer is not None and self.writer.is_current():
+            return self.writer.connection
+        if self.readers is not None and self.readers.is_current():
+            return self.readers.connection
+        return self.connection
+
+    def _write(self, job, wait: bool = True, num_rows: int = 1):
+        """run job on the writer thread, in a transaction shared with other writes queued around
+
+        Args:
+            job (Callable[[], Any]): the write
+            wait (bool, optional): block until committed and return the result, never on the event loop, see write_async. Defaults to True. Otherwise return the future once queued.
+            num_rows (int, optional): rows written by the job. Defaults to 1.
+        """
+        future = self.writer.submit(job, num_rows=num_rows, urgent=wait)
+        return future.result() if wait else future
+
+    async def write_async(self, job: Callable[[], Any], num_rows: int = 1):
+        """run job on the writer thread and wait until committed without blocking the event loop
+
+        Args:
+            job (Callable[[], Any]): the write
+            num_rows (int, optional): rows written by the job. Defaults to 1.
+        """
+        return await asyncio.wrap_future(self.writer.submit(job, num_rows=num_rows, urgent=True))
+
+    async def read_async(self, job: Callable[[], Any]):
+        """run job on the read pool and wait without blocking the event loop. queries in it go through a read only connection, writes still through the writer.
+
+        Args:
+            job (Callable[[], Any]): reads of the db, and any work on the results too heavy for the event loop
+        """
+        return await asyncio.wrap_future(self.readers.submit(job))
+
+    def reserve_ids(self, table_name: str, num: int = 1) -> int:
+        """reserve ids for rows to be inserted, so that a row queued to the writer has its id before committed
+
+        Returns:
+            int: the first id, the reserved ones are consecutive
+        """
+        with self._next_ids_lock:
+            if table_name not in self._next_ids:
+                result = None
+                if self.table_exist("sqlite_sequence"):  # autoincrement ids are never reused
+                    sql_query = "SELECT seq FROM sqlite_sequence WHERE name = ?"
+                    result, _ = self._query(sql_query, table_name, fetch=FetchType.ONE)
+                self._next_ids[table_name] = (result[0] if result else 0) + 1
+            first_id = self._next_ids[table_name]
+            self._next_ids[table_name] += num
+        return first_id
+
     def delete(self):
         """delete related files of db"""
         if self.project_id not in manager.current:
@@ -108,6 +207,10 @@ class ProjectDB(ManageableDB):
         del manager.current[self.project_id]
         del ProjectDB._path2dbc[self.file_path]
         logger.info(f"deleting history DB for project id {self.project_id}...")
+        if self.readers is not None:
+            self.readers.close()
+        if self.writer is not None:
+            self.writer.close()
         if self.connection:
             try:
                 self.connection.close()
@@ -143,7 +246,7 @@ class ProjectDB(ManageableDB):
         return ProjectDB(project_id)
 
     def _execute(self, query, *args, fetch: FetchType = FetchType.ALL, **kwargs):
-        cur = self.connection.cursor()
+        cur = self._connection.cursor()
         try:
             result = cur.execute(query, args)
         except Exception as e:
@@ -159,6 +262,13 @@ class ProjectDB(ManageableDB):
                 result = result.fetchmany(kwargs["many"])
         return result, cur.lastrowid
 
+    def _execute_many(self, query, rows: list):
+        try:
+            self._connection.executemany(query, rows)
+        except Exception as e:
+            logger.err(f"failed to insert {len(rows)} rows cause '{e}'")
+            logger.err(e, reraise=True)
+
     def _query(self, query, *args, fetch: FetchType = FetchType.ALL, **kwargs):
         return self._execute(query, *args, fetch=fetch, **kwargs)
 
@@ -216,6 +326,7 @@ class ProjectDB(ManageableDB):
 
     _run_id_fetch_lock = Lock()
 
+    @_on_writer_thread
     def fetch_id_of_run_id(self, run_id: str, timestamp: str = None):
         if not self._inited_tables[RUN_IDS_TABLE_NAME]:  # create if there is no version table
             sql_query = f"CREATE TABLE IF NOT EXISTS {RUN_IDS_TABLE_NAME} ( {ID_COLUMN_NAME} INTEGER PRIMARY KEY AUTOINCREMENT, {RUN_ID_COLUMN_NAME} TEXT NON NULL, {TIMESTAMP_COLUMN_NAME} TEXT NON NULL, {METADATA_COLUMN_NAME} TEXT, CONSTRAINT run_id_unique UNIQUE ({RUN_ID_COLUMN_NAME}));"
@@ -235,9 +346,7 @@ class ProjectDB(ManageableDB):
         if id_of_run_id is None:
             return None
         if metadata:  # if update name
-            metadata = json.dumps(metadata) if isinstance(metadata, dict) else metadata
-            sql_query = f"UPDATE {RUN_IDS_TABLE_NAME} SET {METADATA_COLUMN_NAME} = ? WHERE {ID_COLUMN_NAME} = ?"
-            _, _ = self._execute(sql_query, metadata, id_of_run_id)
+            self._set_metadata_of_id(id_of_run_id, metadata)
         # get name
         sql_query = f"SELECT {METADATA_COLUMN_NAME} FROM {RUN_IDS_TABLE_NAME} WHERE {ID_COLUMN_NAME} == {id_of_run_id}"
         (metadata,), _ = self._query(sql_query, fetch=FetchType.ONE)
@@ -246,6 +355,16 @@ class ProjectDB(ManageableDB):
         )  # if does not have metadata, return an empty one
         return metadata
 
+    @_on_writer_thread
+    def _set_metadata_of_id(self, id_of_run_id: int, metadata: Union[dict, str]):
+        metadata = json.dumps(metadata) if isinstance(metadata, dict) else metadata
+        sql_query = (
+            f"UPDATE {RUN_IDS_TABLE_NAME} SET {METADATA_COLUMN_NAME} = ? WHERE {ID_COLUMN_NAME} = ?"
+        )
+        _, _ = self._execute(sql_query, metadata, id_of_run_id)
+
+    fetch_metadata_of_run_id_async = _async_read(fetch_metadata_of_run_id)
+
     def get_run_id_of_id(self, id_of_run_id):
         try:
             sql_query = f"SELECT {RUN_ID_COLUMN_NAME} FROM {RUN_IDS_TABLE_NAME} WHERE {ID_COLUMN_NAME} == {id_of_run_id}"
@@ -269,9 +388,13 @@ class ProjectDB(ManageableDB):
         ]
         return result
 
+    get_run_ids_async = _async_read(get_run_ids)
+
+    @_on_writer_thread
     def delete_run_id(self, run_id: str):
         sql_query = f"DELETE FROM {RUN_IDS_TABLE_NAME} where {RUN_ID_COLUMN_NAME} = ?"
         _, _ = self._execute(sql_query, run_id)
+        self._num_rows.clear()  # rows deleted on cascade, counted again when written
 
     def get_series_of_table(self, table_name, run_id=None):
         if not self.table_exist(table_name):
@@ -285,26 +408,40 @@ class ProjectDB(ManageableDB):
         result, _ = self._query(sql_query, *args, fetch=FetchType.ALL)
         return [result for (result,) in result]
 
+    get_series_of_table_async = _async_read(get_series_of_table)
+
     def do_limit_num_row_for(
         self,
         table_name: str,
-        run_id: str,
+        run_id: int,
         num_row_limit: int,
         series: str = None,
+        num_inserted: int = 1,
     ):
-        if num_row_limit <= 0:  # no limit or random not triggered
+        """keep the latest num_row_limit rows of a (run id, series) in table, called on the writer thread after inserting rows. rows are counted once and then incrementally, the oldest ones are deleted in a batch when the count exceeds the limit by a slack, so that a capped series costs O(1) per write.
+
+        Args:
+            table_name (str): name of the table
+            run_id (int): id of the run id
+            num_row_limit (int): max rows kept, no limit if not positive
+            series (str, optional): the series. Defaults to None.
+            num_inserted (int, optional): rows just inserted. Defaults to 1.
+        """
+        if num_row_limit <= 0:  # no limit
             return
-        sql_query = f"SELECT count(*) from {table_name} WHERE {RUN_ID_COLUMN_NAME} = {run_id}"  # count rows for run id in specific table
-        if series is not None:
-            sql_query += f" AND {SERIES_COLUMN_NAME} = '{series}'"
-        num_rows, _ = self._query(sql_query, fetch=FetchType.ONE)
-        if num_rows[0] > num_row_limit:  # num rows exceeded limit
-            sql_query = f"SELECT {ID_COLUMN_NAME} from {table_name} WHERE {RUN_ID_COLUMN_NAME} = {run_id} ORDER BY {ID_COLUMN_NAME} DESC LIMIT 1 OFFSET {num_row_limit - 1}"  # get max id to delete of row for specific run id
-            max_id_to_del, _ = self._query(sql_query, fetch=FetchType.ONE)
-            sql_query = f"DELETE FROM {table_name} WHERE {ID_COLUMN_NAME} < {max_id_to_del[0]} AND {RUN_ID_COLUMN_NAME} = {run_id}"
-            if series is not None:
-                sql_query += f" AND {SERIES_COLUMN_NAME} = '{series}'"
-            self._query(sql_query)  # delete rows with smaller id and specific run id
+        key = (table_name, run_id, series)
+        num_rows = self._num_rows.get(key)
+        if num_rows is None:  # inserted rows included
+            sql_query = f"SELECT count(*) FROM {table_name} WHERE {SERIES_COLUMN_NAME} IS ? AND {RUN_ID_COLUMN_NAME} IS ?"
+            (num_rows,), _ = self._query(sql_query, series, run_id, fetch=FetchType.ONE)
+        else:
+            num_rows += num_inserted
+        slack = max(int(num_row_limit * ROW_LIMIT_SLACK_RATIO), ROW_LIMIT_MIN_SLACK)
+        if num_rows > num_row_limit + slack:  # delete rows older than the latest num_row_limit
+            sql_query = f"DELETE FROM {table_name} WHERE {SERIES_COLUMN_NAME} IS ? AND {RUN_ID_COLUMN_NAME} IS ? AND {ID_COLUMN_NAME} < (SELECT {ID_COLUMN_NAME} FROM {table_name} WHERE {SERIES_COLUMN_NAME} IS ? AND {RUN_ID_COLUMN_NAME} IS ? ORDER BY {ID_COLUMN_NAME} DESC LIMIT 1 OFFSET ?)"
+            self._execute(sql_query, series, run_id, series, run_id, num_row_limit - 1)
+            num_rows = num_row_limit
+        self._num_rows[key] = num_rows
 
     def write_json(
         self,
@@ -314,11 +451,39 @@ class ProjectDB(ManageableDB):
         run_id: str = None,
         timestamp: str = None,
         num_row_limit=-1,
+        wait=True,
     ):
-        if not isinstance(json_data, dict):
-            json_data = json.loads(json_data)
-        if run_id:
-            run_id = self.fetch_id_of_run_id(run_id, timestamp=timestamp)
+        """insert a row of json
+
+        Args:
+            wait (bool, optional): block until the row is committed. Defaults to True. Otherwise return once queued to the writer, with the id reserved for the row.
+
+        Returns:
+            int: id of the row
+        """
+        rowid, job = self._json_rows_job(
+            table_name, [json_data], series, run_id, timestamp, num_row_limit
+        )
+        self._write(job, wait=wait)
+        return rowid
+
+    async def write_json_async(
+        self,
+        table_name: str,
+        json_data: str,
+        series: str = None,
+        run_id: str = None,
+        timestamp: str = None,
+        num_row_limit=-1,
+    ):
+        """write_json, waiting until committed without blocking the event loop"""
+        rowid, job = self._json_rows_job(
+            table_name, [json_data], series, run_id, timestamp, num_row_limit
+        )
+        await self.write_async(job)
+        return rowid
+
+    def _create_json_table_if_not_exist(self, table_name: str):
         if not self._inited_tables[table_name]:  # create if there is no version table
             sql_query = f"CREATE TABLE IF NOT EXISTS {table_name} ( {ID_COLUMN_NAME} INTEGER PRIMARY KEY AUTOINCREMENT, {TIMESTAMP_COLUMN_NAME} TEXT NON NULL, {SERIES_COLUMN_NAME} TEXT, {RUN_ID_COLUMN_NAME} INTEGER, {JSON_COLUMN_NAME} TEXT NON NULL, FOREIGN KEY({RUN_ID_COLUMN_NAME}) REFERENCES {RUN_IDS_TABLE_NAME}({ID_COLUMN_NAME}) ON DELETE CASCADE);"
             self._execute(sql_query)
@@ -326,17 +491,90 @@ class ProjectDB(ManageableDB):
             self._execute(sql_query)
             self._inited_tables[table_name] = True
 
-        sql_query = f"INSERT INTO {table_name}({TIMESTAMP_COLUMN_NAME}, {SERIES_COLUMN_NAME}, {RUN_ID_COLUMN_NAME}, {JSON_COLUMN_NAME}) VALUES (?, ?, ?, ?)"
-        if isinstance(json_data, dict):
-            json_data = json.dumps(json_data)
-        _, lastrowid = self._execute(sql_query, timestamp, series, run_id, json_data)
+    def write_many_json(
+        self,
+        table_name: str,
+        json_data_list: list,
+        series: str = None,
+        run_id: str = None,
+        timestamp: str = None,
+        num_row_limit=-1,
+        wait=True,
+    ):
+        """insert rows of the same series with a single executemany
+
+        Args:
+            wait (bool, optional): see write_json. Defaults to True.
+
+        Returns:
+            int: id of the first inserted row, ids of the following rows are consecutive
+        """
+        if not json_data_list:
+            return None
+        first_rowid, job = self._json_rows_job(
+            table_name, json_data_list, series, run_id, timestamp, num_row_limit
+        )
+        self._write(job, wait=wait, num_rows=len(json_data_list))
+        return first_rowid
+
+    async def write_many_json_async(
+        self,
+        table_name: str,
+        json_data_list: list,
+        series: str = None,
+        run_id: str = None,
+        timestamp: str = None,
+        num_row_limit=-1,
+    ):
+        """write_many_json, waiting until committed without blocking the event loop"""
+        if not json_data_list:
+            return None
+        first_rowid, job = self._json_rows_job(
+            table_name, json_data_list, series, run_id, timestamp, num_row_limit
+        )
+        await self.write_async(job, num_rows=len(json_data_list))
+        return first_rowid
+
+    def _json_rows_job(self, table_name, json_data_list, series, run_id, timestamp, num_row_limit):
+        """reserve ids for the rows, return the first one and the job inserting them"""
+        first_rowid = self.reserve_ids(table_name, len(json_data_list))
+        job = functools.partial(
+            self._insert_json_rows,
+            table_name,
+            list(enumerate(json_data_list, first_rowid)),
+            series,
+            run_id,
+            timestamp,
+            num_row_limit,
+        )
+        return first_rowid, job
+
+    def _insert_json_rows(self, table_name, rows, series, run_id, timestamp, num_row_limit):
+        """insert (id, json data) rows, on the writer thread"""
+        if run_id:
+            run_id = self.fetch_id_of_run_id(run_id, timestamp=timestamp)
+        self._create_json_table_if_not_exist(table_name)
+        sql_query = f"INSERT INTO {table_name}({ID_COLUMN_NAME}, {TIMESTAMP_COLUMN_NAME}, {SERIES_COLUMN_NAME}, {RUN_ID_COLUMN_NAME}, {JSON_COLUMN_NAME}) VALUES (?, ?, ?, ?, ?)"
+        self._execute_many(
+            sql_query,
+            [
+                (
+                    rowid,
+                    timestamp,
+                    series,
+                    run_id,
+                    json_data if isinstance(json_data, str) else json.dumps(json_data),
+                )
+                for rowid, json_data in rows
+            ],
+        )
         self.do_limit_num_row_for(
             table_name=table_name,
             run_id=run_id,
             num_row_limit=num_row_limit,
             series=series,
+            num_inserted=len(rows),
         )
-        return lastrowid
 
     def read_json(self, table_name: str, condition: ProjectDbQueryCondition = None):
         if not self.table_exist(table_name):
@@ -357,9 +595,20 @@ class ProjectDB(ManageableDB):
         ]
         return result
 
-    def set_status(self, run_id: str, series: str, json_data):
+    read_json_async = _async_read(read_json)
+
+    def set_status(self, run_id: str, series: str, json_data, wait=True):
+        if not (isinstance(json_data, str) or isinstance(json_data, dict)):
+            raise
+        self._write(functools.partial(self._set_status, run_id, series, json_data), wait=wait)
+
+    async def set_status_async(self, run_id: str, series: str, json_data):
+        """set_status, waiting until committed without blocking the event loop"""
         if not (isinstance(json_data, str) or isinstance(json_data, dict)):
             raise
+        await self.write_async(functools.partial(self._set_status, run_id, series, json_data))
+
+    def _set_status(self, run_id: str, series: str, json_data):
         if isinstance(json_data, str):
             json_data = json.loads(json_data)
         if run_id:
@@ -374,6 +623,18 @@ class ProjectDB(ManageableDB):
         _, lastrowid = self._execute(sql_query, run_id, series, json_data)
         return lastrowid
 
+    def update_status(self, run_id: str, series: str, update: Callable[[dict], dict], wait=True):
+        """replace a status with update(current one). the current one is read on the writer thread, where writes not committed yet are seen."""
+        self._write(functools.partial(self._update_status, run_id, series, update), wait=wait)
+
+    async def update_status_async(self, run_id: str, series: str, update: Callable[[dict], dict]):
+        """update_status, waiting until committed without blocking the event loop"""
+        await self.write_async(functools.partial(self._update_status, run_id, series, update))
+
+    def _update_status(self, run_id: str, series: str, update: Callable[[dict], dict]):
+        current = self.get_status(run_id=run_id, series=series).get(run_id, {}).get(series, {})
+        return self._set_status(run_id, series, update(current))
+
     def get_status(self, run_id: str = None, series: str = None):
         if not self.table_exist(STATUS_TABLE_NAME):
             return {}
@@ -391,6 +652,8 @@ class ProjectDB(ManageableDB):
             result[run_id][series_name] = json.loads(value)
         return result
 
+    get_status_async = _async_read(get_status)
+
     def write_blob(
         self,
         table_name: str,
@@ -400,16 +663,42 @@ class ProjectDB(ManageableDB):
         run_id: str = None,
         timestamp: str = None,
         num_row_limit=-1,
+        wait=True,
     ):
-        meta_data = meta_data or {}
-        meta_data = meta_data if isinstance(meta_data, dict) else json.loads(meta_data)
-        if run_id:
-            run_id = self.fetch_id_of_run_id(run_id, timestamp=timestamp)
-        if isinstance(blob_data, bytes):
-            blob_data = bytearray(blob_data)
-        if isinstance(meta_data, dict):
-            meta_data = json.dumps(meta_data)
+        """insert a row of blob
+
+        Args:
+            wait (bool, optional): see write_json. Defaults to True.
 
+        Returns:
+            int: id of the row
+        """
+        return self.write_many_blob(
+            table_name,
+            [(meta_data, blob_data, series, run_id, timestamp)],
+            num_row_limit=num_row_limit,
+            wait=wait,
+        )[0]
+
+    async def write_blob_async(
+        self,
+        table_name: str,
+        meta_data: Union[str, dict],
+        blob_data: bytes,
+        series: str = None,
+        run_id: str = None,
+        timestamp: str = None,
+        num_row_limit=-1,
+    ):
+        """write_blob, waiting until committed without blocking the event loop"""
+        rowids = await self.write_many_blob_async(
+            table_name,
+            [(meta_data, blob_data, series, run_id, timestamp)],
+            num_row_limit=num_row_limit,
+        )
+        return rowids[0]
+
+    def _create_blob_table_if_not_exist(self, table_name: str):
         if not self._inited_tables[table_name]:  # create if not exist
             sql_query = f"CREATE TABLE IF NOT EXISTS {table_name} ( {ID_COLUMN_NAME} INTEGER PRIMARY KEY AUTOINCREMENT, {TIMESTAMP_COLUMN_NAME} TEXT NON NULL, {SERIES_COLUMN_NAME} TEXT, {RUN_ID_COLUMN_NAME} INTEGER, {METADATA_COLUMN_NAME} TEXT, {BLOB_COLUMN_NAME} BLOB NON NULL, FOREIGN KEY({RUN_ID_COLUMN_NAME}) REFERENCES {RUN_IDS_TABLE_NAME}({ID_COLUMN_NAME}) ON DELETE CASCADE);"
             self._execute(sql_query)
@@ -417,15 +706,77 @@ class ProjectDB(ManageableDB):
             self._execute(sql_query)
             self._inited_tables[table_name] = True
 
-        sql_query = f"INSERT INTO {table_name}({TIMESTAMP_COLUMN_NAME}, {SERIES_COLUMN_NAME}, {RUN_ID_COLUMN_NAME}, {METADATA_COLUMN_NAME}, {BLOB_COLUMN_NAME}) VALUES (?, ?, ?, ?, ?)"
-        _, lastrowid = self._execute(sql_query, timestamp, series, run_id, meta_data, blob_data)
-        self.do_limit_num_row_for(
-            table_name=table_name,
-            run_id=run_id,
-            num_row_limit=num_row_limit,
-            series=series,
+    def write_many_blob(self, table_name: str, blobs: list, num_row_limit=-1, wait=True):
+        """insert rows of blobs with a single executemany
+
+        Args:
+            table_name (str): name of the table
+            blobs (list): list of (meta_data, blob_data, series, run_id, timestamp), or of (meta_data, blob_data, series, run_id, timestamp, num_row_limit) to limit rows of its (run id, series) on its own
+            num_row_limit (int, optional): row limit of the (run id, series) of blobs without one. Defaults to -1.
+            wait (bool, optional): see write_json. Defaults to True.
+
+        Returns:
+            list: ids of the inserted rows, in order
+        """
+        if not blobs:
+            return []
+        rowids, job = self._blob_rows_job(table_name, blobs, num_row_limit)
+        self._write(job, wait=wait, num_rows=len(blobs))
+        return rowids
+
+    async def write_many_blob_async(self, table_name: str, blobs: list, num_row_limit=-1):
+        """write_many_blob, waiting until committed without blocking the event loop"""
+        if not blobs:
+            return []
+        rowids, job = self._blob_rows_job(table_name, blobs, num_row_limit)
+        await self.write_async(job, num_rows=len(blobs))
+        return rowids
+
+    def _blob_rows_job(self, table_name, blobs, num_row_limit):
+        """reserve ids for the blobs, return them and the job inserting the blobs"""
+        first_rowid = self.reserve_ids(table_name, len(blobs))
+        job = functools.partial(
+            self._insert_blob_rows,
+            table_name,
+            [
+                (rowid, *blob[:5], blob[5] if len(blob) > 5 else num_row_limit)
+                for rowid, blob in enumerate(blobs, first_rowid)
+            ],
         )
-        return lastrowid
+        return list(range(first_rowid, first_rowid + len(blobs))), job
+
+    def _insert_blob_rows(self, table_name, blobs):
+        """insert (id, meta_data, blob_data, series, run_id, timestamp, num_row_limit) rows, on the writer thread"""
+        self._create_blob_table_if_not_exist(table_name)
+        id_of_run_id = {}
+        rows = []
+        row_limits = {}  # {(id of run id, series) : row limit of the latest blob}
+        for rowid, meta_data, blob_data, series, run_id, timestamp, num_row_limit in blobs:
+            if run_id and run_id not in id_of_run_id:
+                id_of_run_id[run_id] = self.fetch_id_of_run_id(run_id, timestamp=timestamp)
+            meta_data = meta_data or {}
+            rows.append(
+                (
+                    rowid,
+                    timestamp,
+                    series,
+                    id_of_run_id.get(run_id),
+                    meta_data if isinstance(meta_data, str) else json.dumps(meta_data),
+                    bytearray(blob_data) if isinstance(blob_data, bytes) else blob_data,
+                )
+            )
+            row_limits[(id_of_run_id.get(run_id), series)] = num_row_limit
+        sql_query = f"INSERT INTO {table_name}({ID_COLUMN_NAME}, {TIMESTAMP_COLUMN_NAME}, {SERIES_COLUMN_NAME}, {RUN_ID_COLUMN_NAME}, {METADATA_COLUMN_NAME}, {BLOB_COLUMN_NAME}) VALUES (?, ?, ?, ?, ?, ?)"
+        self._execute_many(sql_query, rows)
+        num_inserted = collections.Counter((row[3], row[2]) for row in rows)
+        for (run_id, series), num in num_inserted.items():
+            self.do_limit_num_row_for(
+                table_name=table_name,
+                run_id=run_id,
+                num_row_limit=row_limits[(run_id, series)],
+                series=series,
+                num_inserted=num,
+            )
 
     def read_blob(
         self,
@@ -442,6 +793,8 @@ class ProjectDB(ManageableDB):
         result, _ = self._query(sql_query, *cond_vars, fetch=FetchType.ALL)
         return result
 
+    read_blob_async = _async_read(read_blob)
+
     @classmethod
     def load_db_of_path(cls, path):
         if not os.path.isfile(path):
@@ -462,6 +815,9 @@ class ProjectDB(ManageableDB):
         )
         history_file_list = history_file_loader.get_file_list()
         for path in history_file_list:
+            project_id = os.path.basename(path)[: -len(DB_PROJECT_FILE_TYPE_NAME) - 1]
+            if not owns_project(project_id):  # served by another worker, which writes to it
+                continue
             cls.load_db_of_path(path=path)
         return manager.current.items()
 
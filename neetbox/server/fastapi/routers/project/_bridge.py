@@ -4,7 +4,9 @@
 # Github: github.com/visualDust
 # Date:   20231204
 
-from typing import Dict, List
+import asyncio
+import json
+from typing import Callable, Dict, List
 
 from neetbox._protocol import *
 from neetbox.logging import Logger
@@ -13,6 +15,9 @@ from ....db.project import ProjectDB
 
 logger = Logger("Project Bridge", skip_writers_names=["ws"])
 
+# sent to every frontend regardless of subscriptions, replies to requests of frontends
+UNFILTERED_EVENT_TYPES = {EVENT_TYPE_NAME_ACTION}
+
 
 class Bridge:
     """Server works as a bridge between clients and frontends. Bridge connects one client and multiple frontend. Since client means a running project, a bridge represents a running(connected) or not running(not connected, loaded from history database) project.
@@ -38,6 +43,7 @@ class Bridge:
     status: dict
     cli_ws_dict: dict  # { run_id : ws_client}
     web_ws_list: dict  # since web do not have run id, use list instead of dict
+    subscribers: dict  # {(event type, run id, series) : {ws client id : frontend}}, None matches any
     historyDB: ProjectDB
 
     def __new__(cls, project_id: str, **kwargs) -> None:
@@ -54,6 +60,7 @@ class Bridge:
             new_bridge.web_ws_list: list = (
                 []
             )  # frontend ws sids. client data should be able to be shown on multiple frontend
+            new_bridge.subscribers = {}
             flag_auto_load_db = kwargs["auto_load_db"] if "auto_load_db" in kwargs else True
             new_bridge.historyDB = ProjectDB.get_db_of_id(project_id) if flag_auto_load_db else None
             cls._id2bridge[project_id] = new_bridge
@@ -62,7 +69,7 @@ class Bridge:
 
     def __del__(self):  # on delete
         logger.info(f"bridge project id {self.project_id} handling on delete...")
-        if 0 == len(self.get_run_ids()):  # if there is no active run id
+        if 0 == len(self.historyDB.get_run_ids()):  # if there is no active run id
             self.historyDB.delete()
             del self.historyDB  # delete history db
         logger.info(f"bridge of project id {self.project_id} deleted.")
@@ -102,13 +109,61 @@ class Bridge:
         for _, history_db in db_list:
             cls.from_db(history_db)
 
+    @staticmethod
+    def _topic_key(topic: dict) -> tuple:
+        return (topic[EVENT_TYPE_KEY], topic.get(RUN_ID_KEY), topic.get(SERIES_KEY))
+
+    def subscribe(self, ws_client, topics: List[dict]):
+        """route messages of topics to a frontend. a frontend receives every message until it subscribes, only those of topics after.
+
+        Args:
+            ws_client (WSClient): the frontend
+            topics (List[dict]): topics with key eventType, optional keys runId and series, any run id or series if not given
+        """
+        if ws_client.subscriptions is None:
+            ws_client.subscriptions = set()
+        for topic in topics:
+            key = self._topic_key(topic)
+            self.subscribers.setdefault(key, {})[ws_client.id] = ws_client
+            ws_client.subscriptions.add(key)
+
+    def unsubscribe(self, ws_client, topics: List[dict] = None):
+        """stop routing messages of topics to a frontend, of every topic if None"""
+        if ws_client.subscriptions is None:
+            return
+        keys = ws_client.subscriptions.copy() if topics is None else map(self._topic_key, topics)
+        for key in keys:
+            ws_client.subscriptions.discard(key)
+            subscribers = self.subscribers.get(key, {})
+            subscribers.pop(ws_client.id, None)
+            if not subscribers:
+                self.subscribers.pop(key, None)
+
+    def subscribers_of(self, message: EventMsg) -> list:
+        """frontends a message is routed to"""
+        receivers = {
+            ws_client.id: ws_client
+            for ws_client in self.web_ws_list
+            if ws_client.subscriptions is None or message.event_type in UNFILTERED_EVENT_TYPES
+        }
+        event_type, run_id, series = message.event_type, message.run_id, message.series
+        for key in (
+            (event_type, run_id, series),
+            (event_type, run_id, None),
+            (event_type, None, series),
+            (event_type, None, None),
+        ):
+            receivers.update(self.subscribers.get(key, {}))
+        return list(receivers.values())
+
     async def ws_send_to_frontends(self, message: EventMsg):
-        for ws_client in self.web_ws_list:
-            try:
-                await ws_client.ws.send_json(data=message.json)
-            except Exception as e:
-                logger.err(e)
-        return
+        """queue message to the sender of every frontend subscribed, serialized once"""
+        receivers = self.subscribers_of(message)
+        if not receivers:
+            return
+        text = json.dumps(message.json, separators=(",", ":"), ensure_ascii=False)
+        for ws_client in receivers:
+            ws_client.sender.put(message, text)
 
     async def ws_send_to_client(self, message: EventMsg, run_id: str = None):
         run_id = run_id or message.run_id
@@ -119,11 +174,22 @@ class Bridge:
             logger.err(e)
         return
 
-    def set_status(self, run_id: str, series: str, value: dict):
-        self.historyDB.set_status(run_id=run_id, series=series, json_data=value)
+    async def set_status(self, run_id: str, series: str, value: dict, wait=True):
+        if wait:
+            await self.historyDB.set_status_async(run_id=run_id, series=series, json_data=value)
+        else:
+            self.historyDB.set_status(run_id=run_id, series=series, json_data=value, wait=False)
 
-    def get_status(self, run_id: str = None, series: str = None):
-        status = self.historyDB.get_status(run_id=run_id, series=series)
+    async def update_status(
+        self, run_id: str, series: str, update: Callable[[dict], dict], wait=True
+    ):
+        if wait:
+            await self.historyDB.update_status_async(run_id=run_id, series=series, update=update)
+        else:
+            self.historyDB.update_status(run_id=run_id, series=series, update=update, wait=False)
+
+    async def get_status(self, run_id: str = None, series: str = None):
+        status = await self.historyDB.get_status_async(run_id=run_id, series=series)
         if run_id:
             status = status.get(run_id, {})
         if series:
@@ -135,32 +201,87 @@ class Bridge:
             return run_id in self.cli_ws_dict
         return len(self.cli_ws_dict.keys()) != 0
 
-    def get_series_of(self, table_name, run_id=None):
-        return self.historyDB.get_series_of_table(table_name=table_name, run_id=run_id)
+    async def get_series_of(self, table_name, run_id=None):
+        return await self.historyDB.get_series_of_table_async(table_name=table_name, run_id=run_id)
 
-    def get_run_ids(self):
-        info_run_ids = self.historyDB.get_run_ids()
+    async def get_run_ids(self):
+        info_run_ids = await self.historyDB.get_run_ids_async()
         for info_run_id in info_run_ids:
             info_run_id["online"] = info_run_id[RUN_ID_KEY] in self.cli_ws_dict
         return info_run_ids
 
-    def save_json_to_history(
-        self, table_name, json_data, series=None, run_id=None, timestamp=None, num_row_limit=-1
+    async def flush_history(self):
+        """wait until history queued so far is committed, without blocking the event loop"""
+        await asyncio.wrap_future(self.historyDB.writer.barrier())
+
+    def get_ingest_stats(self):
+        return {
+            **self.historyDB.writer.stats,
+            "frontends": {ws_client.id: ws_client.sender.stats for ws_client in self.web_ws_list},
+        }
+
+    async def save_json_to_history(
+        self,
+        table_name,
+        json_data,
+        series=None,
+        run_id=None,
+        timestamp=None,
+        num_row_limit=-1,
+        wait=True,
     ):
-        lastrowid = Bridge.of_id(self.project_id).historyDB.write_json(
+        if wait:
+            return await self.historyDB.write_json_async(
+                table_name=table_name,
+                json_data=json_data,
+                series=series,
+                run_id=run_id,
+                timestamp=timestamp,
+                num_row_limit=num_row_limit,
+            )
+        return self.historyDB.write_json(
             table_name=table_name,
             json_data=json_data,
             series=series,
             run_id=run_id,
             timestamp=timestamp,
             num_row_limit=num_row_limit,
+            wait=False,
+        )
+
+    async def save_many_json_to_history(
+        self,
+        table_name,
+        json_data_list,
+        series=None,
+        run_id=None,
+        timestamp=None,
+        num_row_limit=-1,
+        wait=True,
+    ):
+        if wait:
+            return await self.historyDB.write_many_json_async(
+                table_name=table_name,
+                json_data_list=json_data_list,
+                series=series,
+                run_id=run_id,
+                timestamp=timestamp,
+                num_row_limit=num_row_limit,
+            )
+        return self.historyDB.write_many_json(
+            table_name=table_name,
+            json_data_list=json_data_list,
+            series=series,
+            run_id=run_id,
+            timestamp=timestamp,
+            num_row_limit=num_row_limit,
+            wait=False,
         )
-        return lastrowid
 
-    def read_json_from_history(self, table_name, condition):
-        return self.historyDB.read_json(table_name=table_name, condition=condition)
+    async def read_json_from_history(self, table_name, condition):
+        return await self.historyDB.read_json_async(table_name=table_name, condition=condition)
 
-    def save_blob_to_history(
+    async def save_blob_to_history(
         self,
         table_name,
         meta_data,
@@ -169,8 +290,19 @@ class Bridge:
         run_id=None,
         timestamp=None,
         num_row_limit=-1,
+        wait=True,
     ):
-        lastrowid = Bridge.of_id(self.project_id).historyDB.write_blob(
+        if wait:
+            return await self.historyDB.write_blob_async(
+                table_name=table_name,
+                meta_data=meta_data,
+                blob_data=blob_data,
+                series=series,
+                run_id=run_id,
+                timestamp=timestamp,
+                num_row_limit=num_row_limit,
+            )
+        return self.historyDB.write_blob(
             table_name=table_name,
             meta_data=meta_data,
             blob_data=blob_data,
@@ -178,8 +310,19 @@ class Bridge:
             run_id=run_id,
             timestamp=timestamp,
             num_row_limit=num_row_limit,
+            wait=False,
+        )
+
+    async def save_many_blob_to_history(self, table_name, blobs, num_row_limit=-1, wait=True):
+        if wait:
+            return await self.historyDB.write_many_blob_async(
+                table_name=table_name, blobs=blobs, num_row_limit=num_row_limit
+            )
+        return self.historyDB.write_many_blob(
+            table_name=table_name, blobs=blobs, num_row_limit=num_row_limit, wait=False
         )
-        return lastrowid
 
-    def read_blob_from_history(self, table_name, condition, meta_only: bool):
-        return self.historyDB.read_blob(table_name, condition=condition, meta_only=meta_only)
+    async def read_blob_from_history(self, table_name, condition, meta_only: bool):
+        return await self.historyDB.read_blob_async(
+            table_name, condition=condition, meta_only=meta_only
+        )
@@ -4,7 +4,10 @@
 # Github: github.com/visualDust
 # Date:   20240109
 
-from typing import Optional, Union
+import asyncio
+import functools
+import queue
+from typing import List, Optional, Union
 
 from fastapi import APIRouter, Body, File, Form, HTTPException, Response, UploadFile
 
@@ -19,10 +22,29 @@ logger.log_level = LogLevel.DEBUG
 
 router = APIRouter()
 
+# rows of history serialized at a time, the json encoder holds the GIL until done
+DUMP_CHUNK_SIZE = 1000
+
+
+def _dumps_in_chunks(rows: list) -> str:
+    """serialize rows as fastapi does, a chunk at a time so that the event loop is not starved meanwhile"""
+    chunks = (
+        json.dumps(
+            rows[i : i + DUMP_CHUNK_SIZE],
+            ensure_ascii=False,
+            allow_nan=False,
+            separators=(",", ":"),
+        )[1:-1]
+        for i in range(0, len(rows), DUMP_CHUNK_SIZE)
+    )
+    return f"[{','.join(chunks)}]"
+
 
 @router.get(f"/list")
 async def get_status_of_all_proejcts():
-    return [_project_status_from_bridge(bridge) for _, bridge in Bridge.items()]
+    return await asyncio.gather(
+        *[_project_status_from_bridge(bridge) for _, bridge in Bridge.items()]
+    )
 
 
 @router.get(f"/{{project_id}}")
@@ -30,14 +52,14 @@ async def get_status_of_project_id(project_id: str):
     if not Bridge.has(project_id):
         raise HTTPException(status_code=404, detail={ERROR_KEY: "Project ID not found"})
     bridge = Bridge.of_id(project_id)
-    return _project_status_from_bridge(bridge)
+    return await _project_status_from_bridge(bridge)
 
 
-def _project_status_from_bridge(bridge: Bridge):
-    run_id_info_list = bridge.get_run_ids()
+async def _project_status_from_bridge(bridge: Bridge):
+    run_id_info_list = await bridge.get_run_ids()
     name_of_project = None
     for run_id_info in reversed(run_id_info_list):
-        config = bridge.get_status(run_id=run_id_info[RUN_ID_KEY], series="config")
+        config = await bridge.get_status(run_id=run_id_info[RUN_ID_KEY], series="config")
         if NAME_KEY in config:
             name_of_project = config[NAME_KEY]
             break
@@ -50,7 +72,7 @@ def _project_status_from_bridge(bridge: Bridge):
     }
 
 
-def get_history_json_of(project_id: str, table_name: str, condition=Union[dict, str]):
+async def get_history_json_of(project_id: str, table_name: str, condition=Union[dict, str]):
     if not Bridge.has(project_id):
         raise HTTPException(status_code=404, detail={ERROR_KEY: "Project ID not found"})
     try:
@@ -62,14 +84,17 @@ def get_history_json_of(project_id: str, table_name: str, condition=Union[dict,
         error_message = f"failed to parse condition from {type(condition)}{condition} :{e}"
         logger.debug(error_message, series="400")
         raise HTTPException(status_code=400, detail={ERROR_KEY: error_message})
-    return Bridge.of_id(project_id).read_json_from_history(
-        table_name=table_name, condition=condition
-    )
+    history_db = Bridge.of_id(project_id).historyDB
+
+    def _read_and_dump():  # a long history takes long to serialize as well
+        return _dumps_in_chunks(history_db.read_json(table_name=table_name, condition=condition))
+
+    return Response(await history_db.read_async(_read_and_dump), media_type="application/json")
 
 
 @router.get(f"/{{project_id}}/log")
 async def get_history_log_of(project_id: str, condition: str):
-    return get_history_json_of(
+    return await get_history_json_of(
         project_id=project_id,
         table_name=LOG_TABLE_NAME,
         condition=condition,
@@ -78,20 +103,28 @@ async def get_history_log_of(project_id: str, condition: str):
 
 @router.get(f"/{{project_id}}/hardware")
 async def get_history_hardware_info_of(project_id: str, condition: str):
-    return get_history_json_of(
+    return await get_history_json_of(
         project_id=project_id,
         table_name=EVENT_TYPE_NAME_HARDWARE,
         condition=condition,
     )
 
 
+@router.get(f"/{{project_id}}/ingest")
+async def get_ingest_stats_of(project_id: str):
+    """rows queued and committed to history, ingest rate in rows per second, commit latencies in milliseconds, and messages queued, sent, dropped and coalesced of every frontend"""
+    if not Bridge.has(project_id):
+        raise HTTPException(status_code=404, detail={ERROR_KEY: "Project ID not found"})
+    return Bridge.of_id(project_id).get_ingest_stats()
+
+
 @router.get(f"/{{project_id}}/series/{{table_name}}")
 async def get_series_list_of(
     project_id: str, table_name: str, run_id: str = None
 ):  # client side function
     if not Bridge.has(project_id):
         raise HTTPException(status_code=404, detail={ERROR_KEY: "Project ID not found"})
-    result = Bridge.of_id(project_id).get_series_of(table_name, run_id=run_id)
+    result = await Bridge.of_id(project_id).get_series_of(table_name, run_id=run_id)
     return result
 
 
@@ -100,8 +133,8 @@ async def get_status_of(project_id, run_id):
     if not Bridge.has(project_id):
         raise HTTPException(status_code=404, detail={ERROR_KEY: "Project ID not found"})
     bridge = Bridge.of_id(project_id)
-    result = Bridge.of_id(project_id).get_status(run_id=run_id)
-    result[METADATA_KEY] = bridge.historyDB.fetch_metadata_of_run_id(run_id=run_id)
+    result = await bridge.get_status(run_id=run_id)
+    result[METADATA_KEY] = await bridge.historyDB.fetch_metadata_of_run_id_async(run_id=run_id)
     return result
 
 
@@ -109,13 +142,15 @@ async def get_status_of(project_id, run_id):
 async def set_get_metadata_of_run_id(project_id: str, run_id: str, metadata: dict = Body(...)):
     bridge = Bridge.of_id(project_id)
     try:
-        metadata_in_db = bridge.historyDB.fetch_metadata_of_run_id(
+        metadata_in_db = await bridge.historyDB.fetch_metadata_of_run_id_async(
             run_id=run_id
         )  # get old metadata
         metadata_in_db.update(metadata)
         # Assuming the method to update metadata in your database might look like this
         # bridge.historyDB.update_metadata_of_run_id(run_id=run_id, metadata=old_metadata)
-        return bridge.historyDB.fetch_metadata_of_run_id(run_id=run_id, metadata=metadata_in_db)
+        return await bridge.historyDB.fetch_metadata_of_run_id_async(
+            run_id=run_id, metadata=metadata_in_db
+        )
     except Exception as e:  # Replace with your specific database exception
         logger.debug(f"failed to update metadata of run_id {run_id}: {e}")
         raise HTTPException(status_code=404, detail={ERROR_KEY: str(e)})
@@ -129,8 +164,8 @@ async def delete_run_id(project_id: str, run_id: str):
             status_code=400,
             detail={ERROR_KEY: "can only delete history run id."},
         )
-    bridge.historyDB.delete_run_id(run_id)
-    if 0 == len(bridge.get_run_ids()):  # check if all the run ids are deleted
+    await bridge.historyDB.write_async(functools.partial(bridge.historyDB.delete_run_id, run_id))
+    if 0 == len(await bridge.get_run_ids()):  # check if all the run ids are deleted
         del Bridge._id2bridge[project_id]  # delete the empty bridge
     return {RESULT_KEY: "success"}
 
@@ -141,26 +176,65 @@ async def upload_image(project_id: str, image: UploadFile = File(...), metadata:
         raise HTTPException(status_code=404, detail={ERROR_KEY: "project id not found"})
     message = EventMsg.loads(metadata)
     image_bytes = await image.read()
-    message.id = Bridge.of_id(project_id).save_blob_to_history(
-        table_name="image",
-        run_id=message.run_id,
-        series=message.series,
-        meta_data=message.payload,
-        timestamp=message.timestamp,
-        blob_data=image_bytes,
-        num_row_limit=message.history_len,
-    )
+    try:  # committed before notifying, frontends fetch it once notified
+        message.id = await Bridge.of_id(project_id).save_blob_to_history(
+            table_name="image",
+            run_id=message.run_id,
+            series=message.series,
+            meta_data=message.payload,
+            timestamp=message.timestamp,
+            blob_data=image_bytes,
+            num_row_limit=message.history_len,
+        )
+    except queue.Full as e:  # writer overloaded, the client may retry later
+        raise HTTPException(status_code=503, detail={ERROR_KEY: str(e)})
     message.payload = message.payload or {}
     await Bridge.of_id(project_id).ws_send_to_frontends(message)
     return {RESULT_KEY: "ok", ID_KEY: message.id}
 
 
+@router.post(f"/{{project_id}}/images")
+async def upload_images(
+    project_id: str, images: List[UploadFile] = File(...), metadata: List[str] = Form(...)
+):
+    """upload many images in one request, the i-th metadata field describes the i-th image. rows are written in a single transaction."""
+    if not Bridge.has(project_id):
+        raise HTTPException(status_code=404, detail={ERROR_KEY: "project id not found"})
+    if len(images) != len(metadata):
+        raise HTTPException(
+            status_code=400,
+            detail={ERROR_KEY: f"got {len(images)} images but {len(metadata)} metadata"},
+        )
+    messages = [EventMsg.loads(meta) for meta in metadata]
+    blobs = [  # each image limits rows of its (run id, series) by its own history length
+        (
+            message.payload,
+            await image.read(),
+            message.series,
+            message.run_id,
+            message.timestamp,
+            message.history_len,
+        )
+        for message, image in zip(messages, images)
+    ]
+    bridge = Bridge.of_id(project_id)
+    try:  # committed before notifying, frontends fetch them once notified
+        ids = await bridge.save_many_blob_to_history(table_name="image", blobs=blobs)
+    except queue.Full as e:
+        raise HTTPException(status_code=503, detail={ERROR_KEY: str(e)})
+    for message, id in zip(messages, ids):
+        message.id = id
+        message.payload = message.payload or {}
+        await bridge.ws_send_to_frontends(message)
+    return {RESULT_KEY: "ok", ID_KEY: ids}
+
+
 @router.get(f"/{{project_id}}/image/{{image_id}}")
 async def get_image_of(project_id: str, image_id: int, meta: Optional[bool] = None):
     if not Bridge.has(project_id):
         raise HTTPException(status_code=404, detail={ERROR_KEY: "project id not found"})
     # Database logic here
-    [(_, _, meta_data, image)] = Bridge.of_id(project_id).read_blob_from_history(
+    [(_, _, meta_data, image)] = await Bridge.of_id(project_id).read_blob_from_history(
         table_name="image",
         condition=ProjectDbQueryCondition(id=image_id),
         meta_only=meta,
@@ -180,7 +254,7 @@ async def get_history_image_metadata_of(project_id: str, condition: Optional[str
         condition = ProjectDbQueryCondition.loads(condition_json)
     except Exception as e:
         raise HTTPException(status_code=400, detail={ERROR_KEY: str(e)})
-    query_results = Bridge.of_id(project_id).read_blob_from_history(
+    query_results = await Bridge.of_id(project_id).read_blob_from_history(
         table_name="image", condition=condition, meta_only=True
     )
     result = [{"imageId": id, "metadata": meta_data} for (id, _, meta_data) in query_results]
@@ -194,7 +268,9 @@ async def get_history_scalar_of(project_id: str, condition: str = None):
         condition = ProjectDbQueryCondition.loads(condition_json)
     except Exception as e:
         raise HTTPException(status_code=400, detail={ERROR_KEY: str(e)})
-    return get_history_json_of(project_id=project_id, table_name="scalar", condition=condition)
+    return await get_history_json_of(
+        project_id=project_id, table_name="scalar", condition=condition
+    )
 
 
 @router.get(f"/{{project_id}}/progress")
@@ -204,4 +280,6 @@ async def get_history_progress_of(project_id: str, condition: str = None):
         condition = ProjectDbQueryCondition.loads(condition_json)
     except Exception as e:
         raise HTTPException(status_code=400, detail={ERROR_KEY: str(e)})
-    return get_history_json_of(project_id=project_id, table_name="progress", condition=condition)
+    return await get_history_json_of(
+        project_id=project_id, table_name="progress", condition=condition
+    )
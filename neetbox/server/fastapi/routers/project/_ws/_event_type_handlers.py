@@ -28,14 +28,17 @@ async def on_event_type_default_json(
     save_history=True,
 ):
     bridge = Bridge.of_id(message.project_id)
-    if save_history:
-        message.id = bridge.save_json_to_history(
+    if (
+        save_history
+    ):  # queued to the writer of db, forwarded with the id reserved for it. dropped if the writer is overloaded
+        message.id = await bridge.save_json_to_history(
             table_name=message.event_type,
             json_data=message.payload,
             series=message.series,
             run_id=message.run_id,
             timestamp=message.timestamp,
             num_row_limit=message.history_len,
+            wait=False,
         )
     if forward_to:
         if forward_to == IdentityType.SELF:
@@ -55,25 +58,51 @@ async def on_event_type_default_json(
 @on_event(EVENT_TYPE_NAME_STATUS)
 async def on_event_type_status(message: EventMsg):
     bridge = Bridge.of_id(message.project_id)
-    bridge.set_status(run_id=message.run_id, series=message.series, value=message.payload)
+    await bridge.set_status(
+        run_id=message.run_id, series=message.series, value=message.payload, wait=False
+    )
 
 
 @on_event(EVENT_TYPE_NAME_HPARAMS)
 async def on_event_type_hyperparams(message: EventMsg):
     bridge = Bridge.of_id(message.project_id)
-    current_hyperparams = bridge.get_status(
-        run_id=message.run_id, series=EVENT_TYPE_NAME_HPARAMS
-    )  # get hyper params from status
-    if message.series:  # if series of hyperparams specified
-        current_hyperparams[message.series] = message.payload
-    else:
-        for k, v in message.payload.items():
-            current_hyperparams[k] = v
-    bridge.set_status(
-        run_id=message.run_id, series=EVENT_TYPE_NAME_HPARAMS, value=current_hyperparams
+
+    def _update_hyperparams(current_hyperparams: dict):  # hyper params from status
+        if message.series:  # if series of hyperparams specified
+            current_hyperparams[message.series] = message.payload
+        else:
+            for k, v in message.payload.items():
+                current_hyperparams[k] = v
+        return current_hyperparams
+
+    await bridge.update_status(
+        run_id=message.run_id,
+        series=EVENT_TYPE_NAME_HPARAMS,
+        update=_update_hyperparams,
+        wait=False,
     )
 
 
+@on_event(EVENT_TYPE_NAME_SCALAR)
+async def on_event_type_scalar(message: EventMsg):
+    xs = message.payload.get("x") if isinstance(message.payload, dict) else None
+    if not isinstance(xs, list):  # a single point
+        await on_event_type_default_json(message=message)
+        return
+    # columnar points from add_scalars, saved as one row per point
+    bridge = Bridge.of_id(message.project_id)
+    message.id = await bridge.save_many_json_to_history(
+        table_name=message.event_type,
+        json_data_list=[{"x": x, "y": y} for x, y in zip(xs, message.payload["y"])],
+        series=message.series,
+        run_id=message.run_id,
+        timestamp=message.timestamp,
+        num_row_limit=message.history_len,
+        wait=False,
+    )  # id of the first point, ids of the others are consecutive
+    await on_event_type_default_json(message=message, save_history=False)
+
+
 @on_event(EVENT_TYPE_NAME_ACTION)
 async def on_event_type_action(message: EventMsg):
     await on_event_type_default_json(
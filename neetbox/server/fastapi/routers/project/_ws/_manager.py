@@ -17,6 +17,8 @@ from neetbox._protocol import *
 from neetbox.logging import Logger
 from neetbox.server.fastapi.routers.project._bridge import Bridge
 
+from ._sender import FrontendSender
+
 console = Console()
 logger = Logger("Websocket.Project", skip_writers_names=["ws"])
 
@@ -28,6 +30,10 @@ class WSClient:
     project_id: str
     identity_type: IdentityType
     run_id: str = None
+    wire_format: str = WIRE_FORMAT_JSON  # format of messages from this client
+    binary_wire: BinaryWire = None  # decoder of binary messages from this client
+    sender: FrontendSender = None  # outbound queue of a frontend
+    subscriptions: set = None  # topics a frontend subscribed, None if it receives every message
 
 
 class WSConnectionManager(metaclass=Singleton):
@@ -79,6 +85,7 @@ class WSConnectionManager(metaclass=Singleton):
 
             else:  # new connection from frontend
                 bridge = Bridge.of_id(message.project_id)
+                ws_client.sender = FrontendSender(websocket)  # starts after handshake replied
                 bridge.web_ws_list.append(ws_client)
                 self.id2client[id] = ws_client
                 self.ws2client[websocket] = ws_client
@@ -95,8 +102,17 @@ class WSConnectionManager(metaclass=Singleton):
                 bridge.cli_ws_dict[run_id] = ws_client  # assign cli to bridge
                 self.id2client[id] = ws_client
                 self.ws2client[websocket] = ws_client
+                ws_client.wire_format = negotiate_wire_format(
+                    (message.payload or {}).get(WIRE_FORMATS_KEY)
+                )
+                if ws_client.wire_format == WIRE_FORMAT_BINARY:
+                    ws_client.binary_wire = BinaryWire()
                 merge_msg = {
-                    PAYLOAD_KEY: {RESULT_KEY: 200, REASON_KEY: "join success"},
+                    PAYLOAD_KEY: {
+                        RESULT_KEY: 200,
+                        REASON_KEY: "join success",
+                        WIRE_FORMAT_KEY: ws_client.wire_format,
+                    },
                     IDENTITY_TYPE_KEY: IdentityType.SERVER,
                 }  # handshake 200
             else:  # run id already exist
@@ -112,6 +128,8 @@ class WSConnectionManager(metaclass=Singleton):
             return  # unknown connection type, dropping...
 
         await websocket.send_json(data=EventMsg.merge(message, merge_msg).json)
+        if ws_client.sender is not None:
+            ws_client.sender.start()
         logger.ok(f"wsclient(id={id}) handshake succeed.")
         table = Table(title="Connected Websockets", box=box.MINIMAL_DOUBLE_HEAD, show_lines=True)
         table.add_column(PROJECT_ID_KEY, justify="center", style="magenta", no_wrap=True)
@@ -130,6 +148,8 @@ class WSConnectionManager(metaclass=Singleton):
         if websocket not in self.ws2client:
             return  # ignore if not handshaked
         ws_client = self.ws2client[websocket]
+        if ws_client.sender is not None:
+            ws_client.sender.close()
         id = ws_client.id
         project_id = ws_client.project_id
         identity_type = ws_client.identity_type
@@ -137,6 +157,7 @@ class WSConnectionManager(metaclass=Singleton):
         if not bridge:
             return  # do nothing if bridge has been deleted
         if identity_type == IdentityType.WEB:  # is web ws, remove from bridge's web ws list
+            bridge.unsubscribe(ws_client)
             _new_web_ws_list = [c for c in Bridge.of_id(project_id).web_ws_list if c.id != id]
             bridge.web_ws_list = _new_web_ws_list
         elif (
@@ -160,6 +181,10 @@ class WSConnectionManager(metaclass=Singleton):
             )
             return  # security check, identityType should match identityType
 
+        if message.event_type in [EVENT_TYPE_NAME_SUBSCRIBE, EVENT_TYPE_NAME_UNSUBSCRIBE]:
+            self.handle_subscription(ws_client, message)
+            return
+
         # handle regular event types
         if message.event_type in self.event_handlers:
             for handler in self.event_handlers[message.event_type]:
@@ -171,5 +196,21 @@ class WSConnectionManager(metaclass=Singleton):
                 save_history=True,
             )
 
+    def handle_subscription(self, ws_client: WSClient, message: EventMsg):
+        if ws_client.identity_type != IdentityType.WEB:
+            logger.warn(
+                f"only frontends subscribe, but got {message.event_type} from {ws_client.id}"
+            )
+            return
+        topics = message.payload if isinstance(message.payload, list) else [message.payload]
+        if not all(isinstance(topic, dict) and EVENT_TYPE_KEY in topic for topic in topics):
+            logger.warn(f"illegal topics to {message.event_type}: {message.payload}, dropping...")
+            return
+        bridge = Bridge.of_id(ws_client.project_id)
+        if message.event_type == EVENT_TYPE_NAME_SUBSCRIBE:
+            bridge.subscribe(ws_client, topics)
+        else:
+            bridge.unsubscribe(ws_client, topics)
+
 
 manager = WSConnectionManager()
@@ -0,0 +1,83 @@
+# -*- coding: utf-8 -*-
+#
+# Author: GavinGong aka VisualDust
+# Github: github.com/visualDust
+# Date:   20261018
+
+import asyncio
+import itertools
+from collections import OrderedDict
+
+from fastapi import WebSocket
+
+from neetbox._protocol import *
+from neetbox.logging import Logger
+
+logger = Logger("Websocket.Project", skip_writers_names=["ws"])
+
+FRONTEND_QUEUE_SIZE = 4096  # max messages pending for a frontend
+# event types of which only the latest message of a run id and series is worth sending late
+COALESCED_EVENT_TYPES = {EVENT_TYPE_NAME_HARDWARE, EVENT_TYPE_NAME_PROGRESS}
+
+
+class FrontendSender:
+    """outbound queue of a frontend websocket, sent by its own task so that a slow frontend delays nobody else. A pending message of a coalesced event type is replaced by a newer one of the same run id and series, other messages are dropped from the oldest when more than queue_size are pending."""
+
+    def __init__(self, ws: WebSocket, queue_size: int = FRONTEND_QUEUE_SIZE):
+        self.ws = ws
+        self.queue_size = queue_size
+        self.num_sent = 0
+        self.num_dropped = 0
+        self.num_coalesced = 0
+        self._pending = OrderedDict()  # {key : serialized message}
+        self._keys = itertools.count()  # of messages not coalesced
+        self._wake_up = asyncio.Event()
+        self._task: asyncio.Task = None
+
+    def start(self):
+        """start sending, messages put before are queued"""
+        self._task = asyncio.get_running_loop().create_task(self._send_loop())
+
+    def put(self, message: EventMsg, text: str):
+        """queue a message serialized as text"""
+        if message.event_type in COALESCED_EVENT_TYPES:
+            key = (message.event_type, message.run_id, message.series)
+            if key in self._pending:  # keeps its place in queue
+                self._pending[key] = text
+                self.num_coalesced += 1
+                return
+        else:
+            key = next(self._keys)
+        self._pending[key] = text
+        if len(self._pending) > self.queue_size:
+            self._pending.popitem(last=False)
+            self.num_dropped += 1
+        self._wake_up.set()
+
+    async def _send_loop(self):
+        try:
+            while True:
+                await self._wake_up.wait()
+                self._wake_up.clear()
+                while self._pending:
+                    _, text = self._pending.popitem(last=False)
+                    await self.ws.send_text(text)
+                    self.num_sent += 1
+        except asyncio.CancelledError:
+            pass
+        except Exception as e:  # disconnected
+            logger.debug(f"stopped sending to frontend cause {e}")
+
+    @property
+    def stats(self) -> dict:
+        return {
+            "queued": len(self._pending),
+            "sent": self.num_sent,
+            "dropped": self.num_dropped,
+            "coalesced": self.num_coalesced,
+        }
+
+    def close(self):
+        if self._task is not None:
+            self._task.cancel()
+        self._pending.clear()
@@ -85,7 +85,8 @@ class Hardware(metaclass=Singleton):
     _cpu_statistics: CpuStatistics
     _memory: MemoryStatus
 
-    def __init__(self) -> None:
+    def __init__(self, interval: float = 1.0) -> None:
+        self.interval = interval  # seconds between samples
         self._cpus = [CpuStatus() for _ in range(psutil.cpu_count(logical=True))]
         self._cpu_statistics = CpuStatistics(*psutil.cpu_stats())
         virtual_memory = psutil.virtual_memory()
@@ -118,7 +119,7 @@ class Hardware(metaclass=Singleton):
                     free=virtual_memory[4] / 1e6,
                 )
                 self._cpu_statistics = CpuStatistics(*psutil.cpu_stats())
-                time.sleep(1)
+                time.sleep(self.interval)
 
         Thread(target=watch_thread, daemon=True).start()
 
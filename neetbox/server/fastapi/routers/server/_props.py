@@ -16,6 +16,7 @@ from neetbox._protocol import *
 from neetbox.config.user import get as get_global_config
 from neetbox.logging import Logger, LogLevel
 
+from ....db.project import ProjectDB
 from ._monitor import disks
 
 logger = Logger("Project APIs", skip_writers_names=["ws"])
@@ -46,6 +47,7 @@ async def get_version():
 async def shutdown_server():
     def __sleep_and_shutdown(secs=1):
         time.sleep(secs)
+        ProjectDB.flush_all(timeout=secs)  # exiting without atexit hooks
         os._exit(0)
 
     Thread(target=__sleep_and_shutdown).start()  # shutdown after 3 seconds
@@ -4,11 +4,13 @@
 # Github: github.com/visualDust
 # Date:   20240110
 
-import time
+import asyncio
+import json
 
 from fastapi import APIRouter, WebSocket, WebSocketDisconnect
 
 from neetbox._protocol import *
+from neetbox.config.user import get as get_global_config
 from neetbox.logging import Logger
 
 from ._monitor import hardware
@@ -17,7 +19,56 @@ router = APIRouter()
 
 logger = Logger("Websocket.Server", skip_writers_names=["ws"])
 
-WS_CLIENTS = []
+SEND_TIMEOUT = 10  # seconds a monitor could take to receive an update before dropped
+
+
+class HardwareTicker:
+    """a task sending the hardware status to every server monitor connected, sampled and serialized once per tick. runs only while any monitor is connected, the interval is read from global config 'hardware-monitor-interval' when started."""
+
+    def __init__(self):
+        self.clients = set()
+        self.interval = None
+        self._task: asyncio.Task = None
+
+    def add(self, websocket: WebSocket):
+        self.clients.add(websocket)
+        if self._task is None or self._task.done():
+            self.interval = float(get_global_config("hardware-monitor-interval") or 1.0)
+            hardware.interval = self.interval
+            self._task = asyncio.get_running_loop().create_task(self._tick_loop())
+
+    def remove(self, websocket: WebSocket):
+        self.clients.discard(websocket)
+        if not self.clients and self._task is not None:
+            self._task.cancel()
+            self._task = None
+
+    async def _send(self, websocket: WebSocket, text: str):
+        try:
+            await asyncio.wait_for(websocket.send_text(text), timeout=SEND_TIMEOUT)
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:  # disconnected or too slow
+            logger.debug(f"stopped sending hardware status to a monitor cause {e!r}")
+            self.clients.discard(websocket)
+
+    async def _tick_loop(self):
+        while self.clients:
+            text = json.dumps(
+                EventMsg(
+                    project_id=None,
+                    run_id=None,
+                    event_type=EVENT_TYPE_NAME_HARDWARE,
+                    identity_type=IdentityType.SERVER,
+                    payload=hardware.json,
+                    timestamp=get_timestamp(),
+                ).json
+            )
+            await asyncio.gather(*[self._send(ws, text) for ws in list(self.clients)])
+            await asyncio.sleep(self.interval)
+
+
+ticker = HardwareTicker()
 
 
 async def handshake(websocket: WebSocket):
@@ -27,7 +78,7 @@ async def handshake(websocket: WebSocket):
         message = EventMsg.loads(message)
     except Exception as e:
         logger.err(f"error encountered '{e}' while handling handshake message: {message}")
-        websocket.close(code=1003, reason="invalid handshake")
+        await websocket.close(code=1003, reason="invalid handshake")
         return None
     assert (
         message.event_type == EVENT_TYPE_NAME_HANDSHAKE
@@ -44,7 +95,6 @@ async def handshake(websocket: WebSocket):
             },
         ).json
     )
-    WS_CLIENTS.append(websocket)
     return websocket
 
 
@@ -52,22 +102,11 @@ async def handshake(websocket: WebSocket):
 async def server_monitor_ws_endpoint(websocket: WebSocket):
     if not await handshake(websocket):
         return
-    while True:
-        try:
-            await websocket.send_json(
-                EventMsg(
-                    project_id=None,
-                    run_id=None,
-                    event_type=EVENT_TYPE_NAME_HARDWARE,
-                    identity_type=IdentityType.SERVER,
-                    payload=hardware.json,
-                    timestamp=get_timestamp(),
-                ).json
-            )
-            time.sleep(1)
-
-        except WebSocketDisconnect:
-            try:
-                WS_CLIENTS.remove(websocket)
-            except:
-                pass  # todo
+    ticker.add(websocket)
+    try:
+        while True:  # nothing expected from monitors, receive to know when disconnected
+            await websocket.receive_text()
+    except WebSocketDisconnect:
+        pass
+    finally:
+        ticker.remove(websocket)
@@ -18,10 +18,18 @@ def server_process(cfg, debug=False):
     setproctitle.setproctitle("NEETBOX SERVER")
     from neetbox.logging import Logger
 
-    from .fastapi import serverapp
-
     logger = Logger("SERVER LAUNCHER", skip_writers_names=["ws"])
 
+    num_workers = int(cfg.get("workers") or 1)
+    if num_workers > 1:  # projects sharded to worker processes behind a router
+        from ._router import ShardedServer
+
+        logger.log(f"launching {num_workers} server workers")
+        ShardedServer(cfg, num_workers=num_workers, debug=debug).serve()
+        return
+
+    from .fastapi import serverapp
+
     port = cfg["port"]
     logger.log(f"launching fastapi server on http://0.0.0.0:{port}")
     uvicorn_log_level = "info" if debug else "critical"
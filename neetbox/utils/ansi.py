@@ -46,3 +46,28 @@ def is_jsonable(x):
         return True
     except (TypeError, OverflowError):
         return False
+
+
+ANSI_RESET = "\033[0m"
+ANSI_COLORS = {
+    "default": 39,
+    "red": 31,
+    "green": 32,
+    "yellow": 33,
+    "blue": 34,
+    "magenta": 35,
+    "cyan": 36,
+    "white": 37,
+}
+ANSI_TEXT_STYLES = {"bold": 1, "dim": 2, "italic": 3, "blink": 5}
+
+
+def ansi_prefix(*styles: str) -> str:
+    """escape sequence of colors and text styles, for example ansi_prefix("red", "bold")"""
+    codes = [str(ANSI_COLORS.get(style) or ANSI_TEXT_STYLES[style]) for style in styles]
+    return f"\033[{';'.join(codes)}m" if codes else ""
+
+
+def colored(text: str, *styles: str) -> str:
+    """wrap text with escape sequences of colors and text styles"""
+    return f"{ansi_prefix(*styles)}{text}{ANSI_RESET}" if styles else text
@@ -0,0 +1,93 @@
+# -*- coding: utf-8 -*-
+#
+# Author: GavinGong aka VisualDust
+# Github: github.com/visualDust
+# Date:   20261018
+
+from collections import deque
+from queue import Empty
+from threading import Condition
+
+QUEUE_POLICY_BLOCK = "block"
+QUEUE_POLICY_DROP_OLDEST = "drop-oldest"
+QUEUE_POLICY_DROP_NEWEST = "drop-newest"
+
+
+class BoundedQueue:
+    """Thread safe FIFO queue with a capacity and a backpressure policy applied when full:
+    - block: put waits until there is space.
+    - drop-oldest: the oldest item is dropped to make space.
+    - drop-newest: the new item is dropped.
+
+    Like queue.Queue, consumers call task_done for every item they get, so join waits until everything is processed.
+    """
+
+    def __init__(self, maxsize: int, policy: str = QUEUE_POLICY_BLOCK):
+        if policy not in [QUEUE_POLICY_BLOCK, QUEUE_POLICY_DROP_OLDEST, QUEUE_POLICY_DROP_NEWEST]:
+            raise ValueError(f"unknown queue policy {policy}")
+        if maxsize <= 0:
+            raise ValueError(f"maxsize should be positive, got {maxsize}")
+        self.maxsize = maxsize
+        self.policy = policy
+        self.num_dropped = 0
+        self._items = deque()
+        self._num_unfinished = 0
+        self._condition = Condition()
+
+    def __len__(self):
+        return len(self._items)
+
+    def put(self, item) -> bool:
+        """put an item, applying the policy if full
+
+        Returns:
+            bool: False if the item is dropped
+        """
+        with self._condition:
+            if len(self._items) >= self.maxsize:
+                if self.policy == QUEUE_POLICY_DROP_NEWEST:
+                    self.num_dropped += 1
+                    return False
+                if self.policy == QUEUE_POLICY_DROP_OLDEST:
+                    self._items.popleft()
+                    self._num_unfinished -= 1
+                    self.num_dropped += 1
+                else:  # block
+                    self._condition.wait_for(lambda: len(self._items) < self.maxsize)
+            self._items.append(item)
+            self._num_unfinished += 1
+            self._condition.notify_all()
+            return True
+
+    def get(self, timeout: float = None):
+        """take the oldest item, waiting at most timeout seconds for one. raises queue.Empty on timeout."""
+        with self._condition:
+            if not self._condition.wait_for(lambda: len(self._items), timeout):
+                raise Empty
+            item = self._items.popleft()
+            self._condition.notify_all()  # wake up blocked producers
+            return item
+
+    def get_many(self, max_items: int, timeout: float = None) -> list:
+        """take at most max_items of the oldest items, waiting at most timeout seconds for the first one. raises queue.Empty on timeout."""
+        with self._condition:
+            if not self._condition.wait_for(lambda: len(self._items), timeout):
+                raise Empty
+            items = [self._items.popleft() for _ in range(min(max_items, len(self._items)))]
+            self._condition.notify_all()
+            return items
+
+    def task_done(self, num_items: int = 1):
+        with self._condition:
+            self._num_unfinished -= num_items
+            if self._num_unfinished <= 0:
+                self._condition.notify_all()
+
+    def join(self, timeout: float = None) -> bool:
+        """wait until every item put is processed or dropped
+
+        Returns:
+            bool: False on timeout
+        """
+        with self._condition:
+            return self._condition.wait_for(lambda: self._num_unfinished <= 0, timeout)
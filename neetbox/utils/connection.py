@@ -1,20 +1,111 @@
 import atexit
-from threading import Thread
+from collections import deque
+from threading import Event, Lock, Thread
+from typing import Any, Callable, Iterator, List, Tuple
 
 import httpx
 import websocket
 from vdtoys.framing import get_caller_info_traceback
 
 from neetbox._protocol import *
+from neetbox.logging import Logger
+from neetbox.utils.spool import MessageSpool
 
-httpxClient: httpx.Client = httpx.Client(  # httpx client
-    proxy={
-        "http://": None,
-        "https://": None,
-    }
+logger = Logger("WEBSOCKET CLIENT", skip_writers_names=["ws"])
+
+httpxClient: httpx.Client = (
+    httpx.Client(  # httpx client, shared so that connections are pooled and kept alive
+        proxy={
+            "http://": None,
+            "https://": None,
+        },
+        limits=httpx.Limits(max_keepalive_connections=8, keepalive_expiry=30),
+    )
 )
 
 
+def encode_frames(
+    messages: List[EventMsg],
+    encode: Callable[[List[EventMsg]], Any],
+    on_error: Callable[[EventMsg, Exception], None],
+) -> Iterator[Tuple[Any, int]]:
+    """encode messages into a frame, or message by message if they cannot be encoded together. messages which cannot be encoded on their own are passed to on_error and skipped.
+
+    Frames are encoded lazily, so that a stateful encoder sees them in the order they are sent.
+
+    Yields:
+        Tuple[Any, int]: a frame and the index of its first message
+    """
+    try:
+        frame = encode(messages)
+    except Exception:  # find the bad ones, the others are still sent
+        frame = None
+    if frame is not None:
+        yield frame, 0
+        return
+    for index, message in enumerate(messages):
+        try:
+            frame = encode([message])
+        except Exception as e:
+            on_error(message, e)
+            continue
+        yield frame, index
+
+
+class SendQueue:
+    """Thread safe queue of messages waiting to be sent in batches, the oldest message is dropped when full. Messages are appended by any thread and taken by a single sender, which puts back what it failed to send. Dropped messages are counted in num_dropped."""
+
+    def __init__(self, maxsize: int = None):
+        self.num_dropped = 0
+        self._messages = deque(maxlen=maxsize)
+        self._lock = Lock()
+
+    def __len__(self):
+        return len(self._messages)
+
+    def __getitem__(self, index: int) -> EventMsg:
+        return self._messages[index]
+
+    def append(self, message: EventMsg) -> int:
+        """
+        Returns:
+            int: number of queued messages
+        """
+        with self._lock:
+            if len(self._messages) == self._messages.maxlen:
+                self.num_dropped += 1  # deque drops the oldest one
+            self._messages.append(message)
+            return len(self._messages)
+
+    def pop_batch(self, batch_size: int) -> List[EventMsg]:
+        """take at most batch_size of the oldest messages"""
+        with self._lock:
+            return [self._messages.popleft() for _ in range(min(batch_size, len(self._messages)))]
+
+    def put_back(self, messages: List[EventMsg]):
+        """put unsent messages back to the head of the queue, dropping the oldest ones if it filled up meanwhile"""
+        with self._lock:
+            if self._messages.maxlen is not None:
+                num_over = len(self._messages) + len(messages) - self._messages.maxlen
+                if num_over > 0:
+                    self.num_dropped += num_over
+                    messages = messages[num_over:]
+            self._messages.extendleft(reversed(messages))
+
+    def drop_beyond(self, size: int):
+        """keep the latest size messages only"""
+        with self._lock:
+            while len(self._messages) > size:
+                self._messages.popleft()
+                self.num_dropped += 1
+
+    def drop_unencodable(self, message: EventMsg, error: Exception):
+        """count a message taken from queue which cannot be encoded, see encode_frames"""
+        with self._lock:
+            self.num_dropped += 1
+        logger.warn(f"dropped a {message.event_type} message which cannot be encoded: {error!r}")
+
+
 class WebsocketClient:
     instances = {}
 
@@ -26,7 +117,25 @@ class WebsocketClient:
         on_error,
         on_close,
         offline_message_buffer_size=0,
+        batch_size=0,
+        batch_interval=0.05,
+        send_queue_size=10000,
+        spool: MessageSpool = None,
     ):
+        """create a websocket client
+
+        Args:
+            url (str): websocket server url
+            on_open (Callable): called with the WebSocketApp when connected
+            on_message (Callable): called with the WebSocketApp and the received message
+            on_error (Callable): called with the WebSocketApp and the error
+            on_close (Callable): called with the WebSocketApp, close status code and close message
+            offline_message_buffer_size (int, optional): how many messages to keep in memory while offline. Defaults to 0.
+            batch_size (int, optional): send in background batches of at most batch_size messages, 0 to send synchronously on the caller's thread. Defaults to 0.
+            batch_interval (float, optional): max seconds a message waits in the send queue before flushed. Defaults to 0.05.
+            send_queue_size (int, optional): capacity of the send queue in batch mode, the oldest message is dropped when full. Defaults to 10000.
+            spool (MessageSpool, optional): keep messages on disk instead of memory while offline and replay them once ready again. Defaults to None.
+        """
         self.wsApp = websocket.WebSocketApp(  # create websocket client
             url=url,
             on_open=on_open,
@@ -34,10 +143,26 @@ class WebsocketClient:
             on_error=on_error,
             on_close=on_close,
         )
-        self.message_query = []  # websocket message query
+        self.message_query = SendQueue(  # websocket message query
+            maxsize=send_queue_size if batch_size > 0 else None
+        )
         self.offline_message_buffer_size = offline_message_buffer_size
+        self.batch_size = batch_size
+        self.batch_interval = batch_interval
+        self.spool = spool
+        self.send_failing = (
+            False  # whether the last send failed, failures are logged once until recovered
+        )
+        self.ready = False  # set by owner once handshake succeed, messages wait until then
+        self.closed = False  # set once closed for good, no more reconnecting
+        self._flush_lock = Lock()
+        self.set_wire_format(WIRE_FORMAT_JSON)  # until negotiated in handshake
         self.creator = get_caller_info_traceback(stack_offset=1)
         WebsocketClient.instances[self.creator.strid] = self
+        if self.batch_size > 0:  # batch mode, messages are flushed by sender thread
+            self._wake_up_sender = Event()
+            self._sender_thread = Thread(target=self._sender_loop, daemon=True)
+            self._sender_thread.start()
 
     def connect(self, reconnect=1):
         if not self.wsApp:
@@ -48,6 +173,27 @@ class WebsocketClient:
             daemon=True,
         ).start()  # initialize and start ws thread
 
+    def run_forever(self):
+        """connect and block the calling thread until disconnected, without reconnecting. messages sent meanwhile are queued as usual."""
+        if not self.wsApp:
+            raise RuntimeError("You should setup WebsocketClient before connect.")
+        if not self.closed:
+            self.wsApp.run_forever(reconnect=0)
+
+    def close(self):
+        """send what is left and close for good"""
+        try:
+            self.flush()
+        finally:
+            self.closed = True
+            self.ready = False
+            self.wsApp.close()
+
+    @property
+    def num_dropped(self) -> int:
+        """messages dropped because the queue is full or offline"""
+        return self.message_query.num_dropped
+
     @property
     def is_connected(self) -> bool:
         return (
@@ -56,27 +202,94 @@ class WebsocketClient:
             else False
         )
 
+    def set_wire_format(self, wire_format: str):
+        """switch the wire format of following messages. the binary codec is stateful, so call this on every (re)connect."""
+        with self._flush_lock:
+            self.wire_format = wire_format
+            self._binary_wire = BinaryWire() if wire_format == WIRE_FORMAT_BINARY else None
+
+    def _encode_frame(self, messages: List[EventMsg]):
+        """encode messages into (data, opcode) of a frame"""
+        if self._binary_wire:
+            return self._binary_wire.dumps(messages), websocket.ABNF.OPCODE_BINARY
+        elif len(messages) == 1:
+            return messages[0].dumps(), websocket.ABNF.OPCODE_TEXT
+        else:
+            return EventMsg.dumps_batch(messages), websocket.ABNF.OPCODE_TEXT
+
+    def _send_batch(self, batch: List[EventMsg]) -> List[EventMsg]:
+        """send batch in as few frames as possible, dropping messages which cannot be encoded
+
+        Returns:
+            List[EventMsg]: messages left unsent because sending failed
+        """
+        for (data, opcode), index in encode_frames(
+            batch, self._encode_frame, self.message_query.drop_unencodable
+        ):
+            try:
+                self.wsApp.send(data, opcode=opcode)
+            except Exception as e:
+                self._on_send_result(e)
+                return batch[index:]
+        self._on_send_result()
+        return []
+
+    def _send_spooled(self, batch: List[EventMsg]):
+        if self._send_batch(batch):  # the spool replays them again on next flush
+            raise ConnectionError("failed to send spooled messages")
+
+    def _on_send_result(self, error: Exception = None):
+        """log a send failure, or recovery from it, once per change"""
+        if error is not None and not self.send_failing:
+            self.send_failing = True
+            logger.warn(f"failed to send messages cause {error!r}, retrying on next flush")
+        elif error is None and self.send_failing:
+            self.send_failing = False
+            logger.ok(f"sending messages again")
+
     def send(self, message: EventMsg):
-        self.message_query.append(message)
-        if self.is_connected:  # if ws client exist
+        num_queued = self.message_query.append(message)
+        if self.batch_size > 0:  # batch mode, leave it to the sender thread
+            if num_queued >= self.batch_size:
+                self._wake_up_sender.set()
+            return
+        self.flush()
+
+    def _sender_loop(self):
+        while True:
+            self._wake_up_sender.wait(timeout=self.batch_interval)
+            self._wake_up_sender.clear()
             try:
-                while len(self.message_query):
-                    self.wsApp.send(self.message_query[0].dumps())
-                    self.message_query.pop(0)
+                self.flush()
             except Exception as e:
-                pass
-        else:
-            while len(self.message_query) > self.offline_message_buffer_size:
-                self.message_query.pop(0)
+                self._on_send_result(e)
+
+    def flush(self):
+        """send queued messages, spooled ones first. while offline, move queued messages into spool, or drop the oldest ones beyond offline_message_buffer_size if there is no spool."""
+        with self._flush_lock:
+            if not (self.ready and self.is_connected):
+                if self.spool is not None:  # keep them on disk
+                    self.spool.append(self.message_query.pop_batch(len(self.message_query)))
+                else:  # keep the latest messages only
+                    self.message_query.drop_beyond(self.offline_message_buffer_size)
+                return
+            batch_size = max(self.batch_size, 1)
+            if self.spool is not None and len(self.spool):  # spooled messages are older
+                if not self.spool.replay(self._send_spooled, batch_size=batch_size):
+                    return
+            while len(self.message_query):
+                unsent = self._send_batch(self.message_query.pop_batch(batch_size))
+                if unsent:  # retry them on next flush
+                    self.message_query.put_back(unsent)
+                    return
 
 
 def _clean_websocket_on_exit():
     for client in WebsocketClient.instances.values():
-        if hasattr(client, "wsApp") and client.wsApp:
-            try:
-                client.wsApp.close()
-            except Exception as e:
-                pass
+        try:
+            client.close()  # send what is left in the send queue
+        except Exception as e:
+            logger.warn(f"failed to send what is left on exit cause {e!r}")
 
 
 # clean websocket connections on exit
@@ -0,0 +1,179 @@
+# -*- coding: utf-8 -*-
+#
+# Author: GavinGong aka VisualDust
+# Github: github.com/visualDust
+# Date:   20261018
+
+import json
+import os
+from threading import RLock
+from typing import Callable, Iterable, List
+
+from neetbox._protocol import *
+
+SPOOL_SEGMENT_FILE_TYPE_NAME = "spool"
+SPOOL_POLICY_DROP_OLDEST = "drop-oldest"
+SPOOL_POLICY_DROP_NEWEST = "drop-newest"
+
+
+class _Segment:
+    def __init__(self, path: str) -> None:
+        self.path = path
+        self.size = 0  # bytes written
+        self.count = 0  # messages written
+
+
+class MessageSpool:
+    """Append-only on-disk spool of EventMsg, used to keep messages while offline. Messages are written as json lines into segment files under the given folder, and replayed in order once online again.
+
+    When the spool grows beyond max_size, the compaction policy decides what to drop:
+    - drop-oldest: delete the oldest segment, even if it has not been replayed.
+    - drop-newest: refuse new messages until replayed.
+
+    Replayed segments are deleted. Segments left in the folder by an earlier process are replayed first.
+    """
+
+    # class level static
+    PATH2SPOOL = {}
+
+    # instance level
+    folder: str
+    max_size: int
+    segment_size: int
+    policy: str
+    num_pending: int
+    num_dropped: int
+
+    def __new__(
+        cls,
+        folder: str,
+        max_size: int = 256 * 1024 * 1024,
+        segment_size: int = 4 * 1024 * 1024,
+        policy: str = SPOOL_POLICY_DROP_OLDEST,
+    ):
+        folder = os.path.abspath(folder)
+        if folder in MessageSpool.PATH2SPOOL:
+            return MessageSpool.PATH2SPOOL[folder]
+        if policy not in [SPOOL_POLICY_DROP_OLDEST, SPOOL_POLICY_DROP_NEWEST]:
+            raise ValueError(f"unknown spool policy {policy}")
+        if not os.path.exists(folder):
+            os.makedirs(folder)
+        new_instance = super().__new__(cls)
+        new_instance.folder = folder
+        new_instance.max_size = max_size
+        new_instance.segment_size = segment_size
+        new_instance.policy = policy
+        new_instance.num_pending = 0
+        new_instance.num_dropped = 0
+        new_instance._lock = RLock()
+        new_instance._segments = []  # oldest first
+        new_instance._next_segment_index = 0
+        new_instance._size = 0  # bytes of segments on disk
+        new_instance._writer = None  # file of the newest segment
+        new_instance._read_offset = 0  # position in the oldest segment
+        new_instance._read_count = 0  # messages already replayed from the oldest segment
+        new_instance._load_segments()
+        MessageSpool.PATH2SPOOL[folder] = new_instance
+        return new_instance
+
+    def _load_segments(self):
+        """adopt segments left by an earlier process, new segments continue from the highest index"""
+        indexed_paths = []
+        for file_name in os.listdir(self.folder):
+            index, _, file_type = file_name.partition(".")
+            if file_type == SPOOL_SEGMENT_FILE_TYPE_NAME and index.isdigit():
+                indexed_paths.append((int(index), os.path.join(self.folder, file_name)))
+        for index, path in sorted(indexed_paths):
+            with open(path, "rb+") as segment_file:
+                content = segment_file.read()
+                complete = content.rfind(b"\n") + 1
+                if complete < len(content):  # drop the partial line of an interrupted write
+                    segment_file.truncate(complete)
+            segment = _Segment(path)
+            segment.size = complete
+            segment.count = content.count(b"\n")
+            self._segments.append(segment)
+            self._size += segment.size
+            self.num_pending += segment.count
+            self._next_segment_index = index + 1
+
+    def __len__(self):
+        return self.num_pending
+
+    @property
+    def size(self):
+        """bytes of segments on disk"""
+        return self._size
+
+    def _new_segment(self):
+        if self._writer:
+            self._writer.close()
+        path = os.path.join(
+            self.folder, f"{self._next_segment_index:08d}.{SPOOL_SEGMENT_FILE_TYPE_NAME}"
+        )
+        self._next_segment_index += 1
+        self._segments.append(_Segment(path))
+        self._writer = open(path, "ab")
+
+    def _drop_oldest_segment(self):
+        segment = self._segments.pop(0)
+        if not self._segments and self._writer:  # it was also the one being written
+            self._writer.close()
+            self._writer = None
+        unread = segment.count - self._read_count
+        self.num_pending -= unread
+        self._read_offset = 0
+        self._read_count = 0
+        self._size -= segment.size
+        os.remove(segment.path)
+        return unread
+
+    def append(self, messages: Iterable[EventMsg]):
+        with self._lock:
+            for message in messages:
+                line = (json.dumps(message.json, default=str) + "\n").encode()
+                if self.size + len(line) > self.max_size:  # compaction
+                    if self.policy == SPOOL_POLICY_DROP_NEWEST or len(self._segments) <= 1:
+                        self.num_dropped += 1
+                        continue
+                    self.num_dropped += self._drop_oldest_segment()
+                if self._writer is None or self._segments[-1].size >= self.segment_size:
+                    self._new_segment()
+                self._writer.write(line)
+                self._segments[-1].size += len(line)
+                self._size += len(line)
+                self._segments[-1].count += 1
+                self.num_pending += 1
+            if self._writer:
+                self._writer.flush()
+
+    def replay(self, send: Callable[[List[EventMsg]], None], batch_size: int = 64) -> bool:
+        """send spooled messages in order with send(messages). stops at the first exception raised by send and retries the same messages on next replay.
+
+        Returns:
+            bool: True if everything has been replayed
+        """
+        with self._lock:
+            while self._segments:
+                segment = self._segments[0]
+                if self._read_offset >= segment.size:  # the oldest segment is done
+                    self._drop_oldest_segment()
+                    continue
+                with open(segment.path, "rb") as segment_file:
+                    segment_file.seek(self._read_offset)
+                    lines = [segment_file.readline() for _ in range(batch_size)]
+                    lines = [line for line in lines if line]
+                    offset = segment_file.tell()
+                try:
+                    send([EventMsg.loads(line.decode()) for line in lines])
+                except Exception as e:
+                    return False
+                self._read_offset = offset
+                self._read_count += len(lines)
+                self.num_pending -= len(lines)
+            return True
+
+    def clear(self):
+        with self._lock:
+            while self._segments:
+                self._drop_oldest_segment()
@@ -0,0 +1,56 @@
+# -*- coding: utf-8 -*-
+#
+# benchmark of time range reads of the structured log store, run in a workspace folder with:
+#   python -m tests.benchmark.bench_log_store [num_lines]
+# writes num_lines logs one second apart into a temporary folder, then reads a 60 seconds range at the end.
+
+import sys
+import tempfile
+import time
+from datetime import datetime, timedelta
+
+from vdtoys.framing import TracebackInfo
+
+from neetbox.logging import RawLog, read_logs
+from neetbox.logging.writers import JsonLogWriter
+
+
+def bench(num_lines=1000000):
+    with tempfile.TemporaryDirectory() as folder:
+        path = f"{folder}/bench.jsonl"
+        writer = JsonLogWriter(path)
+        begin = datetime(2024, 1, 11)
+        caller_info = TracebackInfo()
+        time_begin = time.perf_counter()
+        for i in range(num_lines):
+            writer.write(
+                RawLog(
+                    message=f"step {i} loss {1 / (i + 1)}",
+                    caller_info=caller_info,
+                    caller_name_alias="bench",
+                    timestamp=begin + timedelta(seconds=i),
+                    series="info",
+                )
+            )
+        writer.flush()
+        print(
+            f"wrote {num_lines} lines in {time.perf_counter() - time_begin:.2f}s, {len(writer.segments) + 1} segments"
+        )
+
+        since = begin + timedelta(seconds=num_lines - 100)
+        until = since + timedelta(seconds=60)
+        time_begin = time.perf_counter()
+        num_read = sum(1 for _ in read_logs(path, since=since, until=until))
+        print(f"read {num_read} lines in range in {(time.perf_counter() - time_begin) * 1e3:.2f}ms")
+        time_begin = time.perf_counter()
+        since, until = since.isoformat(timespec="microseconds"), until.isoformat(
+            timespec="microseconds"
+        )
+        num_read = sum(1 for log in read_logs(path) if since <= log["timestamp"] <= until)
+        print(
+            f"read {num_read} lines by full scan in {(time.perf_counter() - time_begin) * 1e3:.2f}ms"
+        )
+
+
+if __name__ == "__main__":
+    bench(*[int(arg) for arg in sys.argv[1:]])
@@ -0,0 +1,39 @@
+# -*- coding: utf-8 -*-
+#
+# micro-benchmark of neetbox logger calls per second, run in a workspace folder with:
+#   python -m tests.benchmark.bench_logging
+# writers are replaced by private ones doing nothing, so only the cost of the logger itself is measured.
+
+import time
+
+from neetbox.logging import Logger, LogLevel
+
+
+def _calls_per_second(function, num_calls):
+    begin = time.perf_counter()
+    for _ in range(num_calls):
+        function()
+    return num_calls / (time.perf_counter() - begin)
+
+
+def bench(num_calls=200000):
+    logger = Logger("bench", skip_writers_names=["stdout", "ws", "file"], log_level=LogLevel.INFO)
+    logger.writer("noop")(writer_func=lambda log: None)
+    logger.writer("message")(writer_func=lambda log: log.message)
+    caller_info_logger = Logger(None, skip_writers_names=["stdout", "ws", "file"])
+    caller_info_logger.writer("caller")(writer_func=lambda log: log.caller_info_formatted)
+    cases = {
+        "filtered (debug at info level)": lambda: logger.debug("step", 1, "loss", 0.5),
+        "unfiltered, message read": lambda: logger.info("step", 1, "loss", 0.5),
+        "unfiltered, caller info read": lambda: caller_info_logger.info("step", 1, "loss", 0.5),
+    }
+    print(f"{num_calls} calls per case")
+    print(f"{'case':<36}{'calls/sec':>16}")
+    for name, function in cases.items():
+        calls_per_second = _calls_per_second(function, num_calls // 100)  # warm up
+        calls_per_second = _calls_per_second(function, num_calls)
+        print(f"{name:<36}{calls_per_second:>16,.0f}")
+
+
+if __name__ == "__main__":
+    bench()
@@ -0,0 +1,58 @@
+# -*- coding: utf-8 -*-
+#
+# micro-benchmark of per iteration overhead of neetbox.progress, run in a workspace folder with:
+#   python -m tests.benchmark.bench_progress
+# every case runs in a fresh process, since the client decides online mode only once.
+
+import json
+import subprocess
+import sys
+import time
+
+CASES = {  # name -> client config
+    "no server (client disabled)": {"enable": False},
+    "server attached": {},
+    "server attached, no coalescing": {"progress": {"maxFrequency": 0}},
+}
+
+
+def _run_case(client_config, num_iterations):
+    import neetbox
+    from neetbox.config import get_module_level_config
+
+    get_module_level_config("client").update(client_config)
+    begin = time.perf_counter()
+    for _ in range(num_iterations):
+        pass
+    baseline = time.perf_counter() - begin
+    for _ in neetbox.progress(16):  # warm up, connecting in background
+        pass
+    begin = time.perf_counter()
+    for _ in neetbox.progress(range(num_iterations)):
+        pass
+    elapsed = time.perf_counter() - begin
+    print("RESULT", json.dumps({"overhead": (elapsed - baseline) / num_iterations}))
+
+
+def bench(num_iterations=200000):
+    print(f"{num_iterations} iterations of an empty loop wrapped by neetbox.progress")
+    print(f"{'case':<36}{'overhead/iter':>16}")
+    for name, client_config in CASES.items():
+        result = subprocess.run(
+            [sys.executable, "-m", __spec__.name, json.dumps(client_config), str(num_iterations)],
+            capture_output=True,
+            text=True,
+        )
+        lines = [line for line in result.stdout.splitlines() if line.startswith("RESULT")]
+        if not lines:
+            print(f"{name:<36}{'failed':>16}\n{result.stderr}")
+            continue
+        overhead = json.loads(lines[0].split(" ", 1)[1])["overhead"]
+        print(f"{name:<36}{overhead * 1e6:>14.2f}us")
+
+
+if __name__ == "__main__":
+    if len(sys.argv) > 1:
+        _run_case(json.loads(sys.argv[1]), int(sys.argv[2]))
+    else:
+        bench()
@@ -0,0 +1,41 @@
+# -*- coding: utf-8 -*-
+#
+# benchmark of writes to capped series of the project db, run in a workspace folder with:
+#   python -m tests.benchmark.bench_row_limit [num_writes] [num_row_limit]
+# writes rows one by one to series capped at num_row_limit rows, like hardware and progress events.
+
+import sys
+import tempfile
+import time
+from uuid import uuid4
+
+from neetbox.server.db.project import ProjectDB
+from neetbox.server.db.project.condition import ProjectDbQueryCondition
+
+
+def bench(num_writes=20000, num_row_limit=1000):
+    with tempfile.TemporaryDirectory() as folder:
+        db = ProjectDB(project_id=str(uuid4()), path=f"{folder}/bench.projectdb")
+        run_id = str(uuid4())
+        for series in ["cpu", "gpu"]:  # two series of a run
+            time_begin = time.perf_counter()
+            for i in range(num_writes):
+                db.write_json(
+                    "hardware",
+                    {"step": i},
+                    series=series,
+                    run_id=run_id,
+                    num_row_limit=num_row_limit,
+                    wait=False,
+                )
+            db.writer.flush()
+            seconds = time.perf_counter() - time_begin
+            print(f"series {series}: {num_writes / seconds:.0f} writes/s capped at {num_row_limit}")
+        for series in ["cpu", "gpu"]:
+            num_rows = len(db.read_json("hardware", ProjectDbQueryCondition(series=series)))
+            print(f"series {series}: {num_rows} rows kept")
+        db.delete()
+
+
+if __name__ == "__main__":
+    bench(*[int(arg) for arg in sys.argv[1:]])
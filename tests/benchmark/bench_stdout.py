@@ -0,0 +1,49 @@
+# -*- coding: utf-8 -*-
+#
+# benchmark of stdout log writer modes, run in a workspace folder with:
+#   python -m tests.benchmark.bench_stdout
+# every mode runs in a fresh process writing to /dev/null, results are reported through stderr.
+
+import os
+import subprocess
+import sys
+import time
+
+MODES = ["rich", "plain"]
+
+
+def _run_mode(num_logs):
+    from neetbox.logging import Logger
+    from neetbox.logging.writers import plain_stdout_writer
+
+    logger = Logger("bench", skip_writers_names=["ws", "file"])
+    begin = time.perf_counter()
+    for i in range(num_logs):
+        logger.info("step", i, "loss", 0.5)
+    plain_stdout_writer.flush()
+    print(f"RESULT {num_logs / (time.perf_counter() - begin)}", file=sys.stderr)
+
+
+def bench(num_logs=20000):
+    print(f"{num_logs} logs written to stdout, redirected to /dev/null")
+    print(f"{'mode':<16}{'logs/sec':>16}")
+    for mode in MODES:
+        result = subprocess.run(
+            [sys.executable, "-m", __spec__.name, str(num_logs)],
+            stdout=subprocess.DEVNULL,
+            stderr=subprocess.PIPE,
+            text=True,
+            env={**os.environ, "NEETBOX_LOG_STDOUT": mode},
+        )
+        lines = [line for line in result.stderr.splitlines() if line.startswith("RESULT")]
+        if not lines:
+            print(f"{mode:<16}{'failed':>16}\n{result.stderr}")
+            continue
+        print(f"{mode:<16}{float(lines[0].split()[1]):>16,.0f}")
+
+
+if __name__ == "__main__":
+    if len(sys.argv) > 1:
+        _run_mode(int(sys.argv[1]))
+    else:
+        bench()
@@ -0,0 +1,73 @@
+# -*- coding: utf-8 -*-
+#
+# micro-benchmark of EventMsg wire formats, run with:
+#   python -m tests.benchmark.bench_wire
+
+import time
+from uuid import uuid4
+
+from neetbox._protocol import *
+
+
+def _make_messages(num):
+    project_id, run_id = str(uuid4()), str(uuid4())
+    return [
+        EventMsg(
+            project_id=project_id,
+            run_id=run_id,
+            event_type=EVENT_TYPE_NAME_SCALAR,
+            series=f"series-{i % 8}",
+            identity_type=IdentityType.CLI,
+            payload={"x": i, "y": i * 0.001},
+            timestamp=get_timestamp(),
+        )
+        for i in range(num)
+    ]
+
+
+def _timeit(func, repeat):
+    func()  # warm up
+    begin = time.perf_counter()
+    for _ in range(repeat):
+        result = func()
+    return (time.perf_counter() - begin) / repeat, result
+
+
+def bench(num_messages=64, repeat=2000):
+    messages = _make_messages(num_messages)
+    encoder, decoder = BinaryWire(), BinaryWire()
+    decoder.loads(encoder.dumps(messages))  # intern strings on both sides, as on a live connection
+
+    json_frames = [message.dumps() for message in messages]
+    json_batch = EventMsg.dumps_batch(messages)
+    binary_batch = encoder.dumps(messages)
+    cases = {
+        "json, one frame per message": (
+            lambda: [message.dumps() for message in messages],
+            lambda: [EventMsg.loads(frame) for frame in json_frames],
+            sum(len(frame) for frame in json_frames),
+        ),
+        "json, batch envelope": (
+            lambda: EventMsg.dumps_batch(messages),
+            lambda: EventMsg.loads(json_batch).unpack_batch(),
+            len(json_batch),
+        ),
+        "binary": (
+            lambda: encoder.dumps(messages),
+            lambda: decoder.loads(binary_batch),
+            len(binary_batch),
+        ),
+    }
+    print(f"{num_messages} scalar messages per frame, {repeat} repeats")
+    print(f"{'case':<30}{'bytes/msg':>12}{'encode msg/s':>16}{'decode msg/s':>16}")
+    for name, (encode, decode, size) in cases.items():
+        encode_time, _ = _timeit(encode, repeat)
+        decode_time, _ = _timeit(decode, repeat)
+        print(
+            f"{name:<30}{size / num_messages:>12.1f}"
+            f"{num_messages / encode_time:>16,.0f}{num_messages / decode_time:>16,.0f}"
+        )
+
+
+if __name__ == "__main__":
+    bench()
@@ -0,0 +1,336 @@
+def _run_with_unreachable_daemon(tmp_path, script, **client_config):
+    import subprocess
+    import sys
+    from importlib.metadata import version
+
+    import toml
+
+    # a fresh process, the client is a singleton and may be connected by other tests already
+    with open(tmp_path / "neetbox.toml", "w") as config_file:
+        toml.dump(
+            {
+                "version": version("neetbox"),
+                # TEST-NET-1, unreachable. do not wait long for it on exit
+                "client": {
+                    "host": "192.0.2.1",
+                    "port": 20202,
+                    "connectTimeout": 1,
+                    **client_config,
+                },
+            },
+            config_file,
+        )
+    result = subprocess.run(
+        [sys.executable, "-c", script], cwd=tmp_path, capture_output=True, text=True, timeout=60
+    )
+    assert result.returncode == 0, result.stderr
+    # not printed, logs from other threads go to stdout as well
+    return (tmp_path / "result.txt").read_text().split()
+
+
+def test_first_add_scalar_does_not_block(tmp_path):
+    script = (
+        "import time\n"
+        "import neetbox\n"
+        "from neetbox.client._client import connection\n"
+        "time_begin = time.perf_counter()\n"
+        "neetbox.add_scalar('loss', 0, 1.0)\n"
+        "first_call = time.perf_counter() - time_begin\n"
+        "time_begin = time.perf_counter()\n"
+        "for i in range(1, 1000):\n"
+        "    neetbox.add_scalar('loss', i, 1.0)\n"
+        "following_calls = time.perf_counter() - time_begin\n"
+        "print(first_call, following_calls, connection.state, len(connection.websocket.message_query), file=open('result.txt', 'w'))\n"
+    )
+    first_call, following_calls, state, num_queued = _run_with_unreachable_daemon(tmp_path, script)
+    print(
+        f"first add_scalar took {float(first_call):.4f}s, 999 following took {float(following_calls):.4f}s"
+    )
+    assert float(first_call) < 1  # used to wait for daemon and handshake
+    assert float(following_calls) < 1
+    assert state != "online"
+    assert int(num_queued) > 0  # buffered until online
+
+
+def test_async_add_scalar_does_not_block(tmp_path):
+    script = (
+        "import asyncio, time\n"
+        "import neetbox\n"
+        "from neetbox.client import async_connection\n"
+        "async def main():\n"
+        "    time_begin = time.perf_counter()\n"
+        "    for i in range(1000):\n"
+        "        await neetbox.add_scalar_async('loss', i, 1.0)\n"
+        "    print(time.perf_counter() - time_begin, async_connection.is_native, len(async_connection.message_query), file=open('result.txt', 'w'))\n"
+        "asyncio.run(main())\n"
+    )
+    elapsed, is_native, num_queued = _run_with_unreachable_daemon(
+        tmp_path, script, backend="asyncio"
+    )
+    assert float(elapsed) < 1
+    assert is_native == "True"
+    assert int(num_queued) >= 1000  # buffered until online
+
+
+def test_scalar_reducer():
+    import time
+
+    from neetbox.client.apis._scalar import ScalarReducer
+
+    reducer = ScalarReducer()
+    reducer.set_policy("raw", "none")
+    assert reducer.add("raw", 0, 1.0) == [(0, 1.0)]
+
+    reducer.set_policy("every", "every", every=5, keep_extremes=False)
+    sent = [point for i in range(20) for point in reducer.add("every", i, float(i))]
+    assert sent == [(4, 4.0), (9, 9.0), (14, 14.0), (19, 19.0)]
+
+    # a spike in the middle of a bucket is kept along with the last point
+    reducer.set_policy("bucket", "bucket", bucket_seconds=3600)
+    ys = [1.0, 1.0, 100.0, 1.0, -5.0, 1.0]
+    assert not [point for x, y in enumerate(ys) for point in reducer.add("bucket", x, y)]
+    assert reducer.flush() == {"bucket": [(2, 100.0), (4, -5.0), (5, 1.0)]}
+
+    stats = reducer.stats
+    assert stats["raw"]["ratio"] == 1.0
+    assert stats["every"]["numIn"] == 20 and stats["every"]["numOut"] == 4
+    assert stats["bucket"]["ratio"] == 0.5
+
+    # expired time based buckets are closed without waiting for the next point
+    sent = []
+    reducer = ScalarReducer(send=lambda series, points: sent.append((series, points)))
+    reducer.set_policy("stopped", "bucket", bucket_seconds=0.05)
+    assert reducer.add("stopped", 0, 1.0) == [] and reducer.add("stopped", 1, 2.0) == []
+    time.sleep(0.5)
+    assert sent == [("stopped", [(0, 1.0), (1, 2.0)])] and reducer.flush() == {}
+
+    # the pending bucket is closed by the old policy, nothing left without a span
+    reducer.set_policy("switched", "bucket", bucket_seconds=3600)
+    reducer.add("switched", 0, 1.0)
+    assert reducer.set_policy("switched", "none") == [(0, 1.0)]
+    assert sent[-1] == ("switched", [(0, 1.0)]) and reducer.flush_expired() == {}
+
+
+def test_reset_after_fork(monkeypatch):
+    import multiprocessing
+    import os
+
+    import pytest
+
+    from neetbox.client.apis._image import image_upload_pool
+    from neetbox.client.apis._scalar import ScalarReducer, scalar_reducer
+    from neetbox.utils.bounded_queue import BoundedQueue
+
+    if not hasattr(os, "fork"):
+        pytest.skip("children are forked")
+
+    def _child(pipe):
+        # threads of the parent are gone, both start again on first use
+        pipe.send(
+            (image_upload_pool.queue, scalar_reducer._flusher_thread, scalar_reducer._buckets)
+        )
+
+    monkeypatch.setattr(image_upload_pool, "queue", BoundedQueue(maxsize=1))
+    monkeypatch.setattr(scalar_reducer, "_flusher_thread", object())
+    receiver, sender = multiprocessing.Pipe(duplex=False)
+    child = multiprocessing.get_context("fork").Process(target=_child, args=(sender,))
+    child.start()
+    assert receiver.recv() == (None, None, {})
+    child.join(timeout=30)
+    assert child.exitcode == 0
+
+    sent = []
+    reducer = ScalarReducer(send=lambda series, points: sent.append((series, points)))
+    reducer.set_policy("bucket", "bucket", bucket_seconds=3600)
+    reducer.add("bucket", 0, 1.0)
+    reducer._reset_after_fork()
+    assert reducer._flusher_thread is None and reducer.flush() == {}
+    reducer.add("bucket", 1, 2.0)
+    assert reducer._flusher_thread.is_alive() and reducer.flush() == {"bucket": [(1, 2.0)]}
+    reducer._stop_flusher.set()
+
+
+def test_scalar_reducer_rate(monkeypatch):
+    from neetbox.client.apis import _scalar
+
+    now = [0.0]
+    monkeypatch.setattr(_scalar.time, "monotonic", lambda: now[0])
+    reducer = _scalar.ScalarReducer()
+    reducer.set_policy("rate", "rate", max_points_per_second=10, keep_extremes=True)
+    sent = []
+    for i in range(1000):  # a noisy series for 10 seconds
+        now[0] = i / 100
+        sent += reducer.add("rate", i, float((i * 7919) % 101))
+    assert 10 * 10 * 0.9 <= len(sent) <= 10 * 10
+
+
+def test_progress_coalescing(monkeypatch):
+    from neetbox.client.apis._progress import Progress
+
+    sent = []
+    monkeypatch.setattr(Progress, "_min_update_interval", 3600)
+    monkeypatch.setattr(Progress, "_send", classmethod(lambda cls, **kwargs: sent.append(kwargs)))
+    assert list(Progress(range(1000), name="sized")) == list(range(1000))
+    assert [update["done"] for update in sent] == [1, 1000]  # the first and the final state
+    sent.clear()
+    num_items = 0
+    for _ in Progress(enumerate(range(1000)), name="unsized"):  # len() of enumerate raises
+        num_items += 1
+    assert num_items == 1000
+    assert [update["done"] for update in sent] == [1, 1000]
+    assert sent[-1]["what_is_current"] is not None
+    sent.clear()
+    with Progress(range(1000), name="broken") as progress:  # left early
+        for i in progress:
+            if i == 500:
+                break
+    assert [update["done"] for update in sent] == [1, 501]
+    progress.close()  # nothing left to send
+    assert len(sent) == 2 and progress._last_item is None
+
+
+def test_message_aggregator():
+    import multiprocessing
+    import os
+    import time
+
+    import pytest
+
+    from neetbox._protocol import (
+        CALLER_ID_KEY,
+        EVENT_TYPE_NAME_LOG,
+        WORKER_ID_KEY,
+        EventMsg,
+    )
+    from neetbox.client._aggregator import (
+        AGGREGATOR_ADDRESS_ENV,
+        AGGREGATOR_AUTHKEY_ENV,
+        AGGREGATOR_PID_ENV,
+        AGGREGATOR_PROJECT_ID_ENV,
+        MessageAggregator,
+        MessageForwarder,
+        aggregator_of_parent,
+        inherit_aggregator_after_fork,
+    )
+
+    if not hasattr(os, "fork"):
+        pytest.skip("children are forked")
+
+    def _child(worker_id):
+        assert inherit_aggregator_after_fork(aggregator)  # forked children send through it
+        address, authkey = aggregator_of_parent("another project")
+        assert (address, authkey) == (aggregator.address, aggregator.authkey)
+        forwarder = MessageForwarder(address, authkey, worker_id)
+        for i in range(100):
+            payload = {CALLER_ID_KEY: "child", "i": i}
+            forwarder.send(
+                EventMsg(
+                    project_id="p",
+                    run_id=worker_id,
+                    event_type=EVENT_TYPE_NAME_LOG,
+                    payload=payload,
+                )
+            )
+            if i == 50:  # cannot be pickled, dropped while the others of its batch are sent
+                forwarder.send(EventMsg("p", worker_id, EVENT_TYPE_NAME_LOG, payload=lambda: i))
+        forwarder.close()
+        assert forwarder.num_dropped == 1
+
+    received = []
+    environ = dict(os.environ)
+    aggregator = MessageAggregator(on_message=received.append)
+    aggregator.start(export_project_id="p")
+    try:
+        assert aggregator_of_parent("p") is None  # not a child of itself
+        os.environ[AGGREGATOR_PID_ENV] = "-1"  # as if exported by the parent of a spawned child
+        assert aggregator_of_parent("another project") is None  # which connects on its own
+        assert aggregator_of_parent("p") == (aggregator.address, aggregator.authkey)
+        os.environ[AGGREGATOR_PID_ENV] = str(os.getpid())
+        context = multiprocessing.get_context("fork")
+        children = [context.Process(target=_child, args=(f"worker{i}",)) for i in range(4)]
+        for child in children:
+            child.start()
+        for child in children:
+            child.join(timeout=30)
+            assert child.exitcode == 0
+        time_begin = time.time()
+        while len(received) < 400 and time.time() - time_begin < 10:
+            time.sleep(0.05)
+    finally:
+        aggregator.close()
+        for key in [
+            AGGREGATOR_ADDRESS_ENV,
+            AGGREGATOR_AUTHKEY_ENV,
+            AGGREGATOR_PID_ENV,
+            AGGREGATOR_PROJECT_ID_ENV,
+        ]:
+            os.environ.pop(key, None)
+        os.environ.update(environ)
+    assert len(received) == 400 and aggregator.num_children == 4
+    for i in range(4):
+        payloads = [
+            message.payload
+            for message in received
+            if message.payload[WORKER_ID_KEY] == f"worker{i}"
+        ]
+        assert [payload["i"] for payload in payloads] == list(range(100))  # in order
+        assert payloads[0][CALLER_ID_KEY] == f"worker{i} > child"
+
+
+def test_forwarded_messages_of_other_projects(monkeypatch):
+    from neetbox._protocol import EVENT_TYPE_NAME_LOG, EventMsg
+    from neetbox.client import _client
+
+    sent = []
+    monkeypatch.setattr(_client.connection, "start_connection", lambda: True)
+    monkeypatch.setattr(_client.connection, "_send_message", sent.append)
+    monkeypatch.setattr(_client, "get_project_id", lambda: "parent")
+    monkeypatch.setattr(_client, "get_run_id", lambda: "parent run")
+    _client.connection._send_forwarded(EventMsg("parent", "child run", EVENT_TYPE_NAME_LOG))
+    _client.connection._send_forwarded(EventMsg("another", "another run", EVENT_TYPE_NAME_LOG))
+    assert [(message.project_id, message.run_id) for message in sent] == [
+        ("parent", "parent run"),
+        ("another", "another run"),
+    ]
+
+
+def test_image_metadata_timestamp(monkeypatch):
+    import time
+
+    from neetbox._protocol import EventMsg
+    from neetbox.client.apis import _image
+
+    monkeypatch.setattr(_image, "get_project_id", lambda: "project")
+    monkeypatch.setattr(_image, "get_run_id", lambda: "run")
+    first = EventMsg.loads(_image._image_metadata("sample"))
+    time.sleep(0.01)
+    second = EventMsg.loads(_image._image_metadata("sample"))
+    assert first.timestamp < second.timestamp  # taken when the image is added
+
+
+def test_async_client_send_failures(monkeypatch):
+    import asyncio
+
+    from neetbox._protocol import EventMsg
+    from neetbox.client._async_client import AsyncNeetboxClient
+    from neetbox.utils.connection import SendQueue
+
+    client = AsyncNeetboxClient()
+    frames = []
+
+    class _Websocket:
+        async def send(self, frame):
+            if fail:
+                raise ConnectionError("broken pipe")
+            frames.append(frame)
+
+    monkeypatch.setattr(client, "_websocket", _Websocket())
+    monkeypatch.setattr(client, "_binary_wire", None)
+    monkeypatch.setattr(client, "message_query", SendQueue())
+    message = EventMsg(project_id="p", run_id="r", event_type="scalar", payload={"x": 1, "y": 2})
+    fail = True
+    assert asyncio.run(client._send_batch([message, message])) == [message, message]
+    assert client.send_failing and not frames
+    fail = False
+    assert asyncio.run(client._send_batch([message])) == []
+    assert not client.send_failing and len(frames) == 1
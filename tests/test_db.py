@@ -0,0 +1,144 @@
+def test_project_db_write_many_json(tmp_path):
+    from uuid import uuid4
+
+    from neetbox._protocol import EVENT_TYPE_NAME_SCALAR
+    from neetbox.server.db.project import ProjectDB
+    from neetbox.server.db.project.condition import ProjectDbQueryCondition
+
+    db = ProjectDB(project_id=str(uuid4()), path=str(tmp_path / "test.projectdb"))
+    run_id = str(uuid4())
+    db.write_json(EVENT_TYPE_NAME_SCALAR, {"x": -1, "y": 0}, series="loss", run_id=run_id)
+    first_id = db.write_many_json(
+        EVENT_TYPE_NAME_SCALAR,
+        [{"x": i, "y": i * 2} for i in range(100)],
+        series="loss",
+        run_id=run_id,
+    )
+    rows = db.read_json(
+        EVENT_TYPE_NAME_SCALAR, ProjectDbQueryCondition(series="loss", run_id=run_id)
+    )
+    assert len(rows) == 101
+    assert [row["id"] for row in rows[1:]] == list(range(first_id, first_id + 100))
+    assert rows[-1]["metadata"] == {"x": 99, "y": 198}
+    db.delete()
+
+
+def test_project_db_write_many_blob(tmp_path):
+    import json
+    from uuid import uuid4
+
+    from neetbox.server.db.project import ProjectDB
+    from neetbox.server.db.project.condition import ProjectDbQueryCondition
+
+    db = ProjectDB(project_id=str(uuid4()), path=str(tmp_path / "test.projectdb"))
+    run_ids = [str(uuid4()), str(uuid4())]
+    blobs = [
+        ({"index": i}, bytes([i]) * 16, f"series-{i % 2}", run_ids[i % 2], None) for i in range(10)
+    ]
+    ids = db.write_many_blob("image", blobs)
+    assert len(ids) == 10 and ids == list(range(ids[0], ids[0] + 10))
+    rows = db.read_blob("image", ProjectDbQueryCondition(run_id=run_ids[1]))
+    assert [json.loads(meta)["index"] for _, _, meta, _ in rows] == [1, 3, 5, 7, 9]
+    assert bytes(rows[0][3]) == bytes([1]) * 16
+    # each (run id, series) is limited by the row limit of its own blobs
+    blobs = [({}, b"x", "capped", run_ids[0], None, 2) for _ in range(20)]
+    blobs += [({}, b"x", "unlimited", run_ids[0], None, -1) for _ in range(20)]
+    db.write_many_blob("image", blobs)
+    for series, num_rows in [("capped", 2), ("unlimited", 20)]:
+        condition = ProjectDbQueryCondition(run_id=run_ids[0], series=series)
+        assert len(db.read_blob("image", condition)) == num_rows
+    db.delete()
+
+
+def test_project_db_queued_writes(tmp_path):
+    from uuid import uuid4
+
+    from neetbox._protocol import EVENT_TYPE_NAME_LOG
+    from neetbox.server.db.project import ProjectDB
+    from neetbox.server.db.project.condition import ProjectDbQueryCondition
+
+    db = ProjectDB(project_id=str(uuid4()), path=str(tmp_path / "test.projectdb"))
+    run_id = str(uuid4())
+    # ids are reserved before the rows are committed
+    ids = [
+        db.write_json(EVENT_TYPE_NAME_LOG, {"message": i}, run_id=run_id, wait=False)
+        for i in range(1000)
+    ]
+    assert ids == list(range(ids[0], ids[0] + 1000))
+    for i in range(3):  # read, update and write on the writer thread, no update lost
+        db.update_status(run_id, "hyperparameters", lambda x, i=i: {**x, i: i}, wait=False)
+    db.writer.flush()
+    rows = db.read_json(EVENT_TYPE_NAME_LOG, ProjectDbQueryCondition(run_id=run_id))
+    assert [row["id"] for row in rows] == ids
+    assert [row["metadata"]["message"] for row in rows] == list(range(1000))
+    assert db.get_status(run_id, "hyperparameters")[run_id]["hyperparameters"] == {
+        "0": 0,
+        "1": 1,
+        "2": 2,
+    }
+    stats = db.writer.stats
+    assert stats["committed"] == stats["ingested"] and stats["commits"] < 1000
+    db.delete()
+
+
+def test_project_db_row_limit(tmp_path):
+    from uuid import uuid4
+
+    from neetbox.server.db.project import ProjectDB
+    from neetbox.server.db.project._project_db import ROW_LIMIT_MIN_SLACK
+    from neetbox.server.db.project.condition import ProjectDbQueryCondition
+
+    db = ProjectDB(project_id=str(uuid4()), path=str(tmp_path / "test.projectdb"))
+    run_id = str(uuid4())
+    for i in range(500):  # interleaved series of a run are capped apart
+        for series, limit in [("cpu", 100), ("progress", 1), (None, 50)]:
+            db.write_json("hardware", {"i": i}, series, run_id, num_row_limit=limit, wait=False)
+    db.write_many_json(
+        "hardware", [{"i": i} for i in range(500, 700)], "cpu", run_id, num_row_limit=100
+    )
+    for series, limit, last in [("cpu", 100, 699), ("progress", 1, 499), (None, 50, 499)]:
+        rows = db.read_json("hardware", ProjectDbQueryCondition(series=series, run_id=run_id))
+        if series is None:
+            rows = [row for row in rows if row["series"] is None]
+        assert limit <= len(rows) <= limit + ROW_LIMIT_MIN_SLACK
+        assert [row["metadata"]["i"] for row in rows] == list(range(last - len(rows) + 1, last + 1))
+    db.delete()
+
+
+def test_project_db_writer_backpressure(tmp_path):
+    import asyncio
+    import queue
+    import threading
+    import time
+    from uuid import uuid4
+
+    from neetbox._protocol import EVENT_TYPE_NAME_LOG
+    from neetbox.server.db.project import ProjectDB
+    from neetbox.server.db.project.condition import ProjectDbQueryCondition
+
+    db = ProjectDB(project_id=str(uuid4()), path=str(tmp_path / "test.projectdb"))
+    run_id = str(uuid4())
+    db.writer.queue_size = 10
+    release = threading.Event()
+    db.writer.submit(release.wait)  # hold the writer thread
+    start = time.monotonic()
+    # rejected once full instead of blocking
+    futures = [db._write(lambda: None, wait=False) for _ in range(100)]
+    assert time.monotonic() - start < 1
+    rejected = [future for future in futures if future.done() and future.exception()]
+    assert len(rejected) >= 90 and isinstance(rejected[0].exception(), queue.Full)
+    assert db.writer.barrier() is not None  # barriers are never rejected
+    release.set()
+    db.writer.flush()
+    assert db.writer.stats["rejected"] == len(rejected)
+
+    async def _write_async():
+        rowid = await db.write_json_async(EVENT_TYPE_NAME_LOG, {"message": 0}, run_id=run_id)
+        await db.set_status_async(run_id, "hyperparameters", {"lr": 0.1})
+        return rowid
+
+    rowid = asyncio.run(_write_async())
+    rows = db.read_json(EVENT_TYPE_NAME_LOG, ProjectDbQueryCondition(run_id=run_id))
+    assert [row["id"] for row in rows] == [rowid]
+    assert db.get_status(run_id, "hyperparameters")[run_id]["hyperparameters"] == {"lr": 0.1}
+    db.delete()
@@ -48,3 +48,241 @@ def test_logger_mention():
 
     print_some_str("???")
     print(print_some_str.__name__)
+
+
+def test_log_level_thresholds():
+    from neetbox.logging import Logger, LogLevel
+
+    logger = Logger("thresholds", skip_writers_names=["stdout", "ws"])
+    series = []
+    logger.writer("capture")(writer_func=lambda log: series.append(log.series))
+    for level, expected in [
+        (LogLevel.ERROR, ["error"]),
+        (LogLevel.WARNING, ["warning", "error"]),
+        (LogLevel.INFO, ["ok", "info", "warning", "error"]),
+        ("DEBUG", ["ok", "debug", "info", "warning", "error"]),
+    ]:
+        series.clear()
+        logger.log_level = level
+        logger.ok("ok").debug("debug").info("info").warn("warn").err("err")
+        assert series == expected
+
+
+def test_logger_writers_cache():
+    from neetbox.logging import Logger
+    from neetbox.logging.writers import LogWriters
+
+    logger = Logger("writers cache", skip_writers_names=["stdout", "ws"])
+    private, public = [], []
+    logger.writer("private")(writer_func=lambda log: private.append(log.message))
+    logger.info("a")
+    assert private == ["a "]
+    # cached writer lists are rebuilt on registering
+    LogWriters.register(name="test public writer", overwrite=True)(
+        lambda log: public.append(log.caller_info.func_name)
+    )
+    logger.info("b")
+    assert private == ["a ", "b "] and public == ["test_logger_writers_cache"]
+    del logger.private_writers["private"]
+    logger.skip_writer_name("test public writer")
+    logger.info("c")
+    assert private == ["a ", "b "] and len(public) == 1
+
+
+def test_async_log_dispatch():
+    import threading
+    import time
+
+    import pytest
+
+    from neetbox.logging import Logger
+
+    logger = Logger("async dispatch", skip_writers_names=["stdout", "ws"])
+    written, writer_threads = [], set()
+
+    def slow_writer(log):
+        time.sleep(0.01)
+        written.append(log.message.strip())
+        writer_threads.add(threading.current_thread())
+
+    logger.writer("slow")(writer_func=slow_writer)
+    Logger.set_async_dispatch(queue_size=10, policy="drop-newest")
+    try:
+        time_begin = time.perf_counter()
+        for i in range(20):
+            logger.info(i)
+        assert time.perf_counter() - time_begin < 0.1  # writers did not run on this thread
+        with pytest.raises(ValueError):  # written before raising
+            logger.err(ValueError("fatal"), reraise=True)
+        assert written[-1] == "fatal" and threading.current_thread() in writer_threads
+        logger.info("after")
+        assert Logger.flush(timeout=5)
+        assert written[-1] == "after"
+        num_dropped = Logger._dispatcher.num_dropped
+        reported = [int(message.split()[0]) for message in written if "logs dropped" in message]
+        written = [message for message in written if "logs dropped" not in message]
+        assert num_dropped > 0 and sum(reported) == num_dropped
+        assert len(written) == 22 - num_dropped
+        assert written[:-2] == sorted(written[:-2], key=int)
+    finally:
+        Logger.set_async_dispatch(enable=False)
+
+
+def test_lazy_log_does_not_keep_caller_frame():
+    import sys
+    import weakref
+
+    from neetbox.logging._formatting import LazyRawLog
+
+    class Trainer:
+        def step(self):
+            log = LazyRawLog(("step",), sys._getframe())
+            line = sys._getframe().f_lineno - 1
+            return log, weakref.ref(self), line
+
+    log, trainer, line = Trainer().step()
+    assert trainer() is None  # locals of the caller, self here, are not kept alive by the log
+    caller_info = log.caller_info  # parsed after the frame has gone
+    assert caller_info.class_name == "Trainer" and caller_info.func_name == "step"
+    assert caller_info.lineno == line and caller_info.module_name == __name__
+
+
+def test_file_log_writer_rotation(tmp_path):
+    import gzip
+    import time
+
+    from neetbox.logging import Logger
+    from neetbox.logging.writers import FileLogWriter
+
+    logger = Logger("rotation", skip_writers_names=["stdout", "ws"])
+    logger.set_log_dir(tmp_path, max_bytes=1024, max_segments=2)
+    file_writer = FileLogWriter.PATH2WRITER[str(next(tmp_path.iterdir()))]
+    assert FileLogWriter(file_writer.path) is file_writer  # deduplicated by path
+    for i in range(100):
+        logger.info(f"line {i:03d}")
+    time_begin = time.time()
+    while (
+        len(file_writer.segments) < 2 and time.time() - time_begin < 5
+    ):  # compressed in background
+        time.sleep(0.05)
+    time.sleep(0.2)
+    segments = file_writer.segments
+    assert len(segments) == 2
+    file_writer.flush()
+    lines = [gzip.open(segment, "rt").read() for segment in segments] + [
+        open(file_writer.path).read()
+    ]
+    lines = "".join(lines).splitlines()
+    assert all(len(line) < 1024 for line in lines) and lines[-1].endswith("line 099 ")
+    assert [line.split()[-1] for line in lines] == sorted(line.split()[-1] for line in lines)
+
+
+def test_structured_log_store(tmp_path):
+    from datetime import datetime, timedelta
+
+    from vdtoys.framing import TracebackInfo
+
+    from neetbox.logging import RawLog, read_logs
+    from neetbox.logging.writers import JsonLogWriter
+
+    writer = JsonLogWriter(tmp_path / "logs.jsonl", segment_size=16 * 1024, index_interval=512)
+    begin = datetime(2024, 1, 11, 12)
+    for i in range(2000):
+        log = RawLog(
+            message=f"message {i}",
+            caller_info=TracebackInfo(),
+            caller_name_alias="test",
+            timestamp=begin + timedelta(seconds=i),
+            series="info" if i % 2 else "warning",
+        )
+        writer.write(log)
+    writer.flush()
+    assert len(writer.segments) > 2
+
+    def messages(**kwargs):
+        return [
+            int(log["message"].split()[1]) for log in read_logs(tmp_path / "logs.jsonl", **kwargs)
+        ]
+
+    assert messages() == list(range(2000))
+    since, until = begin + timedelta(seconds=500), begin + timedelta(seconds=1500)
+    assert messages(since=since, until=until) == list(range(500, 1501))
+    assert messages(since=since.isoformat(), until=until.timestamp(), series="info") == list(
+        range(501, 1501, 2)
+    )
+    assert messages(since=begin + timedelta(days=1)) == []
+
+
+def test_plain_stdout_writer():
+    import io
+    from datetime import datetime
+
+    from vdtoys.framing import TracebackInfo
+
+    from neetbox.logging import RawLog
+    from neetbox.logging.writers import PlainStdoutWriter
+
+    stream = io.StringIO()  # not a tty, no colors
+    writer = PlainStdoutWriter(stream=stream, batch_size=2)
+    timestamp = datetime(2024, 1, 11, 12, 30)
+    for series in ["info", None]:
+        log = RawLog(
+            "hello ", TracebackInfo(), caller_name_alias="test", timestamp=timestamp, series=series
+        )
+        writer.write(log)
+    assert stream.getvalue() == "12:30:00 [info] test > hello \n12:30:00 test > hello \n"
+    writer.colorful = True  # cached prefixes follow it
+    writer.write(log)
+    writer.flush()
+    assert "\x1b[" in stream.getvalue().splitlines()[-1]
+
+
+def test_log_rate_limit(monkeypatch):
+    import time
+
+    from neetbox.logging import Logger
+    from neetbox.logging._throttle import _flush_summaries_on_exit
+
+    logger = Logger("rate limit", skip_writers_names=["stdout", "ws"])
+    written = []
+    logger.writer("capture")(writer_func=lambda log: written.append(log.message.strip()))
+    logger.set_rate_limit(collapse_repeats=True)
+    for i in range(11):
+        logger.warn("same" if i < 10 else "different")  # one call site
+    assert written == ["same", "last message repeated 9 times", "different"]
+
+    written.clear()
+    now = [1000.0]
+    monkeypatch.setattr(time, "monotonic", lambda: now[0])
+    logger.set_rate_limit(max_per_second=5)
+    for second in range(2):
+        for i in range(10):
+            logger.info(second, i)  # one call site
+        logger.info("another site")
+        now[0] += 1
+    assert written == ["0 0", "0 1", "0 2", "0 3", "0 4", "another site"] + [
+        "5 logs suppressed by rate limit",
+        "1 0",
+        "1 1",
+        "1 2",
+        "1 3",
+        "1 4",
+        "another site",
+    ]
+    # summaries held back by a call site gone quiet are written without another log from it
+    logger._throttle.flush()
+    assert written[-1] == "5 logs suppressed by rate limit"
+    written.clear()
+    for i in range(8):
+        logger.info("burst", i)
+    logger._throttle.flush()
+    assert len(written) == 5  # not quiet for long yet
+    now[0] += 2
+    logger._throttle.flush()
+    assert written[-1] == "3 logs suppressed by rate limit"
+    logger.set_rate_limit(collapse_repeats=True)
+    for i in range(3):
+        logger.info("repeated")
+    _flush_summaries_on_exit()
+    assert written[-2:] == ["repeated", "last message repeated 2 times"]
+    logger.set_rate_limit(inherit=True)
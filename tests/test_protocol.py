@@ -0,0 +1,86 @@
+def test_event_msg_batch():
+    from neetbox._protocol import EVENT_TYPE_NAME_SCALAR, EventMsg
+
+    messages = [
+        EventMsg(
+            project_id="project",
+            run_id="run",
+            event_type=EVENT_TYPE_NAME_SCALAR,
+            series="loss",
+            payload={"x": i, "y": i * 0.1},
+        )
+        for i in range(3)
+    ]
+    envelope = EventMsg.loads(EventMsg.dumps_batch(messages))
+    assert envelope.is_batch
+    unpacked = envelope.unpack_batch()
+    assert [m.json for m in unpacked] == [m.json for m in messages]
+    assert messages[0].unpack_batch() == [messages[0]]  # a regular message unpacks into itself
+
+
+def test_binary_wire_roundtrip():
+    from neetbox._protocol import (
+        EVENT_TYPE_NAME_LOG,
+        EVENT_TYPE_NAME_SCALAR,
+        BinaryWire,
+        EventMsg,
+        IdentityType,
+    )
+
+    messages = [
+        EventMsg(
+            project_id="project",
+            run_id="run",
+            event_type=EVENT_TYPE_NAME_SCALAR,
+            series="loss",
+            identity_type=IdentityType.CLI,
+            payload={"x": 1, "y": 0.5},
+        ),
+        EventMsg(
+            project_id="project",
+            run_id="run",
+            event_type=EVENT_TYPE_NAME_LOG,
+            payload={"message": "hello"},
+            history_len=1,
+        ),
+        EventMsg(project_id="project", run_id=None, event_type="custom-event", timestamp=None),
+    ]
+    encoder, decoder = BinaryWire(), BinaryWire()
+    for _ in range(2):  # second frame refers to interned strings only
+        decoded = decoder.loads(encoder.dumps(messages))
+        assert [m.json for m in decoded] == [m.json for m in messages]
+    assert len(encoder.dumps(messages)) < len(EventMsg.dumps_batch(messages))
+
+
+def test_binary_wire_failed_frame():
+    from neetbox._protocol import EVENT_TYPE_NAME_SCALAR, BinaryWire, EventMsg
+
+    encoder, decoder = BinaryWire(), BinaryWire()
+    bad = EventMsg(
+        project_id="project", run_id="run", event_type="custom-event", event_id="not a number"
+    )
+    try:
+        encoder.dumps([bad])
+        assert False, "should fail"
+    except ValueError:
+        pass
+    messages = [  # fields are converted before packed
+        EventMsg("project", "run", EVENT_TYPE_NAME_SCALAR, series=1, event_id=None),
+        EventMsg("project", "run", "custom-event", history_len=None),
+    ]
+    decoded = decoder.loads(encoder.dumps(messages))  # strings of the failed frame are not kept
+    assert [m.series for m in decoded] == ["1", None]
+    assert [m.event_type for m in decoded] == [EVENT_TYPE_NAME_SCALAR, "custom-event"]
+    assert decoded[0].event_id == -1 and decoded[1].history_len == -1
+
+
+def test_negotiate_wire_format():
+    from neetbox._protocol import (
+        WIRE_FORMAT_BINARY,
+        WIRE_FORMAT_JSON,
+        negotiate_wire_format,
+    )
+
+    assert negotiate_wire_format([WIRE_FORMAT_BINARY, WIRE_FORMAT_JSON]) == WIRE_FORMAT_BINARY
+    assert negotiate_wire_format(["some-future-format", WIRE_FORMAT_JSON]) == WIRE_FORMAT_JSON
+    assert negotiate_wire_format(None) == WIRE_FORMAT_JSON
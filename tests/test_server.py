@@ -0,0 +1,320 @@
+def test_frontend_sender():
+    import asyncio
+
+    from neetbox._protocol import (
+        EVENT_TYPE_NAME_LOG,
+        EVENT_TYPE_NAME_PROGRESS,
+        EventMsg,
+    )
+    from neetbox.server.fastapi.routers.project._ws._sender import FrontendSender
+
+    class SlowWebSocket:
+        def __init__(self):
+            self.sent = []
+            self.unblocked = asyncio.Event()
+
+        async def send_text(self, text):
+            await self.unblocked.wait()
+            self.sent.append(text)
+
+    def message_of(event_type, series=None):
+        return EventMsg(
+            project_id="p", run_id="r", event_type=event_type, series=series, payload=None
+        )
+
+    async def main():
+        ws = SlowWebSocket()
+        sender = FrontendSender(ws, queue_size=10)
+        sender.start()
+        for i in range(20):  # the oldest logs are dropped
+            sender.put(message_of(EVENT_TYPE_NAME_LOG), f"log {i}")
+        for i in range(20):  # only the latest progress of a series is kept
+            sender.put(message_of(EVENT_TYPE_NAME_PROGRESS, "train"), f"train {i}")
+            sender.put(message_of(EVENT_TYPE_NAME_PROGRESS, "eval"), f"eval {i}")
+        await asyncio.sleep(0.01)
+        ws.unblocked.set()
+        await asyncio.sleep(0.01)
+        sender.close()
+        return ws.sent, sender.stats
+
+    sent, stats = asyncio.run(main())
+    assert sent == [f"log {i}" for i in range(12, 20)] + ["train 19", "eval 19"]
+    assert stats == {"queued": 0, "sent": 10, "dropped": 12, "coalesced": 38}
+
+
+def test_bridge_subscriptions():
+    from types import SimpleNamespace
+
+    from neetbox._protocol import (
+        EVENT_TYPE_NAME_ACTION,
+        EVENT_TYPE_NAME_LOG,
+        EVENT_TYPE_NAME_SCALAR,
+        EventMsg,
+    )
+    from neetbox.server.fastapi.routers.project._bridge import Bridge
+
+    bridge = Bridge("test_bridge_subscriptions", auto_load_db=False)
+    legacy, scalars, errors = (SimpleNamespace(id=i, subscriptions=None) for i in range(3))
+    bridge.web_ws_list = [legacy, scalars, errors]
+    bridge.subscribe(scalars, [{"eventType": EVENT_TYPE_NAME_SCALAR, "runId": "r1"}])
+    bridge.subscribe(errors, [{"eventType": EVENT_TYPE_NAME_LOG, "series": "error"}])
+
+    def receivers_of(event_type, run_id, series):
+        message = EventMsg(
+            project_id=bridge.project_id,
+            run_id=run_id,
+            event_type=event_type,
+            series=series,
+            payload=None,
+        )
+        return sorted(ws_client.id for ws_client in bridge.subscribers_of(message))
+
+    assert receivers_of(EVENT_TYPE_NAME_SCALAR, "r1", "loss") == [0, 1]
+    assert receivers_of(EVENT_TYPE_NAME_SCALAR, "r2", "loss") == [0]
+    assert receivers_of(EVENT_TYPE_NAME_LOG, "r2", "error") == [0, 2]
+    assert receivers_of(EVENT_TYPE_NAME_ACTION, "r1", None) == [0, 1, 2]
+    bridge.unsubscribe(scalars)
+    assert receivers_of(EVENT_TYPE_NAME_SCALAR, "r1", "loss") == [0]
+    assert bridge.subscribers == {(EVENT_TYPE_NAME_LOG, None, "error"): {2: errors}}
+
+
+def test_hardware_ticker():
+    import asyncio
+    import json
+
+    from neetbox.server.fastapi.routers.server._ws import HardwareTicker
+
+    class MonitorWebSocket:
+        def __init__(self, closed=False):
+            self.sent = []
+            self.closed = closed
+
+        async def send_text(self, text):
+            if self.closed:
+                raise RuntimeError("closed")
+            self.sent.append(text)
+
+    async def main():
+        ticker = HardwareTicker()
+        monitors = [MonitorWebSocket(), MonitorWebSocket(), MonitorWebSocket(closed=True)]
+        for monitor in monitors:
+            ticker.add(monitor)
+        task = ticker._task
+        await asyncio.sleep(0.05)
+        assert ticker.clients == set(monitors[:2])  # the closed one is dropped
+        for monitor in monitors[:2]:
+            ticker.remove(monitor)
+        await asyncio.sleep(0)
+        assert task.cancelled() and ticker._task is None
+        return monitors
+
+    monitors = asyncio.run(main())
+    assert len(monitors[0].sent) == 1 and monitors[0].sent == monitors[1].sent
+    assert json.loads(monitors[0].sent[0])["eventType"] == "hardware"
+
+
+def test_ws_latency_during_heavy_query(tmp_path):
+    import json
+    import threading
+    import time
+    from uuid import uuid4
+
+    from fastapi.testclient import TestClient
+
+    from neetbox._protocol import EVENT_TYPE_NAME_HANDSHAKE, EVENT_TYPE_NAME_SCALAR
+    from neetbox.server.db.project import ProjectDB
+    from neetbox.server.fastapi import serverapp
+    from neetbox.server.fastapi.routers.project._bridge import Bridge
+
+    project_id, run_id = str(uuid4()), str(uuid4())
+    db = ProjectDB(project_id=project_id, path=str(tmp_path / "test.projectdb"))
+    for _ in range(10):  # a history taking seconds to query
+        db.write_many_json(
+            EVENT_TYPE_NAME_SCALAR,
+            [{"x": i, "y": i / 3} for i in range(50000)],
+            series="loss",
+            run_id=str(uuid4()),
+        )
+    Bridge.from_db(db)
+
+    def message_of(event_type, identity_type, payload=None):
+        return json.dumps(
+            {
+                "eventType": event_type,
+                "identityType": identity_type,
+                "projectId": project_id,
+                "runId": run_id,
+                "series": "loss",
+                "payload": payload,
+            }
+        )
+
+    responses, query_time, latencies = [], [], []
+    with TestClient(serverapp) as client:
+        with client.websocket_connect("/ws/project/") as cli, client.websocket_connect(
+            "/ws/project/"
+        ) as web:
+            cli.send_text(message_of(EVENT_TYPE_NAME_HANDSHAKE, "cli"))
+            cli.receive_json()
+            web.send_text(message_of(EVENT_TYPE_NAME_HANDSHAKE, "web"))
+            web.receive_json()
+
+            def ping():  # a scalar from client to frontend
+                began = time.perf_counter()
+                cli.send_text(message_of(EVENT_TYPE_NAME_SCALAR, "cli", {"x": 0, "y": 0}))
+                web.receive_json()
+                return time.perf_counter() - began
+
+            idle_latency = max(ping() for _ in range(20))
+
+            def query():
+                began = time.perf_counter()
+                responses.append(client.get(f"/api/project/{project_id}/scalar"))
+                query_time.append(time.perf_counter() - began)
+
+            querying = threading.Thread(target=query)
+            querying.start()
+            while querying.is_alive():
+                latencies.append(ping())
+                time.sleep(0.01)
+            querying.join()
+    db.delete()
+    assert responses[0].status_code == 200 and len(responses[0].json()) == 500000
+    assert len(latencies) > 10
+    # the event loop is never blocked by the query
+    assert max(latencies) < max(idle_latency * 10, query_time[0] / 5), (query_time, latencies)
+
+
+def test_project_sharding(monkeypatch):
+    from collections import Counter
+    from uuid import uuid4
+
+    from neetbox.server._sharding import SHARD_ENV, HashRing, owns_project
+
+    project_ids = [str(uuid4()) for _ in range(2000)]
+    ring = HashRing(4)
+    owners = [ring.worker_of(project_id) for project_id in project_ids]
+    assert owners == [HashRing(4).worker_of(project_id) for project_id in project_ids]
+    assert all(300 < num < 700 for num in Counter(owners).values())
+    # a worker added takes projects from the others, no project moves between the others
+    moved = [
+        (old, new)
+        for old, new in zip(owners, map(HashRing(5).worker_of, project_ids))
+        if old != new
+    ]
+    assert all(new == 4 for _, new in moved) and len(moved) < 2000 * 0.3
+    monkeypatch.setenv(SHARD_ENV, "2/4")
+    assert [owns_project(id) for id in project_ids] == [owner == 2 for owner in owners]
+    monkeypatch.delenv(SHARD_ENV)
+    assert all(map(owns_project, project_ids))
+
+
+def test_sharded_server(tmp_path, monkeypatch):
+    import json
+    import os
+    from uuid import uuid4
+
+    import httpx
+    import toml
+    from fastapi.testclient import TestClient
+
+    from neetbox._protocol import API_ROOT, EVENT_TYPE_NAME_HANDSHAKE, PROJECT_ID_KEY
+    from neetbox.config.user import get as get_global_config
+    from neetbox.server import _router
+
+    # workers use a vault of their own, found through the global config
+    config_dir = tmp_path / "config"
+    (config_dir / "neetbox").mkdir(parents=True)
+    with open(config_dir / "neetbox" / "neetbox.global.toml", "w") as config_file:
+        toml.dump({**get_global_config(), "vault": str(tmp_path / "vault")}, config_file)
+    monkeypatch.setenv("LOCALAPPDATA" if os.name == "nt" else "XDG_CONFIG_HOME", str(config_dir))
+
+    server = _router.ShardedServer({"port": 0}, num_workers=2)
+    project_ids = {}  # owner -> a project of it
+    while len(project_ids) < 2:
+        project_id = str(uuid4())
+        project_ids.setdefault(server.ring.worker_of(project_id), project_id)
+
+    def _handshake_of(project_id):
+        return json.dumps(
+            {
+                "eventType": EVENT_TYPE_NAME_HANDSHAKE,
+                "identityType": "cli",
+                "projectId": project_id,
+                "runId": str(uuid4()),
+            }
+        )
+
+    def _projects_of_worker(index):
+        response = httpx.get(f"{server.worker_url(index)}{API_ROOT}/project/list")
+        return {project[PROJECT_ID_KEY] for project in response.json()}
+
+    class _Thread:  # joins the workers on the caller's thread, see ShardedServer._shutdown
+        def __init__(self, target):
+            self.target = target
+
+        def start(self):
+            self.target()
+
+    exits = []
+    monkeypatch.setattr(_router, "Thread", _Thread)
+    monkeypatch.setattr(_router.os, "_exit", exits.append)
+    for index in range(2):
+        server._start_worker(index)
+    try:
+        server._wait_for_workers()
+        with TestClient(server.app) as client:
+            for index, project_id in project_ids.items():
+                with client.websocket_connect("/ws/project/") as websocket:
+                    websocket.send_text(_handshake_of(project_id))
+                    assert websocket.receive_json()["payload"]["result"] == 200
+                    # http requests of the project go to the same worker
+                    response = client.get(f"{API_ROOT}/project/{project_id}")
+                    assert response.status_code == 200
+                    assert response.json()[PROJECT_ID_KEY] == project_id
+            for index, project_id in project_ids.items():  # each project on its owner only
+                assert project_id in _projects_of_worker(index)
+                assert project_id not in _projects_of_worker(1 - index)
+            listed = {
+                project[PROJECT_ID_KEY] for project in client.get(f"{API_ROOT}/project/list").json()
+            }
+            assert set(project_ids.values()) <= listed  # merged from both workers
+            assert client.post(f"{API_ROOT}/server/shutdown").status_code == 200
+        assert exits == [0] and not any(worker.is_alive() for worker in server.workers)
+    finally:
+        for worker in server.workers:
+            if worker is not None and worker.is_alive():
+                worker.kill()
+
+
+def test_bench_server(tmp_path, monkeypatch):
+    import json
+    import os
+    import tempfile
+    from glob import glob
+
+    import pytest
+
+    from neetbox.server import _bench
+    from neetbox.server._bench import parse_mix, run_bench
+
+    assert parse_mix("scalar=3,log") == {"scalar": 3.0, "log": 1.0}
+    vault_pattern = os.path.join(tempfile.gettempdir(), "neetbox-bench-vault-*")
+    vaults = set(glob(vault_pattern))
+    output = tmp_path / "report.json"
+    report = run_bench(clients=2, frontends=1, rate=100, duration=2, output=str(output))
+    assert json.loads(output.read_text())["sent"] == report["sent"]
+    assert report["sent"]["total"] > 0 and report["ingest"]["committed"] > 0
+    assert report["forward"]["received"] > 0 and report["forward"]["latency"]["p50"] > 0
+    assert report["server"]["cpuPercent"] >= 0 and report["server"]["rssMB"] > 0
+    assert not report["errors"]
+    assert set(glob(vault_pattern)) == vaults  # the server used a temporary vault, removed
+    # also removed when the benchmark fails
+
+    def _fail(*args, **kwargs):
+        raise RuntimeError("failed on purpose")
+
+    monkeypatch.setattr(_bench, "_ingest_stats_of", _fail)
+    with pytest.raises(RuntimeError, match="failed on purpose"):
+        run_bench(clients=1, frontends=0, rate=10, duration=1, output=str(output))
+    assert set(glob(vault_pattern)) == vaults
@@ -5,3 +5,157 @@
 #     package_name_import = "cv2"
 #     installed = pkg.is_installed(package=package_name_import, try_install_if_not=False)
 #     print(f"is '{package_name}' installed? {installed}")
+
+
+def test_message_spool(tmp_path):
+    from neetbox._protocol import EVENT_TYPE_NAME_SCALAR, EventMsg
+    from neetbox.utils.spool import MessageSpool
+
+    def make_messages(begin, end):
+        return [
+            EventMsg(
+                project_id="project",
+                run_id="run",
+                event_type=EVENT_TYPE_NAME_SCALAR,
+                series="loss",
+                payload={"x": i, "y": i},
+            )
+            for i in range(begin, end)
+        ]
+
+    spool = MessageSpool(folder=str(tmp_path / "spool"), segment_size=1024)
+    assert MessageSpool(folder=str(tmp_path / "spool")) is spool  # one spool per folder
+    spool.append(make_messages(0, 100))
+    assert len(spool) == 100 and len(list((tmp_path / "spool").iterdir())) > 1
+
+    def failing_send(messages):
+        raise IOError("offline")
+
+    assert not spool.replay(failing_send)  # nothing consumed on failure
+    assert len(spool) == 100
+    replayed = []
+    assert spool.replay(replayed.extend, batch_size=7)
+    assert [m.payload["x"] for m in replayed] == list(range(100))
+    assert len(spool) == 0 and not list((tmp_path / "spool").iterdir())
+
+    # compaction drops whole segments of the oldest messages
+    small_spool = MessageSpool(folder=str(tmp_path / "small"), max_size=4096, segment_size=1024)
+    small_spool.append(make_messages(0, 100))
+    replayed = []
+    small_spool.replay(replayed.extend)
+    assert small_spool.num_dropped + len(replayed) == 100
+    assert replayed[-1].payload["x"] == 99 and replayed[0].payload["x"] > 0
+
+    # segments left by an earlier process are replayed before new messages
+    spool.append(make_messages(0, 50))
+    MessageSpool.PATH2SPOOL.clear()  # as if the process restarted
+    with open(sorted((tmp_path / "spool").iterdir())[-1], "ab") as segment_file:
+        segment_file.write(b'{"partial')  # interrupted write
+    reopened = MessageSpool(folder=str(tmp_path / "spool"), segment_size=1024)
+    assert reopened is not spool and len(reopened) == 50
+    reopened.append(make_messages(50, 100))
+    assert reopened.size == sum(f.stat().st_size for f in (tmp_path / "spool").iterdir())
+    replayed = []
+    assert reopened.replay(replayed.extend)
+    assert [m.payload["x"] for m in replayed] == list(range(100)) and reopened.size == 0
+
+
+def test_bounded_queue_policies():
+    from queue import Empty
+    from threading import Thread
+
+    from neetbox.utils.bounded_queue import BoundedQueue
+
+    queue = BoundedQueue(maxsize=3, policy="drop-oldest")
+    for i in range(5):
+        assert queue.put(i)
+    assert queue.num_dropped == 2 and queue.get_many(10) == [2, 3, 4]
+
+    queue = BoundedQueue(maxsize=3, policy="drop-newest")
+    assert [queue.put(i) for i in range(5)] == [True, True, True, False, False]
+    assert queue.get_many(10) == [0, 1, 2]
+    try:
+        queue.get(timeout=0.01)
+        assert False, "should time out"
+    except Empty:
+        pass
+
+    queue = BoundedQueue(maxsize=1, policy="block")
+    queue.put(0)
+    producer = Thread(target=queue.put, args=(1,), daemon=True)
+    producer.start()
+    producer.join(timeout=0.1)
+    assert producer.is_alive()  # blocked until consumed
+    assert queue.get() == 0
+    queue.task_done()
+    producer.join(timeout=1)
+    assert not producer.is_alive() and queue.get() == 1
+    assert not queue.join(timeout=0.01)  # 1 is not done yet
+    queue.task_done()
+    assert queue.join(timeout=0.01)
+
+
+def test_websocket_client_send_failures(monkeypatch):
+    from neetbox._protocol import EventMsg
+    from neetbox.utils.connection import WebsocketClient
+
+    client = WebsocketClient("ws://127.0.0.1:1", None, None, None, None)
+    monkeypatch.setattr(WebsocketClient, "is_connected", True)
+    client.ready = True
+    frames = []
+
+    def _send(frame, **kwargs):
+        if fail:
+            raise ConnectionError("broken pipe")
+        frames.append(frame)
+
+    client.wsApp.send = _send
+    message = EventMsg(project_id="p", run_id="r", event_type="scalar", payload={"x": 1, "y": 2})
+    fail = True
+    client.send(message)
+    client.send(message)
+    assert client.send_failing and len(client.message_query) == 2 and not frames
+    fail = False
+    client.flush()
+    assert not client.send_failing and not client.message_query and len(frames) == 2
+
+
+def test_websocket_client_drops_unencodable(monkeypatch):
+    from neetbox._protocol import WIRE_FORMAT_BINARY, BinaryWire, EventMsg
+    from neetbox.utils.connection import WebsocketClient
+
+    client = WebsocketClient("ws://127.0.0.1:1", None, None, None, None)
+    monkeypatch.setattr(WebsocketClient, "is_connected", True)
+    client.ready = True
+    client.set_wire_format(WIRE_FORMAT_BINARY)
+    frames = []
+    client.wsApp.send = lambda frame, **kwargs: frames.append(frame)
+    good = EventMsg(project_id="p", run_id="r", event_type="scalar", payload={"x": 1, "y": 2})
+    bad = EventMsg(project_id="p", run_id="r", event_type="scalar", event_id="not a number")
+    for message in [good, bad, good]:
+        client.send(message)
+    assert client.num_dropped == 1 and not client.message_query
+    decoder = BinaryWire()
+    assert [len(decoder.loads(frame)) for frame in frames] == [1, 1]
+
+
+def test_send_queue():
+    from neetbox._protocol import EventMsg
+    from neetbox.utils.connection import SendQueue
+
+    queue = SendQueue(maxsize=4)
+    messages = [
+        EventMsg(project_id="p", run_id="r", event_type="log", event_id=i) for i in range(6)
+    ]
+    assert [queue.append(message) for message in messages] == [1, 2, 3, 4, 4, 4]
+    assert queue.num_dropped == 2 and queue[0] is messages[2]  # the oldest ones dropped
+    batch = queue.pop_batch(3)
+    assert batch == messages[2:5] and len(queue) == 1
+    queue.append(messages[0])
+    # unsent messages are put back in front, the oldest dropped and counted if full
+    queue.put_back(batch)
+    assert [queue[i] for i in range(4)] == messages[3:6] + [messages[0]]
+    assert queue.num_dropped == 3
+    queue.drop_beyond(1)
+    assert len(queue) == 1 and queue.num_dropped == 6
+    assert queue.pop_batch(10) == [messages[0]] and queue.pop_batch(10) == []